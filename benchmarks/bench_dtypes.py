@@ -0,0 +1,75 @@
+'''
+Memory of the frames returned by Calculation as pandas reads them from
+SQLite against the same frames cast to the schemas of modules.dtypes, on
+synthetic databases of 1, 10 and 100 seasons (see modules.synthetic).
+
+    python benchmarks/bench_dtypes.py [--scales 1 10 100]
+
+get_box_scores is left out: box_score_table builds it compact from the start.
+'''
+import argparse
+import inspect
+import os
+import sqlite3
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+import modules.helper_functions as hlp
+from modules.dtypes import FRAME_SCHEMAS, apply_schema_to_result, result_memory
+from modules.synthetic import synthetic_path, write_synthetic_database
+
+# Method name -> arguments
+METHODS = {
+    'calculate_mean_values': (),
+    'calculate_team_aggregates': (),
+    'calculate_total_stats': (),
+    'get_win_loss': (),
+    'get_shooting_points': (),
+    'get_shooting_data': (),
+    'get_teams': (),
+    'get_match_stats': ('BOS', 'LAL'),
+}
+
+
+def measure(calc: hlp.Calculation, method: str) -> tuple:
+    '''
+    Returns:
+        before (int), after (int), cast (float): Bytes of the result as read and
+        as cast to its schema, seconds spent casting.
+    '''
+    # The method without the cache and the schema around it
+    raw = inspect.unwrap(getattr(hlp.Calculation, method))(calc, *METHODS[method])
+    start = time.perf_counter()
+    compact = apply_schema_to_result(raw, FRAME_SCHEMAS[method])
+    cast = time.perf_counter() - start
+    return result_memory(raw), result_memory(compact), cast
+
+
+def run(scales):
+    print(f"{'scale':>5} {'method':<27} {'as read KiB':>12} {'typed KiB':>10} {'ratio':>6} {'cast ms':>8}")
+    for scale in scales:
+        path = os.path.join(ROOT, synthetic_path(scale))
+        if not os.path.exists(path):
+            write_synthetic_database(path, scale, os.path.join(ROOT, 'nba.db'))
+        conn = sqlite3.connect(path)
+        calc = hlp.Calculation(conn, cache=None)
+        total_before = total_after = 0
+        for method in METHODS:
+            before, after, cast = measure(calc, method)
+            total_before += before
+            total_after += after
+            print(f"{scale:>5} {method:<27} {before / 1024:>12.1f} {after / 1024:>10.1f} "
+                  f"{before / after:>5.1f}x {cast * 1000:>8.2f}")
+        print(f"{scale:>5} {'total':<27} {total_before / 1024:>12.1f} {total_after / 1024:>10.1f} "
+              f"{total_before / total_after:>5.1f}x")
+        conn.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100])
+    args = parser.parse_args()
+    run(args.scales)
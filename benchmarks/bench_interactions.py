@@ -0,0 +1,79 @@
+'''
+Latency of Match Analyzer interactions: the whole page rerun every widget
+change used to trigger against the rerun of the match_analyzer fragment
+alone, driven through Streamlit's AppTest.
+
+    python benchmarks/bench_interactions.py [--repeat 5]
+
+AppTest always reruns the whole script, so the fragment rerun is timed with
+a page containing only the fragment, which is what the browser session
+executes when one of its widgets changes. nba.db must already be prepared
+(python -m modules.database prepare, or an ingestion): the app only reads it.
+'''
+import argparse
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from streamlit.testing.v1 import AppTest
+
+# Widget changes of one round, applied in this order
+INTERACTIONS = [
+    ('select team', lambda at: at.selectbox[1].select('Los Angeles Lakers')),
+    ('select match', lambda at: at.multiselect[0].set_value(at.multiselect[0].value[:1])),
+    ('select other team', lambda at: at.selectbox[1].select('Boston Celtics')),
+    ('select all matches', lambda at: at.multiselect[0].set_value(at.multiselect[0].options)),
+]
+
+
+def analyzer_page():
+    import streamlit as st
+
+    import modules.helper_functions as hlp
+    from modules.analyzer import match_analyzer
+    from modules.pool import ConnectionPool
+
+    @st.cache_resource
+    def create_pool(db_file):
+        return ConnectionPool(db_file)
+
+    pool = create_pool('nba.db')
+    calc = hlp.Calculation(pool)
+    match_analyzer(calc, hlp.Visualisation(pool), calc.get_teams())
+
+
+def time_interactions(at: AppTest, repeat: int) -> dict:
+    at.run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    timings = {name: [] for name, _ in INTERACTIONS}
+    for _ in range(repeat):
+        for name, interact in INTERACTIONS:
+            interact(at)
+            start = time.perf_counter()
+            at.run()
+            timings[name].append(time.perf_counter() - start)
+            if at.exception:
+                raise RuntimeError(at.exception[0].message)
+    return timings
+
+
+def run(repeat):
+    page = time_interactions(AppTest.from_file(os.path.join(ROOT, 'main.py'), default_timeout=120), repeat)
+    fragment = time_interactions(AppTest.from_function(analyzer_page, default_timeout=120), repeat)
+
+    print(f"{'interaction (median ms)':<24} {'full page':>10} {'fragment':>10} {'ratio':>7}")
+    for name, _ in INTERACTIONS:
+        before, after = statistics.median(page[name]), statistics.median(fragment[name])
+        print(f"{name:<24} {before * 1000:>10.1f} {after * 1000:>10.1f} {before / after:>6.1f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    run(args.repeat)
@@ -0,0 +1,229 @@
+'''
+Load test of one app process: N concurrent sessions go through the page load
+and the Match Analyzer selections of main.py, entirely offline, against a
+synthetic database (see modules.synthetic).
+
+    python benchmarks/bench_load.py [--users 1 5 10 20] [--rounds 3] [--scale 10] [--think 0]
+
+Every user count gets a fresh `streamlit run main.py` server on localhost,
+so the caches start cold and the peak RSS is that of the level alone. Each
+session is a websocket client speaking the protocol of the browser: it asks
+for a run of the script, reads the page until the run has finished, and
+sends the widget states of a selection the way the browser does, including
+the fragment reruns of the Match Analyzer. Tab switches happen in the
+browser and rerun nothing, so they are not simulated.
+
+Reported per level: rerun latency percentiles (from sending the request to
+the end of the run), reruns per second over the level, the peak RSS of the
+server (Linux only), the hit ratio of its result cache and the size and
+longest wait of its connection pool, which the server writes to
+NBA_STATS_FILE when it stops.
+'''
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from websockets.asyncio.client import connect
+
+# Selections of one round of a session: widget label and the value it is set
+# to, from the options it currently shows. Each is followed by a rerun.
+INTERACTIONS = [
+    ('select team', 'Select Teams', lambda options: 'Los Angeles Lakers'),
+    ('select match', 'MatchIDS', lambda options: options[:1]),
+    ('select other team', 'Select Teams', lambda options: 'Boston Celtics'),
+    ('select all matches', 'MatchIDS', lambda options: list(options)),
+]
+
+
+class Session:
+    '''
+    One browser tab: the widgets of the page it last received and the state
+    it sends back with every rerun request.
+    '''
+    def __init__(self, ws):
+        self.ws = ws
+        # delta path -> (element type, widget proto, fragment id)
+        self.widgets = {}
+        self.states = {}
+
+    def widget(self, label: str) -> tuple:
+        for kind, proto, fragment_id in self.widgets.values():
+            if proto.label == label:
+                return kind, proto, fragment_id
+        raise LookupError(f'No widget labelled {label!r} on the page')
+
+    async def rerun(self, fragment_id: str = '') -> float:
+        msg = BackMsg()
+        msg.rerun_script.query_string = ''
+        msg.rerun_script.page_script_hash = ''
+        msg.rerun_script.fragment_id = fragment_id
+        live = {proto.id for _, proto, _ in self.widgets.values()}
+        msg.rerun_script.widget_states.widgets.extend(s for i, s in self.states.items() if i in live)
+        if not fragment_id:
+            self.widgets.clear()
+        start = time.perf_counter()
+        await self.ws.send(msg.SerializeToString())
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(await self.ws.recv())
+            kind = forward.WhichOneof('type')
+            if kind == 'script_finished':
+                return time.perf_counter() - start
+            if kind == 'delta' and forward.delta.WhichOneof('type') == 'new_element':
+                element = forward.delta.new_element
+                element_type = element.WhichOneof('type')
+                if element_type in ('selectbox', 'multiselect'):
+                    path = tuple(forward.metadata.delta_path)
+                    self.widgets[path] = (element_type, getattr(element, element_type), forward.delta.fragment_id)
+                if element_type == 'exception':
+                    raise RuntimeError(element.exception.message)
+
+    async def select(self, label: str, choose) -> float:
+        kind, proto, fragment_id = self.widget(label)
+        state = WidgetState(id=proto.id)
+        value = choose(list(proto.options))
+        if kind == 'selectbox':
+            state.string_value = value
+        else:
+            state.string_array_value.data[:] = value
+        self.states[proto.id] = state
+        return await self.rerun(fragment_id)
+
+
+async def user(url: str, rounds: int, think: float, latencies: list, errors: list):
+    try:
+        async with connect(url, subprotocols=['streamlit'], max_size=None, open_timeout=60) as ws:
+            session = Session(ws)
+            latencies.append(('page load', await session.rerun()))
+            for _ in range(rounds):
+                for name, label, choose in INTERACTIONS:
+                    await asyncio.sleep(think)
+                    latencies.append((name, await session.select(label, choose)))
+    except Exception as e:
+        errors.append(repr(e))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('localhost', 0))
+        return s.getsockname()[1]
+
+
+def peak_rss_mib(pid: int) -> float:
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def start_server(port: int, db_file: str, stats_file: str) -> subprocess.Popen:
+    env = dict(os.environ, NBA_DB=db_file, NBA_STATS_FILE=stats_file)
+    server = subprocess.Popen([sys.executable, '-m', 'streamlit', 'run', 'main.py', '--server.headless', 'true',
+                               '--server.port', str(port), '--server.fileWatcherType', 'none',
+                               '--browser.gatherUsageStats', 'false'],
+                              cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f'http://localhost:{port}/_stcore/health', timeout=1):
+                return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError('The streamlit server did not start within 60s')
+
+
+def run_level(users: int, rounds: int, think: float, db_file: str) -> dict:
+    '''
+    Run `users` sessions at once against a new server.
+    Returns:
+        result (dict): Latency percentiles in milliseconds, throughput, peak RSS, the
+        counters of the server and errors.
+    '''
+    port = free_port()
+    stats_file = os.path.join(tempfile.gettempdir(), f'nba_stats_{port}.json')
+    server = start_server(port, db_file, stats_file)
+    latencies, errors = [], []
+    url = f'ws://localhost:{port}/_stcore/stream'
+
+    async def level():
+        await asyncio.gather(*(user(url, rounds, think, latencies, errors) for _ in range(users)))
+
+    try:
+        start = time.perf_counter()
+        asyncio.run(level())
+        elapsed = time.perf_counter() - start
+        rss = peak_rss_mib(server.pid)
+    finally:
+        server.terminate()
+        server.wait()
+    with open(stats_file) as f:
+        counters = json.load(f)
+    os.remove(stats_file)
+    times = sorted(t for _, t in latencies)
+    quantiles = statistics.quantiles(times, n=100, method='inclusive') if len(times) > 1 else times * 99
+    return {
+        'users': users,
+        'reruns': len(times),
+        'p50_ms': round(quantiles[49] * 1000, 1),
+        'p95_ms': round(quantiles[94] * 1000, 1),
+        'p99_ms': round(quantiles[98] * 1000, 1),
+        'reruns_per_s': round(len(times) / elapsed, 2),
+        'peak_rss_mib': rss,
+        'cache_hit_ratio': counters['cache']['hit_ratio'],
+        'pool_size': counters['pool']['size'],
+        'pool_max_wait_ms': counters['pool']['max_wait_ms'],
+        'errors': errors,
+    }
+
+
+def prepare_database(scale: int) -> str:
+    from modules.synthetic import synthetic_path, write_synthetic_database
+
+    path = os.path.join(ROOT, synthetic_path(scale))
+    if not os.path.exists(path):
+        write_synthetic_database(path, scale, os.path.join(ROOT, 'nba.db'))
+    return path
+
+
+def run(users, rounds, scale, think):
+    db_file = prepare_database(scale)
+    print(f"{scale} season(s), {rounds} round(s) of {len(INTERACTIONS)} selections per session")
+    print(f"{'users':>5} {'reruns':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'reruns/s':>9} {'peak RSS MiB':>13} "
+          f"{'cache hits':>11} {'pool size':>10} {'max wait ms':>12}")
+    for n in users:
+        result = run_level(n, rounds, think, db_file)
+        print(f"{n:>5} {result['reruns']:>7} {result['p50_ms']:>8} {result['p95_ms']:>8} {result['p99_ms']:>8} "
+              f"{result['reruns_per_s']:>9} {result['peak_rss_mib']:>13} {result['cache_hit_ratio']:>11.0%} "
+              f"{result['pool_size']:>10} {result['pool_max_wait_ms']:>12}")
+        for error in result['errors']:
+            print(f"      error: {error}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, nargs='+', default=[1, 5, 10, 20],
+                        help='Numbers of concurrent sessions, each tested against its own server.')
+    parser.add_argument('--rounds', type=int, default=3, help='Rounds of Match Analyzer selections per session.')
+    parser.add_argument('--scale', type=int, default=10, help='Seasons of the synthetic database.')
+    parser.add_argument('--think', type=float, default=0.0, help='Seconds a user waits before each selection.')
+    args = parser.parse_args()
+    run(args.users, args.rounds, args.scale, args.think)
@@ -0,0 +1,122 @@
+'''
+Compare the 18 bar charts the Match Analyzer used to draw for one game
+with the single create_match_panel figure: JSON payload sent to the browser
+and the server-side time to build and serialize the figures (what
+st.plotly_chart does for every chart).
+
+    python benchmarks/bench_match_panel.py [--games 50] [--repeat 5]
+
+Every chart is also a separate Plotly.js instance in the browser, which is
+not measured here: 18 instances against 1.
+'''
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+import plotly.graph_objects as go
+import plotly.io as pio
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import modules.database as db
+import modules.helper_functions as hlp
+
+
+def create_bar(stats1, stats2, home: bool, title: str, title2: str) -> go.Figure:
+    '''
+    One chart of the previous Match Analyzer (formerly Visualisation.create_bar):
+    stats1 out of stats2 as a stacked bar, growing leftwards for the away team.
+    '''
+    fig = go.Figure()
+    fig.add_trace(go.Bar(x=[stats1], y=[0], name=f'{title}', orientation='h',
+                         marker=dict(color='#50e991' if home else '#0bb4ff')))
+    fig.add_trace(go.Bar(x=[stats2 - stats1], y=[0], name=f'{title2}', orientation='h',
+                         marker=dict(color='#474440')))
+    fig.update_layout(
+        barmode="stack",
+        yaxis=dict(visible=False, showticklabels=False),
+        xaxis=dict(range=[0, stats2] if home else [stats2, 0], visible=False, showticklabels=False, showgrid=False),
+        margin=dict(l=0, r=0, t=0, b=0),
+        height=50,
+    )
+    return fig
+
+
+def create_bars(home_stats, away_stats) -> list:
+    '''
+    The 18 charts of the previous Match Analyzer, 9 per side.
+    '''
+    figures = []
+    for stats, home in ((away_stats, False), (home_stats, True)):
+        figures += [
+            create_bar(stats['fgm'], stats['fga'], home=home, title="FGM", title2="Miss"),
+            create_bar(stats['tpm'], stats['tpa'], home=home, title="TPM", title2="Miss"),
+            create_bar(stats['ftm'], stats['fta'], home=home, title="FTM", title2="Miss"),
+            create_bar(stats['dreb'], stats['reb'], home=home, title="DREB", title2="OREB"),
+        ]
+        for column in ['ast', 'tov', 'stl', 'blk', 'pf']:
+            figures.append(create_bar(stats[column], home_stats[column] + away_stats[column], home=home,
+                                      title=column.upper(), title2="OPP"))
+    return figures
+
+
+def timed(fn, repeat: int) -> tuple:
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run(games, repeat):
+    workdir = tempfile.mkdtemp(prefix='nba_panel_')
+    try:
+        db_file = os.path.join(workdir, 'nba.db')
+        shutil.copy('nba.db', db_file)
+        conn = sqlite3.connect(db_file)
+        db.prepare_database(conn)
+        calc = hlp.Calculation(conn, cache=None)
+        viz = hlp.Visualisation(conn, cache=None)
+        pairs = conn.execute('''
+            SELECT DISTINCT a.team_id, b.team_id FROM matchups m
+            JOIN team_info a ON a.team_id = (SELECT team_id FROM teams WHERE team_key = m.team_a)
+            JOIN team_info b ON b.team_id = (SELECT team_id FROM teams WHERE team_key = m.team_b)
+            LIMIT ?
+        ''', (games,)).fetchall()
+
+        totals = {'bars': [0.0, 0], 'panel': [0.0, 0]}
+        for team_a, team_b in pairs:
+            match = calc.get_box_score(calc.get_match_stats(team_a, team_b)[1][0])
+            home_stats, away_stats = match['home'], match['away']
+            t_bars, payload_bars = timed(
+                lambda: [pio.to_json(fig, validate=False) for fig in create_bars(home_stats, away_stats)], repeat)
+            t_panel, payload_panel = timed(
+                lambda: [pio.to_json(viz.create_match_panel(match), validate=False)], repeat)
+            totals['bars'][0] += t_bars
+            totals['bars'][1] += sum(len(payload) for payload in payload_bars)
+            totals['panel'][0] += t_panel
+            totals['panel'][1] += sum(len(payload) for payload in payload_panel)
+        conn.close()
+
+        n = len(pairs)
+        print(f"{n} games, mean per game")
+        print(f"{'':<24} {'charts':>7} {'payload KiB':>12} {'build+serialize ms':>19}")
+        for name, charts in (('bars', 18), ('panel', 1)):
+            seconds, size = totals[name]
+            print(f"{name:<24} {charts:>7} {size / n / 1024:>12.1f} {seconds / n * 1000:>19.2f}")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--games', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    run(args.games, args.repeat)
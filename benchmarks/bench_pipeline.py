@@ -0,0 +1,107 @@
+'''
+Compare the vectorized transform of modules.pipeline with the row-wise cleaning
+of process.ipynb on raw exports 1x, 10x and 100x the size of data/raw_data.csv.
+
+    python benchmarks/bench_pipeline.py [--scales 1 10 100]
+
+Larger exports repeat the season with the years shifted, so every copy has its
+own dates and match ids.
+'''
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from modules.pipeline import run_pipeline
+
+
+def scale_raw(source: str, target: str, factor: int):
+    df = pd.read_csv(source, sep=';', index_col=0)
+    copies = []
+    for k in range(factor):
+        copy = df.copy()
+        date = copy['GAME DATE'].str.split('/', expand=True)
+        copy['GAME DATE'] = date[0] + '/' + date[1] + '/' + (date[2].astype(int) + k).astype(str)
+        copies.append(copy)
+    df = pd.concat(copies, ignore_index=True)
+    df.to_csv(target, sep=';')
+    return len(df)
+
+
+def clean_matchup(value):
+    parts = value.split('vs.') if 'vs.' in value else value.split('@')
+    if 'vs.' in value:
+        return '-'.join(parts[::-1]).replace(' ', '')
+    else:
+        return '-'.join(parts).replace(' ', '')
+
+
+def notebook_transform(raw_path: str, out_dir: str):
+    '''
+    The cleaning steps of process.ipynb, unchanged.
+    '''
+    df = pd.read_csv(raw_path, sep=";", index_col=0)
+    df = df.drop(["+/-"], axis=1)
+    new_cols = ['match_up', 'game_date', 'result', 'min', 'pts', 'fgm',
+                'fga', 'fgp', 'tpm', 'tpa', 'tpp', 'ftm', 'fta', 'ftp', 'oreb',
+                'dreb', 'reb', 'ast', 'tov', 'stl', 'blk', 'pf']
+    df = df.rename(dict(zip(df.columns, new_cols)), axis=1)
+    teams = []
+    for i in df['match_up']:
+        teams.append(i[:3])
+    df['team_id'] = teams
+    df['match_up'] = df['match_up'].apply(clean_matchup)
+    game_dates = []
+    for i in df['game_date']:
+        game_dates.append(i.replace('/', ''))
+    df['match_id'] = game_dates + df['match_up'].str.split('-').str[-1]
+    df['game_date'] = df['game_date'].apply(lambda x: x.replace('/', '-'))
+    df['game_date'] = pd.to_datetime(df['game_date'], format='%m-%d-%Y')
+    unique_dates = np.sort(pd.unique(df['game_date']))
+    df_gd = pd.DataFrame({'date_id': range(1, len(unique_dates) + 1), 'game_date': unique_dates})
+    df = pd.merge(df, df_gd, on='game_date').drop('game_date', axis=1)
+    df_mr = df[['match_id', 'team_id', 'date_id', 'result', 'min', 'pts']].iloc[::-1].reset_index(drop=True)
+    df = df.drop('match_up', axis=1)
+    df = df.reindex(columns=['match_id', 'team_id', 'date_id', 'fgm', 'fga', 'fgp', 'tpm',
+                             'tpa', 'tpp', 'ftm', 'fta', 'ftp', 'oreb', 'dreb', 'reb', 'ast', 'tov',
+                             'stl', 'blk', 'pf'])
+    df.to_csv(os.path.join(out_dir, 'match_stats.csv'), sep=";", index=False)
+    df_gd.to_csv(os.path.join(out_dir, 'game_dates.csv'), sep=";", index=False)
+    df_mr.to_csv(os.path.join(out_dir, 'match_info.csv'), sep=";", index=False)
+
+
+def timed(fn, *args, **kwargs) -> float:
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def run(scales):
+    workdir = tempfile.mkdtemp(prefix='nba_pipeline_')
+    try:
+        print(f"{'scale':>5} {'rows':>8} {'notebook s':>11} {'pipeline s':>11} {'speed-up':>9}")
+        for factor in scales:
+            raw_path = os.path.join(workdir, f'raw_{factor}x.csv')
+            rows = scale_raw('./data/raw_data.csv', raw_path, factor)
+            notebook_dir = os.path.join(workdir, f'notebook_{factor}x')
+            pipeline_dir = os.path.join(workdir, f'pipeline_{factor}x')
+            os.makedirs(notebook_dir)
+            t_notebook = timed(notebook_transform, raw_path, notebook_dir)
+            t_pipeline = timed(run_pipeline, raw_path, pipeline_dir)
+            print(f"{factor:>5} {rows:>8} {t_notebook:>11.3f} {t_pipeline:>11.3f} {t_notebook / t_pipeline:>8.1f}x")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100])
+    args = parser.parse_args()
+    run(args.scales)
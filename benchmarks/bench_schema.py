@@ -0,0 +1,132 @@
+'''
+Database size and query latency of the original layout (text keys) against
+the compact schema (integer surrogate keys, WITHOUT ROWID tables) at 1x, 10x
+and 100x the row count of nba.db.
+
+    python benchmarks/bench_schema.py [--scales 1 10 100] [--repeat 5]
+
+The original layout is timed with the queries Calculation ran on it, the
+compact schema with Calculation itself (uncached).
+'''
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pandas as pd
+
+import modules.database as db
+import modules.helper_functions as hlp
+from bench_snapshot import best_of, scale_database
+
+# Calculation queries on the original layout
+LEGACY_QUERIES = {
+    'calculate_mean_values': '''
+        SELECT ROUND(AVG(mi.pts), 2), ROUND(AVG(ms.ast), 2), ROUND(AVG(ms.reb), 2), ROUND(AVG(ms.stl), 2),
+        ROUND(AVG(ms.blk), 2), ROUND(AVG(ms.tov), 2), ROUND(AVG(ms.pf), 2)
+        FROM match_stats ms
+        JOIN match_info mi ON ms.match_id = mi.match_id AND ms.team_id = mi.team_id
+    ''',
+    'calculate_team_aggregates': '''
+        SELECT t.team_id, t.team_name, ROUND(AVG(mi.pts), 2), ROUND(AVG(ms.ast), 2), ROUND(AVG(ms.reb), 2),
+        ROUND(AVG(ms.stl), 2), ROUND(AVG(ms.tov), 2), ROUND(AVG(ms.blk), 2), ROUND(AVG(ms.pf), 2),
+        ROUND(100.0 * SUM(ms.fgm) / SUM(ms.fga), 2), ROUND(100.0 * SUM(ms.tpm) / SUM(ms.tpa), 2),
+        ROUND(100.0 * SUM(ms.ftm) / SUM(ms.fta), 2), COUNT(*)
+        FROM team_info t
+        JOIN match_stats ms ON t.team_id = ms.team_id
+        JOIN match_info mi ON ms.match_id = mi.match_id AND ms.team_id = mi.team_id
+        GROUP BY t.team_id, t.team_name
+    ''',
+    'calculate_total_stats': [
+        'SELECT SUM(min) FROM (SELECT DISTINCT match_id, min FROM match_info)',
+        'SELECT COUNT(DISTINCT match_id) FROM match_info',
+        'SELECT COUNT(DISTINCT date_id) FROM game_dates',
+        'SELECT SUM(fgm) FROM match_stats',
+        'SELECT SUM(pts) FROM match_info',
+    ],
+    'get_win_loss': '''
+        SELECT team_name, SUM(CASE WHEN result = 'W' THEN 1 ELSE 0 END) AS wins,
+        SUM(CASE WHEN result = 'L' THEN 1 ELSE 0 END) AS losses
+        FROM team_info
+        JOIN match_info ON team_info.team_id = match_info.team_id
+        GROUP BY team_name
+        ORDER BY wins DESC, team_name
+    ''',
+    'get_match_stats': '''
+        SELECT ms.match_id, ms.team_id, ti.team_name, ms.fgm, ms.fga, ms.tpm, ms.tpa, ms.ftm, ms.fta, ms.oreb,
+        ms.dreb, ms.reb, ms.ast, ms.tov, ms.stl, ms.blk, ms.pf, mi.pts
+        FROM matchups m
+        JOIN match_stats ms ON ms.match_id = m.match_id
+        JOIN match_info mi ON mi.match_id = ms.match_id AND mi.team_id = ms.team_id
+        JOIN team_info ti ON ti.team_id = ms.team_id
+        WHERE m.team_a = 'BOS' AND m.team_b = 'LAL'
+        ORDER BY ms.date_id, ms.match_id, ms.team_id
+    ''',
+}
+
+
+def build_legacy_matchups(conn: sqlite3.Connection):
+    conn.execute('''
+        CREATE TABLE matchups(team_a TEXT NOT NULL, team_b TEXT NOT NULL, match_id TEXT NOT NULL,
+        PRIMARY KEY (team_a, team_b, match_id)) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        INSERT INTO matchups SELECT MIN(team_id), MAX(team_id), match_id
+        FROM match_info GROUP BY match_id HAVING COUNT(DISTINCT team_id) = 2
+    ''')
+    conn.commit()
+
+
+def file_size(conn: sqlite3.Connection, db_file: str) -> int:
+    conn.execute('VACUUM')
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    return os.path.getsize(db_file)
+
+
+def run(scales, repeat):
+    workdir = tempfile.mkdtemp(prefix='nba_schema_')
+    try:
+        print(f"{'scale':>5} {'rows':>8} {'':<30} {'original':>10} {'compact':>10} {'ratio':>7}")
+        for factor in scales:
+            db_file = os.path.join(workdir, f'nba_{factor}x.db')
+            scale_database('nba.db', db_file, factor)
+            conn = sqlite3.connect(db_file)
+            rows = conn.execute('SELECT COUNT(*) FROM match_stats').fetchone()[0]
+            build_legacy_matchups(conn)
+            size_before = file_size(conn, db_file)
+            before = {}
+            for method, queries in LEGACY_QUERIES.items():
+                queries = queries if isinstance(queries, list) else [queries]
+                before[method] = best_of(lambda: [pd.read_sql(q, conn) for q in queries], repeat)
+
+            start = time.perf_counter()
+            db.prepare_database(conn)
+            migration = time.perf_counter() - start
+            size_after = file_size(conn, db_file)
+            calc = hlp.Calculation(conn, cache=None)
+            after = {method: best_of(getattr(calc, method), repeat)
+                     for method in LEGACY_QUERIES if method != 'get_match_stats'}
+            after['get_match_stats'] = best_of(lambda: calc.get_match_stats('LAL', 'BOS'), repeat)
+            conn.close()
+
+            print(f"{factor:>5} {rows:>8} {'size (KiB)':<30} {size_before / 1024:>10.0f} {size_after / 1024:>10.0f} "
+                  f"{size_before / size_after:>6.2f}x")
+            print(f"{factor:>5} {rows:>8} {'migration (ms)':<30} {'':>10} {migration * 1000:>10.1f}")
+            for method in LEGACY_QUERIES:
+                print(f"{factor:>5} {rows:>8} {method + ' (ms)':<30} {before[method] * 1000:>10.2f} "
+                      f"{after[method] * 1000:>10.2f} {before[method] / after[method]:>6.2f}x")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    run(args.scales, args.repeat)
@@ -0,0 +1,78 @@
+'''
+Payload and server-side cost of the FGA vs FG% chart at 1x, 10x and 100x the
+row count of nba.db: the SVG scatter of every box score the page used to
+send against Visualisation.create_shooting_chart, which switches to binned
+counts past SHOOTING_MAX_POINTS box scores.
+
+    python benchmarks/bench_shooting.py [--scales 1 10 100] [--repeat 5]
+
+The timings include the query and the JSON serialization st.plotly_chart
+does; browser rendering is not measured.
+'''
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import plotly.graph_objects as go
+import plotly.io as pio
+
+import modules.database as db
+import modules.helper_functions as hlp
+from bench_snapshot import best_of, scale_database
+
+
+def svg_scatter(calc) -> str:
+    '''
+    The chart as main.py drew it: every box score as an SVG marker.
+    '''
+    df = calc.get_shooting_points()
+    df['fgp_scaled'] = (df['fgp'] - df['fgp'].min()) / (df['fgp'].max() - df['fgp'].min())
+    df['marker_size'] = df['fga'] * df['fgp_scaled']
+    fig = go.Figure(go.Scatter(x=df['fga'], y=df['fgp'], mode='markers',
+                               marker=dict(size=df['marker_size'] / 5, color=df['marker_size'],
+                                           colorscale=hlp.SHOOTING_COLOR_SCALE, colorbar=dict(title='Marker size'),
+                                           line=dict(color='gray', width=1))))
+    fig.update_layout(xaxis_title='Field Goals Attempted', yaxis_title='Field Goal Percentage', height=600)
+    return pio.to_json(fig, validate=False)
+
+
+def shooting_chart(calc, viz) -> str:
+    df, binned = calc.get_shooting_data()
+    return pio.to_json(viz.create_shooting_chart(df, binned), validate=False)
+
+
+def run(scales, repeat):
+    workdir = tempfile.mkdtemp(prefix='nba_shooting_')
+    try:
+        print(f"{'scale':>5} {'rows':>8} {'chart':<12} {'trace':<10} {'payload KiB':>12} {'ms':>9}")
+        for factor in scales:
+            db_file = os.path.join(workdir, f'nba_{factor}x.db')
+            scale_database('nba.db', db_file, factor)
+            conn = sqlite3.connect(db_file)
+            db.prepare_database(conn)
+            calc = hlp.Calculation(conn, cache=None)
+            viz = hlp.Visualisation(conn, cache=None)
+            rows = conn.execute('SELECT COUNT(*) FROM box_scores').fetchone()[0]
+            df, binned = calc.get_shooting_data()
+            trace = 'heatmap' if binned else 'scattergl'
+            for name, trace_type, fn in (('svg scatter', 'scatter', lambda: svg_scatter(calc)),
+                                         ('new', trace, lambda: shooting_chart(calc, viz))):
+                size = len(fn())
+                seconds = best_of(fn, repeat)
+                print(f"{factor:>5} {rows:>8} {name:<12} {trace_type:<10} {size / 1024:>12.1f} {seconds * 1000:>9.1f}")
+            conn.close()
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    run(args.scales, args.repeat)
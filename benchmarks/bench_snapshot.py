@@ -0,0 +1,92 @@
+'''
+Compare the SQL and the columnar snapshot paths of Calculation at 1x, 10x and
+100x the row count of nba.db.
+
+    python benchmarks/bench_snapshot.py [--scales 1 10 100] [--repeat 5]
+
+The scaled databases replicate every game with a suffixed match_id and shifted
+date_id, so the distribution of the stats is unchanged.
+'''
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import modules.helper_functions as hlp
+from modules.snapshot import load_snapshot, write_snapshot
+
+METHODS = ['calculate_team_aggregates', 'calculate_mean_values', 'calculate_total_stats',
+           'get_win_loss', 'get_shooting_points']
+
+
+def scale_database(source: str, target: str, factor: int):
+    shutil.copy(source, target)
+    conn = sqlite3.connect(target)
+    max_date = conn.execute('SELECT MAX(date_id) FROM game_dates').fetchone()[0]
+    for k in range(1, factor):
+        offset = k * max_date
+        conn.execute('''
+            INSERT INTO game_dates(date_id, game_date)
+            SELECT date_id + ?, DATE(game_date, ? || ' years') FROM game_dates WHERE date_id <= ?
+        ''', (offset, str(k), max_date))
+        conn.execute('''
+            INSERT INTO match_info
+            SELECT match_id || '_' || ?, team_id, date_id + ?, result, min, pts
+            FROM match_info WHERE date_id <= ?
+        ''', (k, offset, max_date))
+        conn.execute('''
+            INSERT INTO match_stats
+            SELECT match_id || '_' || ?, team_id, date_id + ?, fgm, fga, fgp, tpm, tpa, tpp,
+            ftm, fta, ftp, oreb, dreb, reb, ast, tov, stl, blk, pf
+            FROM match_stats WHERE date_id <= ?
+        ''', (k, offset, max_date))
+    conn.commit()
+    conn.close()
+
+
+def best_of(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run(scales, repeat):
+    workdir = tempfile.mkdtemp(prefix='nba_bench_')
+    try:
+        print(f"{'scale':>5} {'rows':>8} {'method':<28} {'sql ms':>9} {'snapshot ms':>12} {'speed-up':>9}")
+        for factor in scales:
+            db_file = os.path.join(workdir, f'nba_{factor}x.db')
+            scale_database('nba.db', db_file, factor)
+            conn = sqlite3.connect(db_file)
+            rows = conn.execute('SELECT COUNT(*) FROM match_stats').fetchone()[0]
+            snapshot_dir = os.path.join(workdir, f'snapshot_{factor}x')
+            write_snapshot(conn, snapshot_dir)
+
+            load = best_of(lambda: load_snapshot(snapshot_dir), repeat)
+            print(f"{factor:>5} {rows:>8} {'load_snapshot':<28} {'':>9} {load * 1000:>12.2f}")
+            sql = hlp.Calculation(conn, cache=None)
+            columnar = hlp.Calculation(conn, cache=None, snapshot=load_snapshot(snapshot_dir))
+            for method in METHODS:
+                t_sql = best_of(getattr(sql, method), repeat)
+                t_snapshot = best_of(getattr(columnar, method), repeat)
+                print(f"{factor:>5} {rows:>8} {method:<28} {t_sql * 1000:>9.2f} {t_snapshot * 1000:>12.2f} "
+                      f"{t_sql / t_snapshot:>8.1f}x")
+            conn.close()
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    run(args.scales, args.repeat)
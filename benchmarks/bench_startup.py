@@ -0,0 +1,136 @@
+'''
+Cold start of the app, every measurement in a fresh interpreter:
+
+- import: `python -X importtime` of the modules main.py imports, on top of
+  streamlit (which `streamlit run` has loaded before the script starts),
+- first paint: from process start until the script sends its first element
+  to the browser, in a headless AppTest run,
+- full page: until the first run of the script has finished.
+
+    python benchmarks/bench_startup.py [--repeat 5] [--json startup.jsonl]
+
+With --json, one record per invocation (git revision, date, medians) is
+appended to the file so the numbers can be tracked over releases. nba.db
+must already be prepared (python -m modules.database prepare, or an
+ingestion): the app only reads it. A first, uncounted run warms the OS page
+cache with nba.db and the compiled modules, so that every counted run starts
+from the same state and only the interpreter is cold.
+'''
+import argparse
+import ast
+import datetime
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+MAIN = os.path.join(ROOT, 'main.py')
+
+# Run in the child interpreter: report when the first element and the end of
+# the run reach the message queue
+CHILD = '''
+import time
+start = time.perf_counter()
+import json, sys
+sys.path.insert(0, {root!r})
+from streamlit.runtime.forward_msg_queue import ForwardMsgQueue
+from streamlit.testing.v1 import AppTest
+
+first_paint = None
+enqueue = ForwardMsgQueue.enqueue
+
+def timed_enqueue(self, msg):
+    global first_paint
+    if first_paint is None and msg.WhichOneof('type') == 'delta':
+        first_paint = time.perf_counter() - start
+    return enqueue(self, msg)
+
+ForwardMsgQueue.enqueue = timed_enqueue
+at = AppTest.from_file({main!r}, default_timeout=120).run()
+if at.exception:
+    raise SystemExit(at.exception[0].message)
+print(json.dumps({{'first_paint': first_paint, 'full_page': time.perf_counter() - start}}))
+'''
+
+
+def app_imports(path: str = MAIN) -> str:
+    '''
+    The import statements of the script, wherever they are.
+    '''
+    with open(path) as f:
+        tree = ast.parse(f.read())
+    return '\n'.join(ast.unparse(node) for node in ast.walk(tree) if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+def import_time() -> tuple:
+    '''
+    Returns:
+        total (float), slowest (list): Seconds spent importing the app's
+        modules and the ten slowest top-level imports as (seconds, name).
+    '''
+    code = 'import streamlit\nimport sys\nsys.stderr.write("-- app --\\n")\n' + app_imports()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    lines = result.stderr.split('-- app --\n', 1)[1].splitlines()
+    top_level = []
+    for line in lines:
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|')
+        # Nested imports are indented below the module importing them
+        if name[1] == ' ':
+            continue
+        top_level.append((int(cumulative) / 1e6, name.strip()))
+    return sum(t for t, _ in top_level), sorted(top_level, reverse=True)[:10]
+
+
+def headless_run() -> dict:
+    child = CHILD.format(root=ROOT, main=MAIN)
+    result = subprocess.run([sys.executable, '-c', child], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(repeat, json_path):
+    # Not counted: warms the OS page cache (nba.db, the .pyc files)
+    headless_run()
+    imports, runs = [], []
+    slowest = None
+    for _ in range(repeat):
+        total, slowest = import_time()
+        imports.append(total)
+        runs.append(headless_run())
+    record = {
+        'revision': git_revision(),
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'import_ms': round(statistics.median(imports) * 1000, 1),
+        'first_paint_ms': round(statistics.median(r['first_paint'] for r in runs) * 1000, 1),
+        'full_page_ms': round(statistics.median(r['full_page'] for r in runs) * 1000, 1),
+    }
+    print(f"median of {repeat} cold starts")
+    print(f"{'import (ms)':<20} {record['import_ms']:>9}")
+    print(f"{'first paint (ms)':<20} {record['first_paint_ms']:>9}")
+    print(f"{'full page (ms)':<20} {record['full_page_ms']:>9}")
+    print('slowest imports of the last run:')
+    for seconds, name in slowest:
+        print(f"  {seconds * 1000:>8.1f} ms  {name}")
+    if json_path:
+        with open(json_path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', help='File the record of this run is appended to.')
+    args = parser.parse_args()
+    run(args.repeat, args.json)
@@ -0,0 +1,17 @@
+'''
+pytest-benchmark hooks keeping benchmarks/baseline.json small: the summary
+statistics of every benchmark without its raw timings, and the machine it
+was recorded on without the cpuinfo dump.
+'''
+
+
+def pytest_benchmark_update_machine_info(config, machine_info):
+    # Applied to the machine of the run as well, so that a comparison only
+    # warns about a different machine when the cpu or Python differ
+    cpu = machine_info.get('cpu', {})
+    machine_info['cpu'] = {key: cpu[key] for key in ('brand_raw', 'arch', 'count') if key in cpu}
+
+
+def pytest_benchmark_update_json(config, benchmarks, output_json):
+    for bench in output_json['benchmarks']:
+        bench['stats'].pop('data', None)
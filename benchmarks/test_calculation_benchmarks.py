@@ -0,0 +1,150 @@
+'''
+Regression benchmarks of Calculation on synthetic databases of 1, 10 and 100
+seasons (see modules.synthetic), with pytest-benchmark (requirements-dev.txt).
+Every query method is timed with the result cache disabled, and so is the
+batch of queries main.py runs on page load. The form table of get_team_form
+is also timed built from scratch and extended by a night of new games, the
+two paths of modules.form.FormEngine.
+
+    python -m pytest benchmarks/test_calculation_benchmarks.py --benchmark-compare=benchmarks/baseline.json --benchmark-compare-fail=median:100%
+
+fails when the median time of a benchmark doubled since the baseline; runs
+on the same machine vary by up to a third. The baseline only holds for the
+machine it was recorded on (see benchmarks/README.md). After an intended
+change, or on another machine, record it again:
+
+    python -m pytest benchmarks/test_calculation_benchmarks.py --benchmark-json=benchmarks/baseline.json
+
+NBA_BENCH_SCALES selects the sizes, e.g. NBA_BENCH_SCALES=1,10,100,1000 (the
+1000 season database takes about ten minutes to write and 300 MB). The
+databases are written once to data/synthetic/ and reused by later runs.
+'''
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+import modules.helper_functions as hlp
+from modules.executor import QueryBatch
+from modules.form import FormEngine
+from modules.pool import ConnectionPool
+from modules.synthetic import synthetic_path, write_synthetic_database
+
+pytest.importorskip('pytest_benchmark')
+
+SCALES = [int(scale) for scale in os.environ.get('NBA_BENCH_SCALES', '1,10,100').split(',')]
+
+# Method name -> arguments
+METHODS = {
+    'calculate_mean_values': (),
+    'calculate_team_aggregates': (),
+    'calculate_team_stats': (),
+    'calculate_total_stats': (),
+    'get_win_loss': (),
+    'get_shooting_points': (),
+    'get_shooting_data': (),
+    'get_teams': (),
+    'get_box_scores': (),
+    'get_match_stats': ('BOS', 'LAL'),
+    # Timed once modules.form holds the table of the database, as on every rerun of
+    # the app: see test_team_form_cold and test_team_form_incremental for the others
+    'get_team_form': (),
+    'get_head_to_head': (),
+    'get_ratings': (),
+}
+
+
+@pytest.fixture(scope='session', params=SCALES, ids=lambda scale: f'{scale}x')
+def database(request):
+    path = synthetic_path(request.param)
+    if not os.path.exists(path):
+        write_synthetic_database(path, request.param)
+    return path
+
+
+@pytest.fixture(scope='session')
+def pool(database):
+    pool = ConnectionPool(database)
+    yield pool
+    pool.close()
+
+
+@pytest.mark.parametrize('method', METHODS)
+def test_calculation(benchmark, pool, method):
+    calc = hlp.Calculation(pool, cache=None)
+    result = benchmark(getattr(calc, method), *METHODS[method])
+    assert result is not None
+
+
+def test_box_score(benchmark, database, pool):
+    conn = sqlite3.connect(database)
+    match_id = conn.execute('SELECT MAX(match_id) FROM match_info').fetchone()[0]
+    conn.close()
+    calc = hlp.Calculation(pool, cache=None)
+    match = benchmark(calc.get_box_score, match_id)
+    assert match['home']['team_id'] == match_id[8:11]
+
+
+def test_team_form_cold(benchmark, pool, monkeypatch):
+    calc = hlp.Calculation(pool, cache=None)
+
+    def forget_tables():
+        monkeypatch.setattr(hlp, 'FORM_ENGINE', FormEngine())
+
+    form = benchmark.pedantic(calc.get_team_form, setup=forget_tables, rounds=5)
+    assert len(form)
+
+
+@pytest.fixture(scope='session')
+def writable_database(database, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('form') / os.path.basename(database))
+    shutil.copy(database, path)
+    return path
+
+
+def test_team_form_incremental(benchmark, writable_database, monkeypatch):
+    conn = sqlite3.connect(writable_database)
+    last_date_id = conn.execute('SELECT MAX(date_id) FROM matches').fetchone()[0]
+    last_night = {table: conn.execute(f'''
+        SELECT * FROM {table} WHERE match_key IN (SELECT match_key FROM matches WHERE date_id = ?)
+    ''', (last_date_id,)).fetchall() for table in ['matches', 'match_results', 'box_scores']}
+    calc = hlp.Calculation(conn, cache=None)
+
+    def build_without_last_night():
+        monkeypatch.setattr(hlp, 'FORM_ENGINE', FormEngine())
+        for table in reversed(last_night):
+            conn.execute(f'DELETE FROM {table} WHERE match_key IN '
+                         f'(SELECT match_key FROM matches WHERE date_id = ?)', (last_date_id,))
+        conn.commit()
+        calc.get_team_form()
+        for table, rows in last_night.items():
+            conn.executemany(f"INSERT INTO {table} VALUES ({', '.join('?' * len(rows[0]))})", rows)
+        conn.commit()
+
+    form = benchmark.pedantic(calc.get_team_form, setup=build_without_last_night, rounds=5)
+    assert form['date_id'].max() == last_date_id
+    conn.close()
+
+
+def page_load(calc: hlp.Calculation) -> dict:
+    '''
+    The queries main.py submits before drawing the page.
+    '''
+    batch = QueryBatch()
+    batch.submit('team_stats', calc.calculate_team_stats)
+    batch.submit('total_stats', calc.calculate_total_stats)
+    batch.submit('mean_values', calc.calculate_mean_values)
+    batch.submit('win_loss', calc.get_win_loss)
+    batch.submit('shooting', calc.get_shooting_data, hlp.SHOOTING_MAX_POINTS)
+    batch.submit('teams', calc.get_teams)
+    batch.submit('form', calc.get_team_form)
+    batch.submit('head_to_head', calc.get_head_to_head)
+    batch.submit('ratings', calc.get_ratings)
+    return batch.gather()
+
+
+def test_page_load(benchmark, pool):
+    calc = hlp.Calculation(pool, cache=None)
+    page_data = benchmark(page_load, calc)
+    assert len(page_data['teams']) == 30
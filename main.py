@@ -1,15 +1,9 @@
-import streamlit as st
-import pandas as pd
-import plotly.express as px
-import numpy as np
-import plotly.graph_objects as go
+import atexit
+import json
+import os
 import sqlite3
-from sqlite3 import Error
-import modules.helper_functions as hlp
-from streamlit_extras.metric_cards import style_metric_cards
-from PIL import Image
 
-image = Image.open('./img/logo.png')
+import streamlit as st
 
 st.set_page_config(
     page_title="NBA Visualizer by Alexandru Nitulescu",
@@ -18,6 +12,14 @@ st.set_page_config(
     initial_sidebar_state="expanded",
 )
 
+@st.cache_resource
+def load_asset(path: str) -> bytes:
+    '''
+    Read a static file once per process, shared by every rerun and session.
+    '''
+    with open(path, 'rb') as f:
+        return f.read()
+
 def sidebar():
     st.sidebar.header('NBA Visualizer')
     st.sidebar.info(
@@ -34,30 +36,128 @@ def sidebar():
 
 sidebar()
 #st.title(':basketball: NBA Visualizer')
-st.image(image)
+st.image(load_asset('./img/logo.png'))
+
+# Imported once the sidebar and the logo are on screen: pandas (through the
+# modules) is most of the cold start, hence after the code above (E402)
+import numpy as np  # noqa: E402
+import plotly.graph_objects as go  # noqa: E402
+import modules.helper_functions as hlp  # noqa: E402
+import modules.database as db  # noqa: E402
+from modules.pool import ConnectionPool, read_only_uri  # noqa: E402
+from modules.replica import MemoryReplica  # noqa: E402
+from modules.snapshot import SNAPSHOT_DIR, load_snapshot, snapshot_fingerprint, snapshot_is_current  # noqa: E402
+from modules.executor import QueryBatch  # noqa: E402
+from modules.analyzer import match_analyzer  # noqa: E402
+from modules.trends import team_form  # noqa: E402
+from modules.instrumentation import QueryProfiler  # noqa: E402
+from modules.cache import RESULT_CACHE  # noqa: E402
+
 @st.cache_resource
-def create_connection(db_file: str) -> sqlite3.Connection:
+def create_pool(db_file: str) -> ConnectionPool:
     '''
-    Create a connection to an SQLite database file.
+    Open a pool of read-only connections to an SQLite database file. The app
+    never writes to the file: it only checks that the file was prepared
+    (python -m modules.database prepare, or an ingestion).
+    With NBA_MEMORY_REPLICA=1 the connections read from an in-memory copy of the
+    file that is refreshed whenever the file changes.
     Args:
         db_file (str): Path to the database file.
     Returns:
-        conn (sqlite3.Connection): A Connection object representing the database connection.
+        pool (ConnectionPool): Pool shared by every session of the app.
+    Raises:
+        SchemaError: If the file was not prepared for this version of the app.
+        sqlite3.Error: If the file cannot be opened.
     '''
-    conn = None
+    conn = sqlite3.connect(read_only_uri(db_file), uri=True)
     try:
-        conn = sqlite3.connect(db_file, check_same_thread=False)
-        print(f"Connection with {db_file} is sucessful!")
-        return conn
-    except Error as e:
-        print(e)
-    return conn
-
-conn = create_connection('nba.db')
-viz = hlp.Visualisation(conn)
-calc = hlp.Calculation(conn)
-t_ppg, t_ast, t_reb, t_stl, t_tov, t_blk, t_pf = calc.calculate_team_stats()
-df_count, df_dates, df_min, df_pts, df_fgm =calc.calculate_total_stats()
+        db.check_schema(conn)
+    finally:
+        conn.close()
+    replica = None
+    if os.environ.get('NBA_MEMORY_REPLICA') == '1':
+        replica = MemoryReplica(db_file).start()
+    return ConnectionPool(db_file, replica=replica)
+
+@st.cache_resource(max_entries=1)
+def open_snapshot(directory: str, fingerprint: tuple):
+    '''
+    Memory-map the columnar snapshot. The fingerprint is only part of the
+    cache key, so a rewritten snapshot is mapped again.
+    '''
+    return load_snapshot(directory)
+
+def profiling_panel(profiler: QueryProfiler):
+    '''
+    Collapsible sidebar table of the queries of this run, the slowest first.
+    '''
+    df = profiler.to_frame()
+    with st.sidebar.expander(f'Query profile ({len(df)} queries, {df["ms"].sum():.1f} ms)'):
+        st.caption('Results served from the cache run no query and are not listed.')
+        df['full_scans'] = df['full_scans'].str.join(', ')
+        df['plan'] = df['plan'].str.join(' | ')
+        st.dataframe(df, hide_index=True, width='stretch')
+
+def counters_panel(title: str, counters: dict):
+    '''
+    Collapsible sidebar view of counters shared by every session of the process.
+    '''
+    with st.sidebar.expander(title):
+        st.json(counters)
+
+@st.cache_resource
+def write_counters_on_exit(path: str, _pool: ConnectionPool):
+    '''
+    Write the counters of the result cache and of the connection pool to a
+    JSON file when the server stops, once per process (see benchmarks/bench_load.py).
+    '''
+    def write():
+        with open(path, 'w') as f:
+            json.dump({'cache': RESULT_CACHE.stats(), 'pool': _pool.stats()}, f)
+    atexit.register(write)
+
+# NBA_DB points the app at another database, e.g. a synthetic one (modules.synthetic)
+db_file = os.environ.get('NBA_DB', 'nba.db')
+try:
+    conn = create_pool(db_file)
+except (db.SchemaError, sqlite3.Error) as e:
+    st.error(f"Cannot read {db_file}: {e}")
+    st.stop()
+snapshot = None
+if os.environ.get('NBA_SNAPSHOT') == '1':
+    snapshot = open_snapshot(SNAPSHOT_DIR, snapshot_fingerprint(SNAPSHOT_DIR))
+    # The sections reading SQL would disagree with a snapshot of older data
+    if not snapshot_is_current(snapshot, conn):
+        st.warning(f"The snapshot in {SNAPSHOT_DIR} does not match {db_file}, the data is read from the database. "
+                   "Rewrite it with: python -m modules.snapshot")
+        snapshot = None
+# NBA_DEBUG=1 profiles the queries of every run in the sidebar, and appends
+# them as JSON lines to the file NBA_QUERY_LOG names
+profiler = None
+if os.environ.get('NBA_DEBUG') == '1':
+    profiler = QueryProfiler(log_path=os.environ.get('NBA_QUERY_LOG'))
+# NBA_STATS_FILE names the file the counters of the process are written to on shutdown
+if os.environ.get('NBA_STATS_FILE'):
+    write_counters_on_exit(os.environ['NBA_STATS_FILE'], conn)
+viz = hlp.Visualisation(conn, snapshot=snapshot)
+calc = hlp.Calculation(conn, snapshot=snapshot, profiler=profiler)
+
+# The page-load queries are independent, run them concurrently on the pool
+batch = QueryBatch()
+batch.submit('team_stats', calc.calculate_team_stats)
+batch.submit('total_stats', calc.calculate_total_stats)
+batch.submit('mean_values', calc.calculate_mean_values)
+batch.submit('win_loss', calc.get_win_loss)
+# Above this many box scores the scatter is drawn as a heatmap of binned counts
+max_points = int(os.environ.get('NBA_SCATTER_MAX_POINTS', hlp.SHOOTING_MAX_POINTS))
+batch.submit('shooting', calc.get_shooting_data, max_points)
+batch.submit('teams', calc.get_teams)
+batch.submit('form', calc.get_team_form)
+batch.submit('head_to_head', calc.get_head_to_head)
+batch.submit('ratings', calc.get_ratings)
+page_data = batch.gather()
+
+df_count, df_dates, df_min, df_pts, df_fgm = page_data['total_stats']
 
 st.markdown("""
 <style>
@@ -82,14 +182,6 @@ div[data-testid="metric-container"] > label[data-testid="stMetricLabel"] > div {
 """
 , unsafe_allow_html=True)
 
-avg_ppg = t_ppg['ppg'].mean()
-avg_astpg = t_ast['astpg'].mean()
-avg_rebpg = t_reb['rebpg'].mean()
-avg_stlpg = t_stl['stlpg'].mean()
-avg_tovpg = t_tov['tovpg'].mean()
-avg_blkpg = t_blk['blkpg'].mean()
-avg_pfpg = t_pf['pfpg'].mean()
-
 st.header("Summary")
 st.markdown("##### NBA Visualizer is a dynamic web app that provides a comprehensive look at the performance of NBA teams during the 2022-23 season. With scraped data and processed in the backend, the app provides insightful visualizations and analysis of key statistics. The user-friendly interface of the app, allows users to interact with the data and explore different visualizations that give them a better understanding of the performance of their favorite teams. With intuitive controls, users can filter and sort the data to focus on specific teams or statistics that interest them the most. NBA Visualizer offers a variety of charts and graphs that allow users to see trends and patterns in the data. From stacked bar charts to scatterplots, users can choose the visualizations that best suit their needs and preferences.")
 st.markdown('##### Made by **[Alexandru Nitulescu](https://www.linkedin.com/in/alexandru-nitulescu-035778153/)**')
@@ -119,7 +211,7 @@ st.markdown("""---""")
 st.header("NBA Team Average Stats")
 metric_1, metric_2, metric_3, metric_4, metric_5, metric_6, metric_7 = st.columns(7)
 
-mean_values = calc.calculate_mean_values()
+mean_values = page_data['mean_values']
 metric_1.metric(label="Points", value=mean_values['avg_pts'][0])
 metric_2.metric(label="Assists", value=mean_values['avg_ast'][0])
 metric_3.metric(label="Rebounds", value=mean_values['avg_reb'][0])
@@ -127,264 +219,30 @@ metric_4.metric(label="Steals", value=mean_values['avg_stl'][0])
 metric_5.metric(label="Blocks", value=mean_values['avg_blk'][0])
 metric_6.metric(label="Turnovers", value=mean_values['avg_tov'][0])
 metric_7.metric(label="Personal Fouls", value=mean_values['avg_pf'][0])
+# Only needed from here on, and slow to import: deferred like the modules above
+from streamlit_extras.metric_cards import style_metric_cards  # noqa: E402
 style_metric_cards()
 
-col4, col5, col6, col7, col8 = st.columns(5)
-subtab_avg_pts, subtab_avg_ast, subtab_avg_reb, subtab_avg_stl, subtab_avg_blk, subtab_avg_tov, subtab_avg_pf = st.tabs(['**Points per Game**', '**Assists per Game**', '**Rebounds per Game**', 
-                                                                                                                        '**Steals per Game**', '**Blocks per Game**', '**Turnovers per Game**', '**Personal Fouls per Game**'])
-with subtab_avg_pts:
-    c1, c2 = st.columns([2,1])
-    fig = go.Figure()
-    fig.add_trace(go.Bar(
-        y=t_ppg['team_name'], 
-        x=t_ppg['ppg'],
-        orientation='h', marker=dict(color=t_ppg['ppg'].apply(lambda x: '#0bb4ff' if x >= avg_ppg else '#e60049'))))
-    
-    fig.update_layout(
-        title={
-            'text':'Average Points per Game',
-            'font':{
-                    'family': 'sans-serif',
-                    'size': 14,
-                    },
-                },
-        xaxis_title='Points',
-        yaxis_title='',
-        xaxis_tickformat='.1f',
-        yaxis_autorange='reversed',
-        xaxis_showgrid=True,
-        xaxis_gridcolor='rgba(0, 0, 0, 0.4)', 
-        xaxis_ticks='outside',
-        yaxis_showgrid=False,
-        height=600, width=800,
-        font=dict(
-            family='sans-serif',
-            size=14))
-    
-    fig.update_xaxes(
-        range = [min(t_ppg['ppg']-1), max(t_ppg['ppg']+1)]
-    )
-    
-    c1.plotly_chart(fig, use_container_width=False)
-    t_ppg.index = np.arange(1, len(t_ppg) + 1)
-    c2.markdown("##### Preview Table of Points per Game")
-    c2.dataframe(t_ppg, height=560, use_container_width=True)
-with subtab_avg_ast:
-    c1, c2 = st.columns([2,1])
-    fig = go.Figure()
-    fig.add_trace(go.Bar(
-        y=t_ast['team_name'], 
-        x=t_ast['astpg'],
-        orientation='h', marker=dict(color=t_ast['astpg'].apply(lambda x: '#0bb4ff' if x >= avg_astpg else '#e60049'))))
-    
-    fig.update_layout(
-        title={
-            'text':'Average Assists per Game',
-            'font':{
-                    'family': 'sans-serif',
-                    'size': 14,
-                    },
-                },
-        xaxis_title='Assists',
-        xaxis_tickformat='.1f',
-        yaxis_autorange='reversed',
-        xaxis_showgrid=True,
-        xaxis_gridcolor='rgba(0, 0, 0, 0.4)', 
-        xaxis_ticks='outside',
-        yaxis_showgrid=False,
-        height=600, width=800,
-        font=dict(size=10))
-    
-    fig.update_xaxes(
-        range = [min(t_ast['astpg']-1), max(t_ast['astpg']+1)]
-    )
-    c1.plotly_chart(fig, use_container_width=True)
-    t_ast.index = np.arange(1, len(t_ast) + 1)
-    c2.markdown("##### Preview Table of Assists per Game")
-    c2.dataframe(t_ast, height=560, use_container_width=True)
-with subtab_avg_reb:
-    c1, c2 = st.columns([2,1])
-    fig = go.Figure()
-    fig.add_trace(go.Bar(
-        y=t_reb['team_name'], 
-        x=t_reb['rebpg'],
-        orientation='h', 
-        marker=dict(color=t_reb['rebpg'].apply(lambda x: '#0bb4ff' if x >= avg_rebpg else '#e60049'))))
-    
-    fig.update_layout(
-        title={
-            'text':'Average Rebounds per Game',
-            'font':{
-                    'family': 'sans-serif',
-                    'size': 14,
-                    },
-                },
-        xaxis_title='Rebounds',
-        xaxis_tickformat='.1f',
-        yaxis_autorange='reversed',
-        xaxis_showgrid=True,
-        xaxis_gridcolor='rgba(0, 0, 0, 0.4)', 
-        xaxis_ticks='outside',
-        yaxis_showgrid=False,
-        height=600, width=800,
-        font=dict(size=10))
-    
-    fig.update_xaxes(
-        range = [min(t_reb['rebpg']-1), max(t_reb['rebpg']+1)]
-    )
-    c1.plotly_chart(fig, use_container_width=True)
-    t_reb.index = np.arange(1, len(t_reb) + 1)
-    c2.markdown("##### Preview Table of Rebounds per Game")
-    c2.dataframe(t_reb, height=560, use_container_width=True)
-with subtab_avg_stl:
-    c1, c2 = st.columns([2,1])
-    fig = go.Figure()
-    fig.add_trace(go.Bar(
-        y=t_stl['team_name'], 
-        x=t_stl['stlpg'],
-        orientation='h', 
-        marker=dict(color=t_stl['stlpg'].apply(lambda x: '#0bb4ff' if x >= avg_stlpg else '#e60049'))))
-    
-    fig.update_layout(
-        title={
-            'text':'Average Steals per Game',
-            'font':{
-                    'family': 'sans-serif',
-                    'size': 14,
-                    },
-                },
-        xaxis_title='Steals',
-        xaxis_tickformat='.1f',
-        yaxis_autorange='reversed',
-        xaxis_showgrid=True,
-        xaxis_gridcolor='rgba(0, 0, 0, 0.4)', 
-        xaxis_ticks='outside',
-        yaxis_showgrid=False,
-        height=600, width=800,
-        font=dict(size=10))
-    
-    fig.update_xaxes(
-        range = [min(t_stl['stlpg']-1), max(t_stl['stlpg']+1)]
-    )
-    c1.plotly_chart(fig, use_container_width=True)
-    t_stl.index = np.arange(1, len(t_stl) + 1)
-    c2.markdown("##### Preview Table of Steals per Game")
-    c2.dataframe(t_stl, height=560, use_container_width=True)
-with subtab_avg_tov:
-    c1, c2 = st.columns([2,1])
-    fig = go.Figure()
-    fig.add_trace(go.Bar(
-        y=t_tov['team_name'], 
-        x=t_tov['tovpg'],
-        orientation='h', 
-        marker=dict(color=t_tov['tovpg'].apply(lambda x: '#0bb4ff' if x >= avg_tovpg else '#e60049'))))
-    
-    fig.update_layout(
-        title={
-            'text':'Average Turnovers per Game',
-            'font':{
-                    'family': 'sans-serif',
-                    'size': 14,
-                    },
-                },
-        xaxis_title='Turnovers',
-        xaxis_tickformat='.1f',
-        yaxis_autorange='reversed',
-        xaxis_showgrid=True,
-        xaxis_gridcolor='rgba(0, 0, 0, 0.4)', 
-        xaxis_ticks='outside',
-        yaxis_showgrid=False,
-        height=600, width=800,
-        font=dict(size=10))
-    
-    fig.update_xaxes(
-        range = [min(t_tov['tovpg']-1), max(t_tov['tovpg']+1)]
-    )
-    c1.plotly_chart(fig, use_container_width=True)
-    t_tov.index = np.arange(1, len(t_reb) + 1)
-    c2.markdown("##### Preview Table of Turnovers per Game")
-    c2.dataframe(t_tov, height=560, use_container_width=True)
-with subtab_avg_blk:
-    c1, c2 = st.columns([2,1])
-    fig = go.Figure()
-    fig.add_trace(go.Bar(
-        y=t_reb['team_name'], 
-        x=t_blk['blkpg'],
-        orientation='h', 
-        marker=dict(color=t_blk['blkpg'].apply(lambda x: '#0bb4ff' if x >= avg_blkpg else '#e60049'))))
-    
-    fig.update_layout(
-        title={
-            'text':'Average Blocks per Game',
-            'font':{
-                    'family': 'sans-serif',
-                    'size': 14,
-                    },
-                },
-        xaxis_title='Blocks',
-        xaxis_tickformat='.1f',
-        yaxis_autorange='reversed',
-        xaxis_showgrid=True,
-        xaxis_gridcolor='rgba(0, 0, 0, 0.4)', 
-        xaxis_ticks='outside',
-        yaxis_showgrid=False,
-        height=600, width=800,
-        font=dict(size=10))
-    
-    fig.update_xaxes(
-        range = [min(t_blk['blkpg']-1), max(t_blk['blkpg']+1)]
-    )
-    c1.plotly_chart(fig, use_container_width=True)
-    t_blk.index = np.arange(1, len(t_reb) + 1)
-    c2.markdown("##### Preview Table of Blocks per Game")
-    c2.dataframe(t_blk, height=560, use_container_width=True)
-with subtab_avg_pf:
-    c1, c2 = st.columns([2,1])
-    fig = go.Figure()
-    fig.add_trace(go.Bar(
-        y=t_reb['team_name'], 
-        x=t_pf['pfpg'],
-        orientation='h', 
-        marker=dict(color=t_pf['pfpg'].apply(lambda x: '#0bb4ff' if x >= avg_pfpg else '#e60049'))))
-    
-    fig.update_layout(
-        title={
-            'text':'Average Personal Fouls per Game',
-            'font':{
-                    'family': 'sans-serif',
-                    'size': 14,
-                    },
-                },
-        xaxis_title='Personal Fouls',
-        xaxis_tickformat='.1f',
-        yaxis_autorange='reversed',
-        xaxis_showgrid=True,
-        xaxis_gridcolor='rgba(0, 0, 0, 0.4)', 
-        xaxis_ticks='outside',
-        yaxis_showgrid=False,
-        height=600, width=800,
-        font=dict(size=10))
-    
-    fig.update_xaxes(
-        range = [min(t_pf['pfpg']-1), max(t_pf['pfpg']+1)]
-    )
-    c1.plotly_chart(fig, use_container_width=True)
-    t_pf.index = np.arange(1, len(t_pf) + 1)
-    c2.markdown("##### Preview Table of Personal Fouls per Game")
-    c2.dataframe(t_pf, height=560, use_container_width=True)
+# Tabs in display order
+tab_metrics = ['ppg', 'astpg', 'rebpg', 'stlpg', 'blkpg', 'tovpg', 'pfpg']
+team_stats = dict(zip(hlp.TEAM_METRICS, page_data['team_stats']))
+subtabs = st.tabs([f'**{hlp.METRIC_LABELS[metric]} per Game**' for metric in tab_metrics])
+for subtab, metric in zip(subtabs, tab_metrics):
+    with subtab:
+        c1, c2 = st.columns([2,1])
+        df_metric = team_stats[metric]
+        c1.plotly_chart(viz.create_ranked_bar(df_metric, metric), width='stretch')
+        df_metric.index = np.arange(1, len(df_metric) + 1)
+        c2.markdown(f"##### Preview Table of {hlp.METRIC_LABELS[metric]} per Game")
+        c2.dataframe(df_metric, height=560, width='stretch')
 
 st.markdown("""---""")
 st.header("Match Results")
 col9, col10 = st.columns([1, 3])
 col9.markdown("Preview Table of Match Results")
-df = pd.read_sql('''
-            SELECT team_name, 
-                    SUM(CASE WHEN result = 'W' THEN 1 ELSE 0 END) AS wins,
-                    SUM(CASE WHEN result = 'L' THEN 1 ELSE 0 END) AS losses
-           FROM team_info 
-           JOIN match_info ON team_info.team_id = match_info.team_id
-           GROUP BY team_name
-           ORDER BY wins DESC''', conn)
+df = page_data['win_loss']
+# Elo power rating next to the record (see modules.ratings)
+df = df.merge(page_data['ratings'][['team_name', 'rating']], on='team_name', how='left').round({'rating': 0})
 df.index = np.arange(1, len(df) + 1)
 fig = go.Figure()
 fig.add_trace(go.Bar
@@ -399,202 +257,35 @@ fig.add_trace(go.Bar
             name='Losses',
             marker=dict(color='#e60049')))
 fig.update_layout(barmode='stack', xaxis_tickangle=-45, height=600)
-col10.plotly_chart(fig, use_container_width=True)
-col9.dataframe(df, height=560, use_container_width=True)
+col10.plotly_chart(fig, width='stretch')
+col9.dataframe(df, height=560, width='stretch')
 st.markdown("""---""")
 
-st.header("Correlation between Field Goals Attempted and Field Goal Percentage")
-df = pd.read_sql('''
-    SELECT fga, fgp
-    FROM match_stats
-''', conn)
-
-df['fgp_scaled'] = (df['fgp'] - df['fgp'].min()) / (df['fgp'].max() - df['fgp'].min())
-df['marker_size'] = df['fga'] * df['fgp_scaled']
-color_scale = [[0.0, '#e60049'], [0.5, '#e6d800'], [1.0, '#00bfa0']]
+st.header("Head-to-Head")
+h2h = page_data['head_to_head']
+h2h_win, h2h_pts = st.tabs(['**Win %**', '**Point Margin per Game**'])
+h2h_win.plotly_chart(viz.create_head_to_head_heatmap(h2h), width='stretch')
+h2h_pts.plotly_chart(viz.create_head_to_head_heatmap(h2h, 'pts'), width='stretch')
+st.markdown("""---""")
 
-fig = go.Figure()
-fig.add_trace(go.Scatter(x=df['fga'], y=df['fgp'], mode='markers',
-                         marker=dict(size=df['marker_size']/5, color=df['marker_size'], 
-                                    colorscale=color_scale, colorbar=dict(title='Marker size'),
-                                    line=dict(color='gray', width=1))))
+st.header("Correlation between Field Goals Attempted and Field Goal Percentage")
+df, binned = page_data['shooting']
+st.plotly_chart(viz.create_shooting_chart(df, binned), width='stretch')
 
-fig.update_layout(
-                  xaxis_title='Field Goals Attempted',
-                  yaxis_title='Field Goal Percentage',
-                  height=600)
+st.markdown("""---""")
 
-st.plotly_chart(fig, use_container_width=True)
+st.header("Match Analyzer")
+# Reruns on its own when its widgets change
+match_analyzer(calc, viz, page_data['teams'])
 
 st.markdown("""---""")
 
-calc = hlp.Calculation(conn)
-viz = hlp.Visualisation(conn)
-
-st.header("Match Analyzer")
-teams = pd.read_sql(
-    '''
-    SELECT team_name, team_id
-    FROM team_info
-    ''', conn
-)
+st.header("Team Form")
+# Reruns on its own when its widgets change
+team_form(viz, page_data['form'], page_data['teams'], page_data['win_loss'])
 
-teams_dict = teams.set_index('team_id')['team_name'].to_dict()
-
-
-column1, column2, column3= st.columns([1,1,2])
-
-with column1:
-    selected_5 = st.selectbox("Select Team", list(teams_dict.values()))
-with column2:
-    selected_6 = st.selectbox("Select Teams", list(teams_dict.values()))
-
-selected_team1_id = list(teams_dict.keys())[list(teams_dict.values()).index(selected_5)]
-selected_team2_id = list(teams_dict.keys())[list(teams_dict.values()).index(selected_6)]
-df, match_ids = calc.get_match_stats(selected_team1_id, selected_team2_id)
-with column3:
-    options = st.multiselect("MatchIDS", options=match_ids, default=match_ids)
-if selected_5 != selected_6:
-    st.dataframe(df, use_container_width=True)
-
-column4, column5,column6 = st.columns([1,1,2])
-away_col, a_bar, h_bar, home_col = st.columns([1,2,2,1])
-header = [x for x in df.columns]
-
-if len(options) == 1:
-    match_id_rows = df.loc[df['match_id'] == options[0]]
-    row1 = match_id_rows.iloc[0].tolist()
-    row2 = match_id_rows.iloc[1].tolist()
-    selected = True
-    if row1[1] in row1[0]:
-        home_stats = row1
-        away_stats = row2
-    else:
-        home_stats = row2
-        away_stats = row1
-elif len(options)>1:
-    st.warning('Multiple id(s) will not show you match analysis. Filter down to a singular match.', icon="⚠️")
-
-else:
-    st.warning('No match id(s) have been selected. Select a specific game in order to take part of match analysis.', icon="⚠️")
-
-################
-################
-
-if len(options) == 1:
-    match_id_rows = df.loc[df['match_id'] == options[0]]
-    row1 = match_id_rows.iloc[0].tolist()
-    row2 = match_id_rows.iloc[1].tolist()
-
-    if row1[1] in row1[0]:
-        home_stats = row1
-        away_stats = row2
-    else:
-        home_stats = row2
-        away_stats = row1
-    a_fgp = round((away_stats[3]/away_stats[4])*100,1)
-    h_fgp = round((home_stats[3]/home_stats[4])*100,1)
-    a_ftp = round((away_stats[5]/away_stats[6])*100,1)
-    h_ftp = round((home_stats[5]/home_stats[6])*100,1)
-    a_tpp = round((away_stats[7]/away_stats[8])*100,1)
-    h_tpp = round((home_stats[7]/home_stats[8])*100,1)  
-
-    l_space, c1, c2, c3, c4, r_space  = st.columns((0.2, 1.2, 3, 3, 1.2, 0.2))
-    with l_space:
-        pass
-
-    with c1:
-        st.markdown(f"<h1 style='text-align: center;'> </h1>", unsafe_allow_html=True)
-        st.markdown(f"<h1 style='text-align: center;'> </h1>", unsafe_allow_html=True)
-        st.markdown(f"<h3 style='text-align: center;'> </h3>", unsafe_allow_html=True)
-        st.markdown(f"<p style='text-align: center;'> </p>", unsafe_allow_html=True)
-        st.markdown(f"<h3 style='text-align: center;'> </h3>", unsafe_allow_html=True)
-        st.markdown(f"<p style='text-align: center;'> </p>", unsafe_allow_html=True)
-
-        st.markdown(f"<h3 style='text-align: center;'>{away_stats[3]}/{away_stats[4]} ({a_fgp}%)</h3>", unsafe_allow_html=True)
-        st.markdown(f"<p style='text-align: center;'> </p>", unsafe_allow_html=True)
-        st.markdown(f"<h3 style='text-align: center;'>{away_stats[5]}/{away_stats[6]} ({a_ftp}%)</h3>", unsafe_allow_html=True)
-        st.markdown(f"<p style='text-align: center;'> </p>", unsafe_allow_html=True)
-        st.markdown(f"<h3 style='text-align: center;'>{away_stats[7]}/{away_stats[8]} ({a_tpp}%)</h3>", unsafe_allow_html=True)
-        st.markdown(f"<p style='text-align: center;'> </p>", unsafe_allow_html=True)
-        st.markdown(f"<h3 style='text-align: center;'>{away_stats[10]+away_stats[9]} REB</h3>", unsafe_allow_html=True)
-        st.markdown(f"<p style='text-align: center;'> </p>", unsafe_allow_html=True)
-        st.markdown(f"<h3 style='text-align: center;'>{away_stats[12]} AST</h3>", unsafe_allow_html=True)
-        st.markdown(f"<p style='text-align: center;'> </p>", unsafe_allow_html=True)
-        st.markdown(f"<h3 style='text-align: center;'>{away_stats[13]} TOV</h3>", unsafe_allow_html=True)
-        st.markdown(f"<p style='text-align: center;'> </p>", unsafe_allow_html=True)
-        st.markdown(f"<h3 style='text-align: center;'>{away_stats[14]} STL</h3>", unsafe_allow_html=True)
-        st.markdown(f"<p style='text-align: center;'> </p>", unsafe_allow_html=True)
-        st.markdown(f"<h3 style='text-align: center;'>{away_stats[15]} BLK</h3>", unsafe_allow_html=True)
-        st.markdown(f"<p style='text-align: center;'> </p>", unsafe_allow_html=True)
-        st.markdown(f"<h3 style='text-align: center;'>{away_stats[16]} PF</h3>", unsafe_allow_html=True)
-    with c2:
-        config = {'displayModeBar': False}
-        st.markdown(f"<h2 style='text-align: right;'>{away_stats[2]}</h2>", unsafe_allow_html=True)
-        st.markdown(f"<h2 style='text-align: center;'>{away_stats[-1]}</h2>", unsafe_allow_html=True)
-        fig = viz.create_bar(away_stats[3], away_stats[4], home=False, title="FGM", title2="Miss")
-        st.plotly_chart(fig, use_container_width=True,config=config)
-        fig = viz.create_bar(away_stats[5], away_stats[6], home=False, title="TPM", title2="Miss")
-        st.plotly_chart(fig, use_container_width=True,config=config)
-        fig = viz.create_bar(away_stats[7], away_stats[8], home=False, title="FTM", title2="Miss")
-        st.plotly_chart(fig, use_container_width=True, config=config)
-        fig1 = viz.create_bar(away_stats[10], away_stats[11], home=False, title="DREB", title2="OREB")
-        st.plotly_chart(fig1, use_container_width=True,config=config)
-        fig1 = viz.create_bar(away_stats[12], home_stats[12]+away_stats[12], home=False, title="AST", title2="OPP")
-        st.plotly_chart(fig1, use_container_width=True, config=config)
-        fig1 = viz.create_bar(away_stats[13], home_stats[13]+away_stats[13], home=False, title="TOV", title2="OPP")
-        st.plotly_chart(fig1, use_container_width=True, config=config)
-        fig1 = viz.create_bar(away_stats[14], home_stats[14]+away_stats[14], home=False, title="STL", title2="OPP")
-        st.plotly_chart(fig1, use_container_width=True, config=config)
-        fig1 = viz.create_bar(away_stats[15], home_stats[15]+away_stats[15], home=False, title="BLK", title2="OPP")
-        st.plotly_chart(fig1, use_container_width=True, config=config)
-        fig1 = viz.create_bar(away_stats[16], home_stats[16]+away_stats[16], home=False, title="PF", title2="OPP")
-        st.plotly_chart(fig1, use_container_width=True, config=config)
-    with c3:
-        st.markdown(f"<h2 style='text-align: left;'>{home_stats[2]}</h2>", unsafe_allow_html=True)
-        st.markdown(f"<h2 style='text-align: center;'>{home_stats[-1]}</h2>", unsafe_allow_html=True)
-        fig1 = viz.create_bar(home_stats[3], home_stats[4], home=True, title="FGM", title2="Miss")
-        st.plotly_chart(fig1, use_container_width=True,config=config)
-        fig1 = viz.create_bar(home_stats[5], home_stats[6], home=True, title="TPM", title2="Miss")
-        st.plotly_chart(fig1, use_container_width=True,config=config)
-        fig1 = viz.create_bar(home_stats[7], home_stats[8], home=True, title="FTM", title2="Miss")
-        st.plotly_chart(fig1, use_container_width=True,config=config)
-        fig1 = viz.create_bar(home_stats[10], home_stats[11], home=True, title="DREB", title2="OREB")
-        st.plotly_chart(fig1, use_container_width=True,config=config)
-        fig1 = viz.create_bar(home_stats[12], home_stats[12]+away_stats[12], home=True, title="AST", title2="OPP")
-        st.plotly_chart(fig1, use_container_width=True, config=config)
-        fig1 = viz.create_bar(home_stats[13], home_stats[13]+away_stats[13], home=True, title="TOV", title2="OPP")
-        st.plotly_chart(fig1, use_container_width=True, config=config)
-        fig1 = viz.create_bar(home_stats[14], home_stats[14]+away_stats[14], home=True, title="STL", title2="OPP")
-        st.plotly_chart(fig1, use_container_width=True, config=config)
-        fig1 = viz.create_bar(home_stats[15], home_stats[15]+away_stats[15], home=True, title="BLK", title2="OPP")
-        st.plotly_chart(fig1, use_container_width=True, config=config)
-        fig1 = viz.create_bar(home_stats[16], home_stats[16]+away_stats[16], home=True, title="PF", title2="OPP")
-        st.plotly_chart(fig1, use_container_width=True, config=config)
-    with c4:
-        st.markdown(f"<h1 style='text-align: center;'> </h1>", unsafe_allow_html=True)
-        st.markdown(f"<h1 style='text-align: center;'> </h1>", unsafe_allow_html=True)
-        st.markdown(f"<h3 style='text-align: center;'> </h3>", unsafe_allow_html=True)
-        st.markdown(f"<p style='text-align: center;'> </p>", unsafe_allow_html=True)
-        st.markdown(f"<h3 style='text-align: center;'> </h3>", unsafe_allow_html=True)
-        st.markdown(f"<p style='text-align: center;'> </p>", unsafe_allow_html=True)
-        
-        st.markdown(f"<h3 style='text-align: center;'>{home_stats[3]}/{home_stats[4]} ({h_fgp}%)</h3>", unsafe_allow_html=True)
-        st.markdown(f"<p style='text-align: center;'> </p>", unsafe_allow_html=True)
-        st.markdown(f"<h3 style='text-align: center;'>{home_stats[5]}/{home_stats[6]} ({h_ftp}%)</h3>", unsafe_allow_html=True)
-        st.markdown(f"<p style='text-align: center;'> </p>", unsafe_allow_html=True)
-        st.markdown(f"<h3 style='text-align: center;'>{home_stats[7]}/{home_stats[8]} ({h_tpp}%)</h3>", unsafe_allow_html=True)
-        st.markdown(f"<p style='text-align: center;'> </p>", unsafe_allow_html=True)
-        st.markdown(f"<h3 style='text-align: center;'>{home_stats[10]+home_stats[9]} REB</h3>", unsafe_allow_html=True)
-        st.markdown(f"<p style='text-align: center;'> </p>", unsafe_allow_html=True)
-        st.markdown(f"<h3 style='text-align: center;'>{home_stats[12]} AST</h3>", unsafe_allow_html=True)
-        st.markdown(f"<p style='text-align: center;'> </p>", unsafe_allow_html=True)
-        st.markdown(f"<h3 style='text-align: center;'>{home_stats[13]} TOV</h3>", unsafe_allow_html=True)
-        st.markdown(f"<p style='text-align: center;'> </p>", unsafe_allow_html=True)
-        st.markdown(f"<h3 style='text-align: center;'>{home_stats[14]} STL</h3>", unsafe_allow_html=True)
-        st.markdown(f"<p style='text-align: center;'> </p>", unsafe_allow_html=True)
-        st.markdown(f"<h3 style='text-align: center;'>{home_stats[15]} BLK</h3>", unsafe_allow_html=True)
-        st.markdown(f"<p style='text-align: center;'> </p>", unsafe_allow_html=True)
-        st.markdown(f"<h3 style='text-align: center;'>{home_stats[16]} PF</h3>", unsafe_allow_html=True)
-    with r_space:
-        pass
\ No newline at end of file
+if profiler is not None:
+    profiling_panel(profiler)
+    # Counted since the server started, over every session
+    counters_panel('Result cache', RESULT_CACHE.stats())
+    counters_panel('Connection pool', conn.stats())
@@ -0,0 +1,63 @@
+import pandas as pd
+import streamlit as st
+
+import modules.helper_functions as hlp
+
+
+@st.fragment
+def match_analyzer(calc: hlp.Calculation, viz: hlp.Visualisation, teams: pd.DataFrame):
+    '''
+    Match Analyzer section of the dashboard: two team selectboxes, their
+    head-to-head record, the games between them and the box score panel of
+    a single selected game. The record comes from the head-to-head matrix,
+    and the games are only queried for teams that met.
+    It runs as a Streamlit fragment, so interacting with its widgets reruns
+    only this function and not the whole page.
+    Args:
+        calc (Calculation): Source of the games between the teams and of the box scores.
+        viz (Visualisation): Builds the match panel.
+        teams (pd.DataFrame): Columns team_id and team_name, as returned by Calculation.get_teams.
+    '''
+    teams_dict = teams.set_index('team_id')['team_name'].to_dict()
+    team_names = list(teams_dict.values())
+
+    column1, column2, column3 = st.columns([1, 1, 2])
+    with column1:
+        selected_5 = st.selectbox("Select Team", team_names)
+    with column2:
+        selected_6 = st.selectbox("Select Teams", team_names)
+
+    selected_team1_id = list(teams_dict)[team_names.index(selected_5)]
+    selected_team2_id = list(teams_dict)[team_names.index(selected_6)]
+    record = calc.get_head_to_head().record(selected_team1_id, selected_team2_id)
+    df, match_ids = None, []
+    if selected_5 != selected_6 and record['games']:
+        df, match_ids = calc.get_match_stats(selected_team1_id, selected_team2_id)
+    with column3:
+        options = st.multiselect("MatchIDS", options=match_ids, default=match_ids)
+    if selected_5 != selected_6:
+        st.markdown(f"**{selected_5}** against **{selected_6}**: {record['wins']}-{record['losses']}"
+                    + (f", {record['pts_diff']:+.1f} points per game" if record['games'] else ''))
+    if df is not None:
+        st.dataframe(df, width='stretch')
+
+    if len(options) > 1:
+        st.warning('Multiple id(s) will not show you match analysis. Filter down to a singular match.', icon="⚠️")
+        return
+    if not options:
+        st.warning('No match id(s) have been selected. Select a specific game in order to take part of match analysis.', icon="⚠️")
+        return
+
+    match = calc.get_box_score(options[0])
+    home_stats, away_stats = match['home'], match['away']
+
+    l_space, c2, c3, r_space = st.columns((1.4, 3, 3, 1.4))
+    with c2:
+        st.markdown(f"<h2 style='text-align: right;'>{away_stats['team_name']}</h2>", unsafe_allow_html=True)
+        st.markdown(f"<h2 style='text-align: center;'>{away_stats['pts']}</h2>", unsafe_allow_html=True)
+    with c3:
+        st.markdown(f"<h2 style='text-align: left;'>{home_stats['team_name']}</h2>", unsafe_allow_html=True)
+        st.markdown(f"<h2 style='text-align: center;'>{home_stats['pts']}</h2>", unsafe_allow_html=True)
+    config = {'displayModeBar': False}
+    fig = viz.create_match_panel(match)
+    st.plotly_chart(fig, width='stretch', config=config)
@@ -0,0 +1,151 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+import pandas as pd
+
+
+class ResultCache:
+    '''
+    Thread-safe LRU cache with a time-to-live, shared by every Streamlit session
+    of the process. Keys are built by the `cached` decorator and contain the
+    database fingerprint, so entries are invalidated when the data changes.
+    '''
+    def __init__(self, maxsize: int = 256, ttl: float = 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        '''
+        Look up a key.
+        Args:
+            key (tuple): Cache key.
+        Returns:
+            (found, value) (tuple): found is False on a miss or an expired entry.
+        '''
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                self.evictions += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        '''
+        Returns:
+            stats (dict): Hit/miss/eviction counters, the hit ratio and the current size.
+        '''
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+            }
+
+
+RESULT_CACHE = ResultCache()
+
+
+def database_fingerprint(conn) -> tuple:
+    '''
+    Identify the current version of the data behind a connection.
+    For file databases the fingerprint is the path, mtime and size of the
+    database file and its WAL, which is the same for every connection to the
+    file. Pools reading from a MemoryReplica use the replica generation and
+    in-memory databases fall back to the connection and its data_version.
+    Args:
+        conn (sqlite3.Connection | ConnectionPool): Connection or pool to the database.
+    Returns:
+        fingerprint (tuple): Hashable value that changes when the data changes.
+    '''
+    replica = getattr(conn, 'replica', None)
+    if replica is not None:
+        # Served from an in-memory copy: the data only changes when it is swapped
+        return (replica.db_file, 'replica', replica.generation)
+    path = getattr(conn, 'db_file', None)
+    if path is None:
+        path = conn.execute('PRAGMA database_list').fetchone()[2]
+    if not path:
+        return (id(conn), conn.execute('PRAGMA data_version').fetchone()[0])
+    fingerprint = [path]
+    for file in (path, path + '-wal'):
+        try:
+            stat = os.stat(file)
+        except FileNotFoundError:
+            stat = None
+        # Readers create an empty WAL on open; only a non-empty one holds data.
+        if stat is None or stat.st_size == 0:
+            fingerprint += [None, 0]
+        else:
+            fingerprint += [stat.st_mtime_ns, stat.st_size]
+    return tuple(fingerprint)
+
+
+def _copy_result(value):
+    # Callers are free to mutate what they get back (e.g. reassign the index),
+    # so the cached object itself is never handed out.
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy()
+    if isinstance(value, tuple):
+        return tuple(_copy_result(v) for v in value)
+    if isinstance(value, list):
+        return [_copy_result(v) for v in value]
+    return value
+
+
+def data_fingerprint(owner) -> tuple:
+    '''
+    Fingerprint of the data an object reads: its `conn` and, when it has one,
+    its columnar `snapshot`.
+    '''
+    snapshot = getattr(owner, 'snapshot', None)
+    return database_fingerprint(owner.conn), getattr(snapshot, 'fingerprint', None)
+
+
+def cached(method):
+    '''
+    Cache the result of a Calculation method in `self.cache`, keyed by the
+    method name, its arguments and the fingerprint of `self.conn` (and of
+    `self.snapshot` when the Calculation reads from a columnar snapshot).
+    '''
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        cache = getattr(self, 'cache', None)
+        if cache is None:
+            return method(self, *args, **kwargs)
+        key = (method.__qualname__, args, tuple(sorted(kwargs.items())), data_fingerprint(self))
+        found, value = cache.get(key)
+        if not found:
+            value = method(self, *args, **kwargs)
+            cache.set(key, value)
+        return _copy_result(value)
+    return wrapper
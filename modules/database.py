@@ -0,0 +1,652 @@
+import argparse
+import re
+import sqlite3
+
+from modules.ratings import check_ratings, rebuild_ratings, update_ratings
+
+q_create_gamedates_table = '''
+    CREATE TABLE IF NOT EXISTS game_dates(
+        date_id INTEGER PRIMARY KEY,
+        game_date DATE
+    );
+'''
+
+# Compact schema: matches and teams get integer surrogate keys, the per-team
+# rows are clustered on (match_key, team_key) in WITHOUT ROWID tables.
+# Every team id seen in the games gets a key, even without a team_details row
+# (the games list Phoenix as PHX, team_info as PHO).
+q_create_teams_table = '''
+    CREATE TABLE IF NOT EXISTS teams(
+        team_key INTEGER PRIMARY KEY,
+        team_id TEXT NOT NULL UNIQUE
+    );
+'''
+
+q_create_team_details_table = '''
+    CREATE TABLE IF NOT EXISTS team_details(
+        team_key INTEGER PRIMARY KEY,
+        team_name TEXT,
+        arena_name TEXT,
+        latitude REAL,
+        longitude REAL
+    );
+'''
+
+q_create_matches_table = '''
+    CREATE TABLE IF NOT EXISTS matches(
+        match_key INTEGER PRIMARY KEY,
+        match_id TEXT NOT NULL UNIQUE,
+        date_id INTEGER,
+        season INTEGER
+    );
+'''
+
+q_create_match_results_table = '''
+    CREATE TABLE IF NOT EXISTS match_results(
+        match_key INTEGER NOT NULL,
+        team_key INTEGER NOT NULL,
+        result TEXT,
+        min INTEGER,
+        pts INTEGER,
+        PRIMARY KEY (match_key, team_key)
+    ) WITHOUT ROWID;
+'''
+
+q_create_box_scores_table = '''
+    CREATE TABLE IF NOT EXISTS box_scores(
+        match_key INTEGER NOT NULL,
+        team_key INTEGER NOT NULL,
+        fgm INTEGER,
+        fga INTEGER,
+        fgp REAL,
+        tpm INTEGER,
+        tpa INTEGER,
+        tpp REAL,
+        ftm INTEGER,
+        fta INTEGER,
+        ftp REAL,
+        oreb INTEGER,
+        dreb INTEGER,
+        reb INTEGER,
+        ast INTEGER,
+        tov INTEGER,
+        stl INTEGER,
+        blk INTEGER,
+        pf INTEGER,
+        PRIMARY KEY (match_key, team_key)
+    ) WITHOUT ROWID;
+'''
+
+# The original tables, kept as views with the same columns so existing
+# queries (notebooks, snapshot, ingestion) keep working unchanged.
+q_create_team_info_view = '''
+    CREATE VIEW IF NOT EXISTS team_info AS
+    SELECT t.team_id, d.team_name, d.arena_name, d.latitude, d.longitude
+    FROM team_details d
+    JOIN teams t ON t.team_key = d.team_key;
+'''
+
+q_create_match_info_view = '''
+    CREATE VIEW IF NOT EXISTS match_info AS
+    SELECT m.match_id, t.team_id, m.date_id, r.result, r.min, r.pts
+    FROM match_results r
+    JOIN matches m ON m.match_key = r.match_key
+    JOIN teams t ON t.team_key = r.team_key;
+'''
+
+q_create_match_stats_view = '''
+    CREATE VIEW IF NOT EXISTS match_stats AS
+    SELECT m.match_id, t.team_id, m.date_id, b.fgm, b.fga, b.fgp, b.tpm, b.tpa, b.tpp, b.ftm, b.fta, b.ftp,
+    b.oreb, b.dreb, b.reb, b.ast, b.tov, b.stl, b.blk, b.pf
+    FROM box_scores b
+    JOIN matches m ON m.match_key = b.match_key
+    JOIN teams t ON t.team_key = b.team_key;
+'''
+
+# Inserting into a view upserts into the base tables. Rows whose values did
+# not change are not rewritten. The season is the year it started in
+# (2022 for 2022-23), a season starts in October.
+q_upsert_match = '''
+        INSERT INTO matches(match_id, date_id, season)
+        VALUES(NEW.match_id, NEW.date_id, (
+            SELECT CAST(strftime('%Y', game_date) AS INTEGER) - (CAST(strftime('%m', game_date) AS INTEGER) < 8)
+            FROM game_dates WHERE date_id = NEW.date_id))
+        ON CONFLICT(match_id) DO UPDATE SET date_id = excluded.date_id, season = excluded.season
+        WHERE date_id IS NOT excluded.date_id OR season IS NOT excluded.season
+'''
+
+q_upsert_team = '''
+        INSERT OR IGNORE INTO teams(team_id) VALUES(NEW.team_id)
+'''
+
+q_upsert_team_details = '''
+        INSERT INTO team_details(team_key, team_name, arena_name, latitude, longitude)
+        VALUES((SELECT team_key FROM teams WHERE team_id = NEW.team_id),
+               NEW.team_name, NEW.arena_name, NEW.latitude, NEW.longitude)
+        ON CONFLICT(team_key) DO UPDATE SET team_name = excluded.team_name, arena_name = excluded.arena_name,
+        latitude = excluded.latitude, longitude = excluded.longitude
+        WHERE team_name IS NOT excluded.team_name OR arena_name IS NOT excluded.arena_name
+        OR latitude IS NOT excluded.latitude OR longitude IS NOT excluded.longitude
+'''
+
+q_upsert_match_result = '''
+        INSERT INTO match_results(match_key, team_key, result, min, pts)
+        VALUES((SELECT match_key FROM matches WHERE match_id = NEW.match_id),
+               (SELECT team_key FROM teams WHERE team_id = NEW.team_id),
+               NEW.result, NEW.min, NEW.pts)
+        ON CONFLICT(match_key, team_key) DO UPDATE SET result = excluded.result, min = excluded.min,
+        pts = excluded.pts
+        WHERE result IS NOT excluded.result OR min IS NOT excluded.min OR pts IS NOT excluded.pts
+'''
+
+BOX_SCORE_COLUMNS = ['fgm', 'fga', 'fgp', 'tpm', 'tpa', 'tpp', 'ftm', 'fta', 'ftp',
+                     'oreb', 'dreb', 'reb', 'ast', 'tov', 'stl', 'blk', 'pf']
+
+q_upsert_box_score = f'''
+        INSERT INTO box_scores(match_key, team_key, {', '.join(BOX_SCORE_COLUMNS)})
+        VALUES((SELECT match_key FROM matches WHERE match_id = NEW.match_id),
+               (SELECT team_key FROM teams WHERE team_id = NEW.team_id),
+               {', '.join(f'NEW.{c}' for c in BOX_SCORE_COLUMNS)})
+        ON CONFLICT(match_key, team_key) DO UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in BOX_SCORE_COLUMNS)}
+        WHERE {' OR '.join(f'{c} IS NOT excluded.{c}' for c in BOX_SCORE_COLUMNS)}
+'''
+
+# The statements of each view, in order. The last one writes the row itself,
+# the others the match and team it references.
+VIEW_UPSERTS = {
+    'team_info': [q_upsert_team, q_upsert_team_details],
+    'match_info': [q_upsert_match, q_upsert_team, q_upsert_match_result],
+    'match_stats': [q_upsert_match, q_upsert_team, q_upsert_box_score],
+}
+
+
+def view_upserts(view: str, columns: tuple) -> list:
+    '''
+    The upserts of a view with the columns of the row as numbered parameters
+    (?1 for NEW.<columns[0]>), to run them on whole batches of rows with
+    executemany instead of row by row through the insert trigger.
+    Args:
+        view (str): Name of the view.
+        columns (tuple): Order of the values in the rows.
+    Returns:
+        statements (list): The upserts, in the order they are run.
+    '''
+    return [re.sub(r'NEW\.(\w+)', lambda m: f'?{columns.index(m.group(1)) + 1}', statement)
+            for statement in VIEW_UPSERTS[view]]
+
+
+def _insert_trigger(view: str) -> str:
+    statements = ''.join(f'{statement.rstrip()};' for statement in VIEW_UPSERTS[view])
+    return f'''
+    CREATE TRIGGER IF NOT EXISTS {view}_insert INSTEAD OF INSERT ON {view}
+    BEGIN{statements}
+    END;
+'''
+
+
+q_create_team_info_insert_trigger = _insert_trigger('team_info')
+q_create_match_info_insert_trigger = _insert_trigger('match_info')
+q_create_match_stats_insert_trigger = _insert_trigger('match_stats')
+
+# Head-to-head index: one row per game, with the two team keys stored in sorted
+# order so that any pair of teams maps to a single key prefix.
+q_create_matchups_table = '''
+    CREATE TABLE IF NOT EXISTS matchups(
+        team_a INTEGER NOT NULL,
+        team_b INTEGER NOT NULL,
+        match_key INTEGER NOT NULL,
+        PRIMARY KEY (team_a, team_b, match_key)
+    ) WITHOUT ROWID;
+'''
+
+q_create_matchups_index = '''
+    CREATE INDEX IF NOT EXISTS idx_matchups_match_key ON matchups(match_key);
+'''
+
+# Materialized totals, kept current by triggers on the base tables, so reading
+# a total is a single-row lookup. A game without a known date is counted in
+# season 0.
+q_create_league_totals_table = '''
+    CREATE TABLE IF NOT EXISTS league_totals(
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        tot_matches INTEGER NOT NULL,
+        tot_dates INTEGER NOT NULL,
+        tot_minutes INTEGER NOT NULL,
+        tot_pts INTEGER NOT NULL,
+        tot_fgm INTEGER NOT NULL
+    );
+'''
+
+q_create_team_season_totals_table = '''
+    CREATE TABLE IF NOT EXISTS team_season_totals(
+        team_key INTEGER NOT NULL,
+        season INTEGER NOT NULL,
+        games INTEGER NOT NULL,
+        wins INTEGER NOT NULL,
+        losses INTEGER NOT NULL,
+        pts INTEGER NOT NULL,
+        PRIMARY KEY (team_key, season)
+    ) WITHOUT ROWID;
+'''
+
+# The same totals computed from scratch
+q_league_totals = '''
+    SELECT 1 AS id,
+    (SELECT COUNT(DISTINCT match_key) FROM match_results) AS tot_matches,
+    (SELECT COUNT(*) FROM game_dates) AS tot_dates,
+    (SELECT IFNULL(SUM(min), 0) FROM (SELECT DISTINCT match_key, min FROM match_results)) AS tot_minutes,
+    (SELECT IFNULL(SUM(pts), 0) FROM match_results) AS tot_pts,
+    (SELECT IFNULL(SUM(fgm), 0) FROM box_scores) AS tot_fgm
+'''
+
+q_team_season_totals = '''
+    SELECT r.team_key, IFNULL(m.season, 0) AS season, COUNT(*) AS games,
+    SUM(CASE WHEN r.result = 'W' THEN 1 ELSE 0 END) AS wins,
+    SUM(CASE WHEN r.result = 'L' THEN 1 ELSE 0 END) AS losses,
+    IFNULL(SUM(r.pts), 0) AS pts
+    FROM match_results r
+    JOIN matches m ON m.match_key = r.match_key
+    GROUP BY r.team_key, IFNULL(m.season, 0)
+'''
+
+q_create_game_dates_totals_triggers = [
+    '''
+    CREATE TRIGGER IF NOT EXISTS game_dates_totals_insert AFTER INSERT ON game_dates
+    BEGIN
+        UPDATE league_totals SET tot_dates = tot_dates + 1;
+    END;
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS game_dates_totals_delete AFTER DELETE ON game_dates
+    BEGIN
+        UPDATE league_totals SET tot_dates = tot_dates - 1;
+    END;
+    ''',
+]
+
+# A match counts once, and its minutes once per distinct value, so a row
+# only changes tot_matches and tot_minutes when no other row of its match
+# (with the same minutes) exists.
+q_add_team_season = '''
+        INSERT INTO team_season_totals(team_key, season, games, wins, losses, pts)
+        VALUES(NEW.team_key, IFNULL((SELECT season FROM matches WHERE match_key = NEW.match_key), 0), 1,
+               CASE WHEN NEW.result = 'W' THEN 1 ELSE 0 END, CASE WHEN NEW.result = 'L' THEN 1 ELSE 0 END,
+               IFNULL(NEW.pts, 0))
+        ON CONFLICT(team_key, season) DO UPDATE SET games = games + 1, wins = wins + excluded.wins,
+        losses = losses + excluded.losses, pts = pts + excluded.pts;
+'''
+
+q_remove_team_season = '''
+        UPDATE team_season_totals
+        SET games = games - 1,
+            wins = wins - CASE WHEN OLD.result = 'W' THEN 1 ELSE 0 END,
+            losses = losses - CASE WHEN OLD.result = 'L' THEN 1 ELSE 0 END,
+            pts = pts - IFNULL(OLD.pts, 0)
+        WHERE team_key = OLD.team_key
+        AND season = IFNULL((SELECT season FROM matches WHERE match_key = OLD.match_key), 0);
+'''
+
+q_create_match_results_totals_triggers = [
+    f'''
+    CREATE TRIGGER IF NOT EXISTS match_results_totals_insert AFTER INSERT ON match_results
+    BEGIN
+        UPDATE league_totals
+        SET tot_matches = tot_matches + NOT EXISTS (
+                SELECT 1 FROM match_results WHERE match_key = NEW.match_key AND team_key <> NEW.team_key),
+            tot_minutes = tot_minutes + CASE WHEN EXISTS (
+                SELECT 1 FROM match_results WHERE match_key = NEW.match_key AND team_key <> NEW.team_key
+                AND min IS NEW.min) THEN 0 ELSE IFNULL(NEW.min, 0) END,
+            tot_pts = tot_pts + IFNULL(NEW.pts, 0);{q_add_team_season}
+    END;
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS match_results_totals_delete AFTER DELETE ON match_results
+    BEGIN
+        UPDATE league_totals
+        SET tot_matches = tot_matches - NOT EXISTS (
+                SELECT 1 FROM match_results WHERE match_key = OLD.match_key),
+            tot_minutes = tot_minutes - CASE WHEN EXISTS (
+                SELECT 1 FROM match_results WHERE match_key = OLD.match_key AND min IS OLD.min)
+                THEN 0 ELSE IFNULL(OLD.min, 0) END,
+            tot_pts = tot_pts - IFNULL(OLD.pts, 0);{q_remove_team_season}
+        DELETE FROM team_season_totals WHERE team_key = OLD.team_key AND games = 0;
+    END;
+    ''',
+    # An update removes the old row and adds the new one, the updated row
+    # itself is excluded when looking for other rows of the match
+    f'''
+    CREATE TRIGGER IF NOT EXISTS match_results_totals_update AFTER UPDATE ON match_results
+    BEGIN
+        UPDATE league_totals
+        SET tot_matches = tot_matches - NOT EXISTS (
+                SELECT 1 FROM match_results WHERE match_key = OLD.match_key
+                AND NOT (match_key = NEW.match_key AND team_key = NEW.team_key))
+            + NOT EXISTS (
+                SELECT 1 FROM match_results WHERE match_key = NEW.match_key AND team_key <> NEW.team_key),
+            tot_minutes = tot_minutes - CASE WHEN EXISTS (
+                SELECT 1 FROM match_results WHERE match_key = OLD.match_key AND min IS OLD.min
+                AND NOT (match_key = NEW.match_key AND team_key = NEW.team_key))
+                THEN 0 ELSE IFNULL(OLD.min, 0) END
+            + CASE WHEN EXISTS (
+                SELECT 1 FROM match_results WHERE match_key = NEW.match_key AND team_key <> NEW.team_key
+                AND min IS NEW.min) THEN 0 ELSE IFNULL(NEW.min, 0) END,
+            tot_pts = tot_pts - IFNULL(OLD.pts, 0) + IFNULL(NEW.pts, 0);{q_remove_team_season}{q_add_team_season}
+        DELETE FROM team_season_totals WHERE team_key = OLD.team_key AND games = 0;
+    END;
+    ''',
+]
+
+q_create_box_scores_totals_triggers = [
+    '''
+    CREATE TRIGGER IF NOT EXISTS box_scores_totals_insert AFTER INSERT ON box_scores
+    BEGIN
+        UPDATE league_totals SET tot_fgm = tot_fgm + IFNULL(NEW.fgm, 0);
+    END;
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS box_scores_totals_delete AFTER DELETE ON box_scores
+    BEGIN
+        UPDATE league_totals SET tot_fgm = tot_fgm - IFNULL(OLD.fgm, 0);
+    END;
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS box_scores_totals_update AFTER UPDATE OF fgm ON box_scores
+    BEGIN
+        UPDATE league_totals SET tot_fgm = tot_fgm - IFNULL(OLD.fgm, 0) + IFNULL(NEW.fgm, 0);
+    END;
+    ''',
+]
+
+# Moving a game to another season moves its rows between team_season_totals
+q_create_matches_totals_trigger = '''
+    CREATE TRIGGER IF NOT EXISTS matches_totals_season AFTER UPDATE OF season ON matches
+    WHEN OLD.season IS NOT NEW.season
+    BEGIN
+        UPDATE team_season_totals
+        SET games = team_season_totals.games - 1,
+            wins = team_season_totals.wins - CASE WHEN r.result = 'W' THEN 1 ELSE 0 END,
+            losses = team_season_totals.losses - CASE WHEN r.result = 'L' THEN 1 ELSE 0 END,
+            pts = team_season_totals.pts - IFNULL(r.pts, 0)
+        FROM match_results r
+        WHERE r.match_key = NEW.match_key AND team_season_totals.team_key = r.team_key
+        AND team_season_totals.season = IFNULL(OLD.season, 0);
+        INSERT INTO team_season_totals(team_key, season, games, wins, losses, pts)
+        SELECT team_key, IFNULL(NEW.season, 0), 1, CASE WHEN result = 'W' THEN 1 ELSE 0 END,
+        CASE WHEN result = 'L' THEN 1 ELSE 0 END, IFNULL(pts, 0)
+        FROM match_results WHERE match_key = NEW.match_key
+        ON CONFLICT(team_key, season) DO UPDATE SET games = games + 1, wins = wins + excluded.wins,
+        losses = losses + excluded.losses, pts = pts + excluded.pts;
+        DELETE FROM team_season_totals WHERE games = 0;
+    END;
+'''
+
+# Tables of the original layout, converted by migrate_legacy_schema
+LEGACY_TABLES = ['team_info', 'match_info', 'match_stats']
+
+# Stored in PRAGMA user_version by refresh_derived_tables. Bump it when a change of
+# the schema or of the derived tables needs the prepare command to run again.
+SCHEMA_VERSION = 1
+
+
+class SchemaError(Exception):
+    '''Raised when a database was not prepared for the current schema.'''
+
+
+def refresh_matchups(conn: sqlite3.Connection) -> int:
+    '''
+    Bring the matchups table in line with match_results: add the games that are
+    missing and remove the ones that no longer exist.
+    Args:
+        conn (sqlite3.Connection): Writable connection to the database.
+    Returns:
+        added (int): Number of games added to the index.
+    '''
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(matchups)')]
+    if 'match_id' in columns:
+        # Index of the original layout, keyed by the text ids
+        conn.execute('DROP TABLE matchups')
+    conn.execute(q_create_matchups_table)
+    conn.execute(q_create_matchups_index)
+    conn.execute('''
+        DELETE FROM matchups
+        WHERE match_key NOT IN (SELECT match_key FROM match_results)
+    ''')
+    cur = conn.execute('''
+        INSERT OR IGNORE INTO matchups(team_a, team_b, match_key)
+        SELECT MIN(team_key), MAX(team_key), match_key
+        FROM match_results
+        GROUP BY match_key
+        HAVING COUNT(*) = 2
+    ''')
+    return cur.rowcount
+
+
+def rebuild_totals(conn: sqlite3.Connection):
+    '''
+    Recompute league_totals and team_season_totals from the base tables.
+    Args:
+        conn (sqlite3.Connection): Writable connection to the database.
+    '''
+    conn.execute('DELETE FROM league_totals')
+    conn.execute('DELETE FROM team_season_totals')
+    conn.execute(f'INSERT INTO league_totals {q_league_totals}')
+    conn.execute(f'INSERT INTO team_season_totals {q_team_season_totals}')
+
+
+def create_totals(conn: sqlite3.Connection):
+    '''
+    Create the materialized totals and the triggers maintaining them. The
+    totals are computed once when the tables are new, the triggers keep them
+    current from then on.
+    Args:
+        conn (sqlite3.Connection): Writable connection to the database.
+    '''
+    conn.execute(q_create_league_totals_table)
+    conn.execute(q_create_team_season_totals_table)
+    for query in (q_create_game_dates_totals_triggers + q_create_match_results_totals_triggers
+                  + q_create_box_scores_totals_triggers + [q_create_matches_totals_trigger]):
+        conn.execute(query)
+    if conn.execute('SELECT COUNT(*) FROM league_totals').fetchone()[0] == 0:
+        rebuild_totals(conn)
+
+
+def check_totals(conn: sqlite3.Connection) -> list:
+    '''
+    Compare the trigger-maintained totals with totals computed from scratch.
+    Args:
+        conn (sqlite3.Connection): Connection to the database.
+    Returns:
+        differences (list): (table, key, column, maintained, rebuilt) tuples, empty if consistent.
+    '''
+    differences = []
+    for table, query, key_size in (('league_totals', q_league_totals, 1),
+                                   ('team_season_totals', q_team_season_totals, 2)):
+        cur = conn.execute(query)
+        columns = [d[0] for d in cur.description]
+        rebuilt = {row[:key_size]: row for row in cur.fetchall()}
+        maintained = {row[:key_size]: row for row in conn.execute(f"SELECT {', '.join(columns)} FROM {table}")}
+        for key in sorted(maintained.keys() | rebuilt.keys()):
+            old = maintained.get(key, (None,) * len(columns))
+            new = rebuilt.get(key, (None,) * len(columns))
+            differences += [(table, key, column, a, b)
+                            for column, a, b in zip(columns[key_size:], old[key_size:], new[key_size:]) if a != b]
+    return differences
+
+
+def table_type(conn: sqlite3.Connection, name: str) -> str:
+    '''
+    Returns:
+        type (str): "table", "view", or None if the name does not exist.
+    '''
+    row = conn.execute('SELECT type FROM sqlite_master WHERE name = ?', (name,)).fetchone()
+    return row[0] if row else None
+
+
+def migrate_legacy_schema(conn: sqlite3.Connection) -> bool:
+    '''
+    Convert a database with the original layout (team_info, match_info and
+    match_stats as tables keyed by text ids) to the compact schema. The rows
+    are moved through the views, so the surrogate keys and seasons are
+    assigned by the same triggers as new data. Runs inside the caller's
+    transaction.
+    Args:
+        conn (sqlite3.Connection): Writable connection to the database.
+    Returns:
+        migrated (bool): False if there was nothing to convert.
+    '''
+    legacy = [table for table in LEGACY_TABLES if table_type(conn, table) == 'table']
+    if not legacy:
+        return False
+    for table in legacy:
+        conn.execute(f'ALTER TABLE {table} RENAME TO legacy_{table}')
+    create_tables(conn)
+    for table in LEGACY_TABLES:
+        if table in legacy:
+            conn.execute(f'INSERT INTO {table} SELECT * FROM legacy_{table}')
+            conn.execute(f'DROP TABLE legacy_{table}')
+    return True
+
+
+def create_tables(conn: sqlite3.Connection) -> bool:
+    '''
+    Create the tables, views and triggers of the database if they do not
+    exist yet, converting a database with the original layout first.
+    Args:
+        conn (sqlite3.Connection): Writable connection to the database.
+    Returns:
+        migrated (bool): True if the original layout was converted.
+    '''
+    if any(table_type(conn, table) == 'table' for table in LEGACY_TABLES):
+        return migrate_legacy_schema(conn)
+    for query in (q_create_gamedates_table, q_create_teams_table, q_create_team_details_table, q_create_matches_table,
+                  q_create_match_results_table, q_create_box_scores_table,
+                  q_create_team_info_view, q_create_match_info_view, q_create_match_stats_view,
+                  q_create_team_info_insert_trigger, q_create_match_info_insert_trigger,
+                  q_create_match_stats_insert_trigger):
+        conn.execute(query)
+    create_totals(conn)
+    return False
+
+
+def enable_wal(conn: sqlite3.Connection) -> str:
+    '''
+    Switch the database to write-ahead logging, so a writer (e.g. ingestion)
+    does not block readers. The setting is stored in the database file.
+    Args:
+        conn (sqlite3.Connection): Writable connection, outside of a transaction.
+    Returns:
+        journal_mode (str): The journal mode now in effect.
+    '''
+    return conn.execute('PRAGMA journal_mode=WAL').fetchone()[0]
+
+
+def refresh_derived_tables(conn: sqlite3.Connection):
+    '''
+    Refresh the matchups, rate the games added since the last run (see
+    modules.ratings) and record the schema version check_schema expects.
+    Runs inside the caller's transaction, after create_tables, so the derived
+    tables are committed together with the games they are derived from.
+    Args:
+        conn (sqlite3.Connection): Writable connection to the database, in a transaction.
+    '''
+    refresh_matchups(conn)
+    update_ratings(conn)
+    if schema_version(conn) != SCHEMA_VERSION:
+        conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+
+def reclaim_space(conn: sqlite3.Connection):
+    '''
+    Give the pages of the tables dropped by a migration back to the file
+    system. Runs outside of a transaction.
+    '''
+    conn.execute('VACUUM')
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+
+def prepare_database(conn: sqlite3.Connection):
+    '''
+    Create and refresh the derived tables the web app reads from, converting
+    the original layout to the compact schema on the first run (see
+    refresh_derived_tables). Run by the prepare command, never by the app;
+    ingestion refreshes the derived tables in its own transaction. A database
+    that is already up to date is left untouched.
+    Args:
+        conn (sqlite3.Connection): Writable connection to the database.
+    '''
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        migrated = create_tables(conn)
+        refresh_derived_tables(conn)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    if migrated:
+        reclaim_space(conn)
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def check_schema(conn: sqlite3.Connection):
+    '''
+    Make sure a database was prepared for the current code, without writing to it.
+    Args:
+        conn (sqlite3.Connection): Connection to the database, read-only is enough.
+    Raises:
+        SchemaError: If the database has another schema version.
+    '''
+    version = schema_version(conn)
+    if version != SCHEMA_VERSION:
+        path = conn.execute('PRAGMA database_list').fetchone()[2]
+        raise SchemaError(f"{path} has schema version {version} instead of {SCHEMA_VERSION}, "
+                          f"run: python -m modules.database prepare --db {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintenance of an NBA database.')
+    parser.add_argument('command', choices=['prepare', 'check-totals', 'check-ratings'],
+                        help='prepare: create, convert and refresh the derived tables. '
+                             'check-totals: rebuild the materialized totals from scratch and diff them. '
+                             'check-ratings: rate every game from scratch and diff the stored ratings.')
+    parser.add_argument('--db', default='nba.db', help='Path to the SQLite database file.')
+    parser.add_argument('--repair', action='store_true',
+                        help='With check-totals or check-ratings, replace the stored values by the rebuilt ones.')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    try:
+        if args.command == 'prepare':
+            prepare_database(conn)
+            print(f"{args.db} is ready.")
+            return
+        if args.command == 'check-ratings':
+            check, rebuild, what = check_ratings, rebuild_ratings, 'ratings'
+            if table_type(conn, 'team_ratings') is None:
+                parser.exit(1, f"{args.db} has no ratings yet, run the prepare command first.\n")
+            differences = check(conn)
+            for team_key, column, stored, rebuilt in differences:
+                print(f"team_ratings ({team_key},) {column}: stored {stored}, rebuilt {rebuilt}")
+        else:
+            check, rebuild, what = check_totals, rebuild_totals, 'materialized totals'
+            if table_type(conn, 'league_totals') is None:
+                parser.exit(1, f"{args.db} has no materialized totals yet, run the prepare command first.\n")
+            differences = check(conn)
+            for table, key, column, maintained, rebuilt in differences:
+                print(f"{table} {key} {column}: maintained {maintained}, rebuilt {rebuilt}")
+        if not differences:
+            print(f"The {what} are consistent.")
+        elif args.repair:
+            with conn:
+                rebuild(conn)
+            print(f"{len(differences)} differences repaired.")
+        else:
+            parser.exit(1, f"{len(differences)} differences found, run with --repair to rebuild the {what}.\n")
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
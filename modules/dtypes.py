@@ -0,0 +1,135 @@
+'''
+Column types of the frames returned by Calculation. Team and match
+identifiers are categoricals, counting stats of a single box score int16,
+counts summed over games int32 and percentages float32, so a cached result
+takes a fraction of the memory of the object/int64/float64 frames pandas
+reads from SQLite. Frames of a row per team at most (team lists, per-game
+averages, league totals) keep the types they are read with: casting their
+30 rows takes longer than the query and saves nothing worth caching.
+'''
+from functools import wraps
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import pandas_dtype
+
+CATEGORY = 'category'
+COUNT = np.dtype(np.int16)
+TOTAL = np.dtype(np.int32)
+PERCENT = np.dtype(np.float32)
+YEAR = np.dtype(np.int16)
+DATE = np.dtype('datetime64[s]')
+# Rolling and exponentially weighted means, a row per team and game
+FORM = np.dtype(np.float32)
+# Types pandas reads from SQLite, kept by the frames of a row per team at most
+TEXT = pandas_dtype(str)
+INTEGER = np.dtype(np.int64)
+REAL = np.dtype(np.float64)
+
+_BOX_SCORE_COUNTS = ['pts', 'fgm', 'fga', 'tpm', 'tpa', 'ftm', 'fta', 'oreb', 'dreb', 'reb',
+                     'ast', 'tov', 'stl', 'blk', 'pf']
+_PER_GAME = ['ppg', 'astpg', 'rebpg', 'stlpg', 'tovpg', 'blkpg', 'pfpg']
+
+# Calculation method -> column -> dtype of the frames it returns. A method
+# returning several frames (a tuple) has the columns of all of them. The
+# columns of get_box_scores are (side, stat), typed by their stat.
+FRAME_SCHEMAS = {
+    'calculate_mean_values': {f'avg_{stat}': REAL for stat in ['pts', 'ast', 'reb', 'stl', 'blk', 'tov', 'pf']},
+    'calculate_team_aggregates': {
+        'team_id': TEXT, 'team_name': TEXT,
+        **{metric: REAL for metric in _PER_GAME + ['fgp', 'tpp', 'ftp']},
+        'games': INTEGER,
+    },
+    'calculate_team_stats': {'team_name': TEXT, **{metric: REAL for metric in _PER_GAME}},
+    'calculate_total_stats': {column: INTEGER for column in
+                              ['tot_matches', 'tot_dates', 'tot_minutes', 'tot_pts', 'tot_fgm']},
+    'get_win_loss': {'team_name': TEXT, 'wins': INTEGER, 'losses': INTEGER},
+    'get_shooting_points': {'fga': COUNT, 'fgp': PERCENT},
+    'get_shooting_data': {'fga': COUNT, 'fgp': PERCENT, 'games': TOTAL},
+    'get_teams': {'team_name': TEXT, 'team_id': TEXT},
+    'get_box_scores': {
+        'team_id': CATEGORY, 'team_name': CATEGORY,
+        **{stat: COUNT for stat in _BOX_SCORE_COUNTS},
+        **{pct: PERCENT for pct in ['fgp', 'tpp', 'ftp', 'dreb_share', 'ast_share', 'tov_share',
+                                    'stl_share', 'blk_share', 'pf_share']},
+    },
+    'get_team_form': {
+        'team_id': CATEGORY, 'date_id': TOTAL, 'game_date': DATE, 'season': YEAR, 'game': TOTAL,
+        **{f'{stat}_{kind}': FORM for stat in ['pts', 'ast', 'reb', 'stl', 'blk', 'tov', 'pf']
+           for kind in ['roll', 'ewm']},
+    },
+    'get_ratings': {'team_id': TEXT, 'team_name': TEXT, 'rating': REAL, 'games': INTEGER},
+    'get_match_stats': {'match_id': CATEGORY, 'team_id': CATEGORY, 'team_name': CATEGORY,
+                        **{stat: COUNT for stat in _BOX_SCORE_COUNTS}},
+}
+
+
+def _column_name(column) -> str:
+    return column[-1] if isinstance(column, tuple) else column
+
+
+def apply_schema(df: pd.DataFrame, schema: dict) -> pd.DataFrame:
+    '''
+    Cast the columns of df listed in the schema, leave the others as they are.
+    Args:
+        df (pd.DataFrame): Frame to cast.
+        schema (dict): Column name -> dtype, as in FRAME_SCHEMAS.
+    Returns:
+        df (pd.DataFrame): The frame with compact columns.
+    '''
+    columns = {}
+    cast = False
+    for column, dtype in zip(df.columns, df.dtypes):
+        target = schema.get(_column_name(column), dtype)
+        if target == dtype:
+            columns[column] = df[column]
+            continue
+        # Column by column, integers through numpy: DataFrame.astype takes
+        # longer than the query on the frames of a few games
+        if target == CATEGORY:
+            columns[column] = pd.Categorical(df[column])
+        elif dtype.kind in 'iu':
+            columns[column] = df[column].to_numpy().astype(target)
+        else:
+            columns[column] = df[column].astype(target)
+        cast = True
+    return pd.DataFrame(columns, index=df.index, columns=df.columns) if cast else df
+
+
+def apply_schema_to_result(result, schema: dict):
+    '''
+    apply_schema on a frame, or on every frame of a tuple; other values are returned as they are.
+    '''
+    if isinstance(result, pd.DataFrame):
+        return apply_schema(result, schema)
+    if isinstance(result, tuple):
+        return tuple(apply_schema_to_result(value, schema) for value in result)
+    return result
+
+
+def typed(method):
+    '''
+    Cast the frames returned by a Calculation method to the schema of the
+    method in FRAME_SCHEMAS. Goes below `cached`, so the cache holds the
+    compact frames.
+    '''
+    schema = FRAME_SCHEMAS[method.__name__]
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        return apply_schema_to_result(method(self, *args, **kwargs), schema)
+    return wrapper
+
+
+def result_memory(result) -> int:
+    '''
+    Returns:
+        bytes (int): Memory of the frames of a result, object values included.
+    '''
+    if isinstance(result, pd.DataFrame):
+        return int(result.memory_usage(deep=True).sum())
+    if isinstance(result, pd.Series):
+        return int(result.memory_usage(deep=True))
+    if isinstance(result, (tuple, list)):
+        return sum(result_memory(value) for value in result)
+    return 0
@@ -0,0 +1,104 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from modules.pool import interrupt_thread
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor(max_workers: int = 8) -> ThreadPoolExecutor:
+    '''
+    Thread pool shared by every QueryBatch of the process, so a rerun does not
+    pay for starting new threads.
+    '''
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='query')
+        return _executor
+
+
+class QueryTimeout(Exception):
+    '''Raised when a query of a batch did not finish within its timeout.'''
+
+
+class QueryBatch:
+    '''
+    Run independent read-only queries concurrently and collect their results.
+    Each query runs in a worker thread and, when the Calculation is backed by
+    a ConnectionPool, on its own connection. Waiting for the batch therefore
+    takes as long as the slowest query instead of the sum of all of them.
+    A query past its timeout is interrupted, so the worker returns its pooled
+    connection; a query on a plain sqlite3.Connection is only abandoned.
+
+    Example:
+        batch = QueryBatch()
+        batch.submit('totals', calc.calculate_total_stats)
+        batch.submit('matches', calc.get_match_stats, 'BOS', 'LAL', timeout=5)
+        results = batch.gather()
+        batch.timings['totals']
+    '''
+    def __init__(self, timeout: float = 30.0, executor: ThreadPoolExecutor = None):
+        '''
+        Args:
+            timeout (float): Default timeout in seconds of every query.
+            executor (ThreadPoolExecutor): Pool to run on, the shared one by default.
+        '''
+        self.timeout = timeout
+        self.executor = executor or get_executor()
+        self.timings = {}
+        self._queries = {}
+        # Worker thread of each running query, to interrupt it on timeout
+        self._running = {}
+        self._running_lock = threading.Lock()
+
+    def _run(self, name, fn, args, kwargs):
+        start = time.perf_counter()
+        with self._running_lock:
+            self._running[name] = threading.get_ident()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            # Before the worker moves on to another batch's query
+            with self._running_lock:
+                del self._running[name]
+            self.timings[name] = time.perf_counter() - start
+
+    def submit(self, name: str, fn, *args, timeout: float = None, **kwargs):
+        '''
+        Schedule a query.
+        Args:
+            name (str): Key of the result in gather().
+            fn (callable): Function running the query, called with args and kwargs.
+            timeout (float): Seconds to wait for this query, the batch default if None.
+        '''
+        if name in self._queries:
+            raise ValueError(f'A query named {name!r} is already in the batch')
+        future = self.executor.submit(self._run, name, fn, args, kwargs)
+        self._queries[name] = (future, self.timeout if timeout is None else timeout, time.perf_counter())
+
+    def gather(self) -> dict:
+        '''
+        Wait for every query of the batch.
+        Returns:
+            results (dict): Result of each query by name.
+        Raises:
+            QueryTimeout: If a query ran past its timeout. A query already
+                running is interrupted, one still waiting for a worker is cancelled.
+            Exception: The first exception raised by a query.
+        '''
+        results = {}
+        for name, (future, timeout, submitted) in self._queries.items():
+            remaining = max(timeout - (time.perf_counter() - submitted), 0)
+            try:
+                results[name] = future.result(timeout=remaining)
+            except FutureTimeout:
+                if not future.cancel():
+                    with self._running_lock:
+                        if name in self._running:
+                            interrupt_thread(self._running[name])
+                raise QueryTimeout(f'Query {name!r} did not finish within {timeout}s') from None
+        return results
@@ -0,0 +1,218 @@
+'''
+Form of every team over its last games: rolling means over a window of games
+and exponentially weighted means, for every stat at once.
+
+The box scores are sorted by team and date, so each team's games are a
+contiguous segment of one array, and both means come out of cumulative sums
+over it: no query and no loop per team or per stat. A FormEngine keeps
+the table of every database it has seen with the state needed to extend it,
+so a night of new games only reads and computes the new rows.
+'''
+import threading
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from modules.dtypes import FRAME_SCHEMAS, apply_schema
+
+# Stats the form is computed for, in the order of the columns
+FORM_STATS = ['pts', 'ast', 'reb', 'stl', 'blk', 'tov', 'pf']
+
+# Weights of the stats in the checksum of the games a table was built from
+CHECKSUM_WEIGHTS = dict(zip(FORM_STATS, [1, 3, 5, 7, 11, 13, 17]))
+
+# Largest d ** -k the exponentially weighted sums are scaled by before the
+# cumulative sum; beyond it they are carried over from chunk to chunk
+_MAX_SCALE = 1e150
+
+
+def _segment_starts(codes: np.ndarray) -> np.ndarray:
+    '''
+    Index of the first row of the segment of every row, codes being sorted.
+    '''
+    return np.searchsorted(codes, codes, side='left')
+
+
+def rolling_means(codes: np.ndarray, values: np.ndarray, window: int) -> np.ndarray:
+    '''
+    Mean of each row and the window - 1 rows before it within its segment
+    (fewer at the start of a segment). The values are counts, so their
+    cumulative sum over the whole array stays exact.
+    Args:
+        codes (np.ndarray): Segment of every row, sorted.
+        values (np.ndarray): rows x stats.
+        window (int): Number of rows averaged.
+    Returns:
+        means (np.ndarray): rows x stats.
+    '''
+    rows = np.arange(len(codes))
+    first = np.maximum(rows - window + 1, _segment_starts(codes))
+    sums = np.zeros((len(codes) + 1, values.shape[1]))
+    np.cumsum(values, axis=0, out=sums[1:])
+    return (sums[rows + 1] - sums[first]) / (rows + 1 - first)[:, None]
+
+
+def ewm_sums(codes: np.ndarray, values: np.ndarray, alpha: float, initial: np.ndarray) -> np.ndarray:
+    '''
+    Exponentially weighted sums S_t = x_t + d S_(t-1), d = 1 - alpha, within
+    every segment, starting from the sum `initial` of the segment.
+    Within a segment x_j d ** -j is summed cumulatively and scaled back by
+    d ** t. To keep d ** -j finite, segments are cut into chunks over which
+    it stays below _MAX_SCALE, and the sum at the end of a chunk is carried
+    into the next: one pass per chunk, over every segment at once. With the
+    usual smoothing a chunk spans hundreds of seasons.
+    Args:
+        codes (np.ndarray): Segment of every row, sorted, numbered from 0.
+        values (np.ndarray): rows x stats.
+        alpha (float): Smoothing factor, 0 < alpha < 1.
+        initial (np.ndarray): segments x stats, sum before the first row of each segment.
+    Returns:
+        sums (np.ndarray): rows x stats.
+    '''
+    decay = 1 - alpha
+    chunk_length = max(1, int(np.log(_MAX_SCALE) / -np.log(decay)))
+    position = np.arange(len(codes)) - _segment_starts(codes)
+    chunk, offset = np.divmod(position, chunk_length)
+    # A cumulative sum restarting with every chunk: across chunks the scales differ
+    scaled = pd.DataFrame(values * decay ** -offset[:, None])
+    local = scaled.groupby(codes * (int(chunk.max(initial=0)) + 1) + chunk, sort=False).cumsum().to_numpy()
+    local = local * decay ** offset[:, None]
+
+    carried = np.empty_like(local)
+    previous = initial.astype(np.float64, copy=True)
+    for c in range(int(chunk.max(initial=-1)) + 1):
+        in_chunk = chunk == c
+        carried[in_chunk] = previous[codes[in_chunk]]
+        ends = in_chunk & (offset == chunk_length - 1)
+        previous[codes[ends]] = local[ends] + decay ** chunk_length * previous[codes[ends]]
+    return local + decay ** (offset + 1)[:, None] * carried
+
+
+def games_checksum(games: pd.DataFrame) -> tuple:
+    '''
+    Returns:
+        (games, checksum) (tuple): Number of rows and the sum over them of the
+        CHECKSUM_WEIGHTS weighted stats times the date_id.
+    '''
+    weighted = sum(weight * games[stat].to_numpy(np.int64) for stat, weight in CHECKSUM_WEIGHTS.items())
+    return len(games), int((weighted * games['date_id'].to_numpy(np.int64)).sum())
+
+
+@dataclass
+class FormState:
+    '''
+    Form table of one database and what is needed to extend it.
+    '''
+    fingerprint: tuple
+    last_date_id: int
+    checksum: tuple
+    table: pd.DataFrame
+    # Per team, in the order of `teams`: its last window - 1 games, its
+    # exponentially weighted sums and its number of games
+    teams: list
+    tails: pd.DataFrame
+    sums: np.ndarray
+    games: np.ndarray
+
+
+def build_form(games: pd.DataFrame, window: int, alpha: float, state: FormState = None) -> tuple:
+    '''
+    Form table of the games, or of the games following those of `state`.
+    Args:
+        games (pd.DataFrame): One row per team and game with team_id, date_id,
+            game_date, season and FORM_STATS, later than state.last_date_id when
+            a state is given.
+        window (int): Games of the rolling means.
+        alpha (float): Smoothing factor of the exponentially weighted means.
+        state (FormState): Table to extend, None to start from scratch.
+    Returns:
+        rows (pd.DataFrame), teams (list), tails (pd.DataFrame), sums (np.ndarray), games (np.ndarray):
+        The new rows of the table and the per-team state after them.
+    '''
+    teams = sorted(set(games['team_id']) | set(state.teams if state else []))
+    sums = np.zeros((len(teams), len(FORM_STATS)))
+    counts = np.zeros(len(teams), dtype=np.int64)
+    tails = games.iloc[:0]
+    if state is not None:
+        index = [teams.index(team) for team in state.teams]
+        sums[index], counts[index] = state.sums, state.games
+        tails = state.tails
+
+    # Earlier games of the team are only needed for the rolling window
+    combined = pd.concat([tails.assign(new=False), games.assign(new=True)], ignore_index=True)
+    combined = combined.sort_values(['team_id', 'date_id'], kind='mergesort', ignore_index=True)
+    codes = np.searchsorted(teams, combined['team_id'].to_numpy(dtype=object))
+    values = combined[FORM_STATS].to_numpy(np.float64)
+    rolling = rolling_means(codes, values, window)
+
+    new = combined['new'].to_numpy()
+    new_codes = codes[new]
+    ewm = ewm_sums(new_codes, values[new], alpha, sums)
+    played = counts[new_codes] + (np.arange(len(new_codes)) - _segment_starts(new_codes)) + 1
+    # Sum of the weights of the games so far, as pandas' ewm(adjust=True)
+    weights = (1 - (1 - alpha) ** played) / alpha
+
+    rows = combined.loc[new, ['team_id', 'date_id', 'game_date', 'season']].reset_index(drop=True)
+    rows['game'] = played
+    for i, stat in enumerate(FORM_STATS):
+        rows[f'{stat}_roll'] = rolling[new, i]
+        rows[f'{stat}_ewm'] = ewm[:, i] / weights
+
+    last = np.r_[new_codes[1:] != new_codes[:-1], True] if len(new_codes) else np.zeros(0, dtype=bool)
+    sums[new_codes[last]] = ewm[last]
+    counts[new_codes[last]] = played[last]
+    tails = combined[combined.groupby('team_id').cumcount(ascending=False) < window - 1]
+    return rows, teams, tails.drop(columns='new'), sums, counts
+
+
+class FormEngine:
+    '''
+    Form tables of the databases read by the Calculation objects of the
+    process. A table is computed once, then extended with the games of the
+    dates added since, as long as the earlier games are unchanged (same
+    count and checksum); otherwise it is computed again.
+    '''
+    def __init__(self):
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def team_form(self, key, fingerprint: tuple, window: int, alpha: float, read_games, read_checksum) -> pd.DataFrame:
+        '''
+        Args:
+            key: Identity of the database, the same across its versions.
+            fingerprint (tuple): Version of the data.
+            window (int): Games of the rolling means.
+            alpha (float): Smoothing factor of the exponentially weighted means.
+            read_games: read_games(after_date_id) returns the games after a date_id.
+            read_checksum: read_checksum(up_to_date_id) returns games_checksum
+                of the games up to a date_id, computed by the database.
+        Returns:
+            table (pd.DataFrame): One row per team and game, sorted by team and date.
+        '''
+        key = (key, window, alpha)
+        with self._lock:
+            state = self._states.get(key)
+            if state is not None and state.fingerprint == fingerprint:
+                return state.table
+            if state is not None and read_checksum(state.last_date_id) != state.checksum:
+                state = None
+            games = read_games(state.last_date_id if state else -1)
+            if state is not None and games.empty:
+                state.fingerprint = fingerprint
+                return state.table
+            rows, teams, tails, sums, counts = build_form(games, window, alpha, state)
+            # The checksum covers the rows read, whatever was written meanwhile
+            count, checksum = games_checksum(games)
+            if state is not None:
+                rows = pd.concat([state.table, rows], ignore_index=True)
+                count, checksum = count + state.checksum[0], checksum + state.checksum[1]
+            table = apply_schema(rows.sort_values(['team_id', 'date_id'], kind='mergesort', ignore_index=True),
+                                 FRAME_SCHEMAS['get_team_form'])
+            last_date_id = int(table['date_id'].max()) if len(table) else -1
+            self._states[key] = FormState(fingerprint, last_date_id, (count, checksum), table,
+                                          teams, tails, sums, counts)
+            return table
+
+
+FORM_ENGINE = FormEngine()
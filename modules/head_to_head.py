@@ -0,0 +1,86 @@
+'''
+Head-to-head records of every pair of teams as dense team x team arrays,
+built from one grouped pass over the games: entry [i, j] is about the games
+between team_ids[i] and team_ids[j], from the point of view of team i.
+'''
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from modules.dtypes import TOTAL
+
+# Stats whose difference between the two teams is summed over their games
+H2H_STATS = ['pts', 'reb', 'ast', 'stl', 'blk', 'tov', 'pf', 'fgm', 'tpm', 'ftm']
+
+
+@dataclass(frozen=True)
+class HeadToHead:
+    '''
+    The arrays are read-only: a HeadToHead is cached and shared as it is.
+    '''
+    team_ids: tuple
+    # games[i, j], wins[i, j]: games between i and j, and those i won
+    games: np.ndarray
+    wins: np.ndarray
+    # deltas[k, i, j]: sum over those games of team i's H2H_STATS[k] minus team j's
+    deltas: np.ndarray
+
+    @property
+    def losses(self) -> np.ndarray:
+        return self.games - self.wins
+
+    def delta(self, stat: str) -> np.ndarray:
+        return self.deltas[H2H_STATS.index(stat)]
+
+    def per_game(self, values: np.ndarray) -> np.ndarray:
+        '''
+        values / games, NaN for the pairs that never met.
+        '''
+        return np.divide(values, self.games, out=np.full(values.shape, np.nan), where=self.games > 0)
+
+    def record(self, team_id1: str, team_id2: str) -> dict:
+        '''
+        Args:
+            team_id1 (str): Abbreviation of the team the record is about.
+            team_id2 (str): Abbreviation of its opponent.
+        Returns:
+            record (dict): games, wins and losses of team_id1 against team_id2 and
+            <stat>_diff, its mean margin per game in each of H2H_STATS (NaN without games).
+        '''
+        i, j = self.team_ids.index(team_id1), self.team_ids.index(team_id2)
+        games = int(self.games[i, j])
+        record = {'games': games, 'wins': int(self.wins[i, j]), 'losses': int(self.losses[i, j])}
+        for k, stat in enumerate(H2H_STATS):
+            record[f'{stat}_diff'] = float(self.deltas[k, i, j]) / games if games else np.nan
+        return record
+
+
+def head_to_head_matrix(pairs: pd.DataFrame, team_ids: list) -> HeadToHead:
+    '''
+    Scatter the per-pair totals into the arrays of a HeadToHead. Every game is
+    in one row only, from the point of view of either team: the entries of the
+    opponent follow from it.
+    Args:
+        pairs (pd.DataFrame): One row per pair of teams that met: team_id, opponent_id,
+            games, wins (of team_id) and <stat>_delta (team_id minus opponent_id) for H2H_STATS.
+        team_ids (list): Every team, in any order.
+    Returns:
+        h2h (HeadToHead): Rows and columns in team_id order, zero for the pairs that never met.
+    '''
+    team_ids = tuple(sorted(team_ids))
+    n = len(team_ids)
+    i = np.searchsorted(team_ids, pairs['team_id'].to_numpy(dtype=object))
+    j = np.searchsorted(team_ids, pairs['opponent_id'].to_numpy(dtype=object))
+    games = np.zeros((n, n), dtype=TOTAL)
+    wins = np.zeros((n, n), dtype=TOTAL)
+    deltas = np.zeros((len(H2H_STATS), n, n), dtype=TOTAL)
+    games[i, j] = games[j, i] = pairs['games'].to_numpy()
+    wins[i, j] = pairs['wins'].to_numpy()
+    wins[j, i] = games[j, i] - wins[i, j]
+    for k, stat in enumerate(H2H_STATS):
+        deltas[k, i, j] = pairs[f'{stat}_delta'].to_numpy()
+        deltas[k, j, i] = -deltas[k, i, j]
+    for array in (games, wins, deltas):
+        array.flags.writeable = False
+    return HeadToHead(team_ids, games, wins, deltas)
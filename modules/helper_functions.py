@@ -1,8 +1,14 @@
+import copy
 import pandas as pd
 import numpy as np
-import plotly.express as px
 import plotly.graph_objects as go
-import sqlite3
+from modules.cache import RESULT_CACHE, ResultCache, cached, database_fingerprint
+from modules.dtypes import COUNT, PERCENT, typed
+from modules.form import CHECKSUM_WEIGHTS, FORM_ENGINE, FORM_STATS
+from modules.head_to_head import H2H_STATS, HeadToHead, head_to_head_matrix
+from modules.instrumentation import QueryProfiler
+from modules.pool import borrow
+from modules.snapshot import Snapshot
 
 COLOR_PALETTE = {
     "#003f5c": "Dark Blue",
@@ -13,84 +19,391 @@ COLOR_PALETTE = {
     "#ffa600": "Amber"
 }
 
+# Per-game metrics in the order returned by Calculation.calculate_team_stats
+TEAM_METRICS = ['ppg', 'astpg', 'rebpg', 'stlpg', 'tovpg', 'blkpg', 'pfpg']
+
+METRIC_LABELS = {
+    'ppg': 'Points',
+    'astpg': 'Assists',
+    'rebpg': 'Rebounds',
+    'stlpg': 'Steals',
+    'tovpg': 'Turnovers',
+    'blkpg': 'Blocks',
+    'pfpg': 'Personal Fouls',
+}
+
+# Box scores the FGA vs FG% chart draws one by one; above that it draws the
+# number of games per cell, SHOOTING_BIN_FGA attempts by SHOOTING_BIN_FGP
+# percentage points wide
+SHOOTING_MAX_POINTS = 20000
+SHOOTING_BIN_FGA = 2
+SHOOTING_BIN_FGP = 1.0
+
+SHOOTING_COLOR_SCALE = [[0.0, '#e60049'], [0.5, '#e6d800'], [1.0, '#00bfa0']]
+
+# Games of the rolling means of the team form, and span of its exponentially
+# weighted means (smoothing factor 2 / (span + 1))
+FORM_WINDOW = 10
+FORM_SPAN = 10
+
+FORM_LABELS = {
+    'pts': 'Points',
+    'ast': 'Assists',
+    'reb': 'Rebounds',
+    'stl': 'Steals',
+    'blk': 'Blocks',
+    'tov': 'Turnovers',
+    'pf': 'Personal Fouls',
+}
+
+# Stats of the head-to-head margins, as they read before "margin"
+H2H_LABELS = {
+    'pts': 'Point',
+    'reb': 'Rebound',
+    'ast': 'Assist',
+    'stl': 'Steal',
+    'blk': 'Block',
+    'tov': 'Turnover',
+    'pf': 'Personal Foul',
+    'fgm': 'Field Goal',
+    'tpm': 'Three Pointer',
+    'ftm': 'Free Throw',
+}
+
+# Rows of the match panel: label, percentage column of Calculation.get_box_scores
+# drawn as the bar, text on the outer edge (formatted with the team's side of
+# the box score), names of the two bar segments
+MATCH_PANEL_ROWS = [
+    ('FG', 'fgp', '{fgm}/{fga} ({fgp:.1f}%)', 'FGM', 'Miss'),
+    ('3PT', 'tpp', '{tpm}/{tpa} ({tpp:.1f}%)', 'TPM', 'Miss'),
+    ('FT', 'ftp', '{ftm}/{fta} ({ftp:.1f}%)', 'FTM', 'Miss'),
+    ('REB', 'dreb_share', '{reb} REB', 'DREB', 'OREB'),
+    ('AST', 'ast_share', '{ast} AST', 'AST', 'OPP'),
+    ('TOV', 'tov_share', '{tov} TOV', 'TOV', 'OPP'),
+    ('STL', 'stl_share', '{stl} STL', 'STL', 'OPP'),
+    ('BLK', 'blk_share', '{blk} BLK', 'BLK', 'OPP'),
+    ('PF', 'pf_share', '{pf} PF', 'PF', 'OPP'),
+]
+
+# Counting stats of a box score, and those the match panel shows as a share
+# of both teams' total
+BOX_SCORE_STATS = ['pts', 'fgm', 'fga', 'tpm', 'tpa', 'ftm', 'fta', 'oreb', 'dreb', 'reb',
+                   'ast', 'tov', 'stl', 'blk', 'pf']
+OPPONENT_SHARE_STATS = ['ast', 'tov', 'stl', 'blk', 'pf']
+
+
+def _match_panel_grid() -> dict:
+    '''
+    Layout of the match panel without data: one row per MATCH_PANEL_ROWS
+    entry, the two columns sharing the row's y axis and running from 100% at
+    the outer edges to 0 in the middle, axes hidden. Computed on first use.
+    '''
+    global _MATCH_PANEL_GRID
+    if _MATCH_PANEL_GRID is None:
+        from plotly.subplots import make_subplots
+        fig = make_subplots(rows=len(MATCH_PANEL_ROWS), cols=2, shared_yaxes=True,
+                            horizontal_spacing=0.1, vertical_spacing=0.04)
+        fig.update_xaxes(visible=False, showgrid=False)
+        fig.update_xaxes(range=[100, 0], col=1)
+        fig.update_xaxes(range=[0, 100], col=2)
+        fig.update_yaxes(visible=False, showticklabels=False)
+        fig.update_layout(barmode='stack', height=50 * len(MATCH_PANEL_ROWS) + 40,
+                          margin=dict(l=130, r=130, t=0, b=0))
+        _MATCH_PANEL_GRID = fig.layout.to_plotly_json()
+    return _MATCH_PANEL_GRID
+
+
+_MATCH_PANEL_GRID = None
+
 
 class Visualisation:
-    def __init__(self, conn: sqlite3.Connection):
+    def __init__(self, conn, cache: ResultCache = RESULT_CACHE, snapshot: Snapshot = None):
+        '''
+        Args:
+            conn (sqlite3.Connection | ConnectionPool): Database the charted data comes from.
+            cache (ResultCache): Cache for the prebuilt figures, None disables caching.
+            snapshot (Snapshot): Columnar snapshot the charted data comes from, if any.
+        '''
         self.conn = conn
         self.color_palette = COLOR_PALETTE
-    
-    def create_bar(self, stats1, stats2, home: bool, title: str, title2: str):
-        if home:
-            fig = go.Figure()
-            fig.add_trace(go.Bar(
-                x=[stats1],
-                y=[0],
-                name=f'{title}',
-                orientation='h',
-                marker=dict(color='#50e991')
-
-            ))
-            fig.add_trace(go.Bar(
-                x=[stats2-stats1],
-                y=[0],
-                name=f'{title2}',
-                orientation='h',
-                marker=dict(color='#474440')
-            ))
-
-            fig.update_layout(
-                barmode="stack",
-                yaxis=dict(visible=False, showticklabels=False),
-                xaxis=dict(
-                    range=[0, stats2],
-                    visible=False,
-                    showticklabels=False,
-                    showgrid=False,
-                ),
-                margin=dict(l=0, r=0, t=0, b=0),
-                height=50,
-            )
+        self.cache = cache
+        self.snapshot = snapshot
+
+    def create_ranked_bar(self, df: pd.DataFrame, metric: str) -> go.Figure:
+        '''
+        Horizontal bar chart of a team metric, best team on top. Teams at or
+        above the league average are blue, the others red.
+        The figure is cached, keyed by the metric and the content of df, and
+        shared between reruns and sessions, so it must not be modified.
+        (Rebuilding a figure from a serialized spec costs as much as building
+        it, hence the figure itself is kept.)
+        Args:
+            df (pd.DataFrame): Columns team_name and metric, as returned by Calculation.rank_team_metric.
+            metric (str): One of TEAM_METRICS.
+        Returns:
+            fig (go.Figure): The ranked bar chart.
+        '''
+        if self.cache is None:
+            return self._build_ranked_bar(df, metric)
+        # Hashing the 30 rows costs far less than building the figure
+        digest = pd.util.hash_pandas_object(df[['team_name', metric]], index=False).to_numpy().tobytes()
+        key = ('Visualisation.create_ranked_bar', metric, digest)
+        found, fig = self.cache.get(key)
+        if not found:
+            fig = self._build_ranked_bar(df, metric)
+            self.cache.set(key, fig)
+        return fig
+
+    @staticmethod
+    def _build_ranked_bar(df: pd.DataFrame, metric: str) -> go.Figure:
+        label = METRIC_LABELS[metric]
+        values = df[metric].to_numpy()
+        colors = np.where(values >= values.mean(), '#0bb4ff', '#e60049')
+        fig = go.Figure(go.Bar(y=df['team_name'], x=values, orientation='h', marker=dict(color=colors)))
+        fig.update_layout(
+            title={
+                'text': f'Average {label} per Game',
+                'font': {
+                    'family': 'sans-serif',
+                    'size': 14,
+                },
+            },
+            xaxis_title=label,
+            xaxis_tickformat='.1f',
+            xaxis_range=[values.min() - 1, values.max() + 1],
+            yaxis_autorange='reversed',
+            xaxis_showgrid=True,
+            xaxis_gridcolor='rgba(0, 0, 0, 0.4)',
+            xaxis_ticks='outside',
+            yaxis_showgrid=False,
+            height=600, width=800,
+            font=dict(size=10))
+        return fig
+
+    def create_match_panel(self, match: pd.Series) -> go.Figure:
+        '''
+        Mirrored comparison of the box scores of one game as a single figure:
+        one row per stat, the away team's bars grow to the left, the home
+        team's to the right, with the numbers on the outer edges.
+        Args:
+            match (pd.Series): Row of Calculation.get_box_scores.
+        Returns:
+            fig (go.Figure): The panel.
+        '''
+        # Built in one go: every add_trace / update call on a figure validates
+        # it again, and make_subplots alone costs more than the 18 small charts
+        # the panel replaces, so its grid is computed once
+        layout = copy.deepcopy(_match_panel_grid())
+        sides = [(1, match['away'].to_dict(), '#0bb4ff'), (2, match['home'].to_dict(), '#50e991')]
+        traces, annotations = [], []
+        for row, (label, column, text, name, rest_name) in enumerate(MATCH_PANEL_ROWS, start=1):
+            # The row's y axis is shared by both columns: y, y3, y5, ...
+            yref = f"y{'' if row == 1 else 2 * row - 1} domain"
+            for col, stats, color in sides:
+                axis = 2 * (row - 1) + col
+                suffix = '' if axis == 1 else str(axis)
+                for x, trace_name, trace_color in ((stats[column], name, color),
+                                                   (100 - stats[column], rest_name, '#474440')):
+                    traces.append(dict(type='bar', x=[x], y=[0], name=trace_name, orientation='h',
+                                       marker=dict(color=trace_color), showlegend=False,
+                                       xaxis=f'x{suffix}', yaxis=f'y{suffix}'))
+                annotations.append(dict(text=text.format_map(stats),
+                                        xref='paper', x=0 if col == 1 else 1, xanchor='right' if col == 1 else 'left',
+                                        yref=yref, y=0.5, showarrow=False, font=dict(size=14)))
+            annotations.append(dict(text=f'<b>{label}</b>', xref='paper', x=0.5, yref=yref, y=0.5, showarrow=False))
+        layout['annotations'] = annotations
+        return go.Figure(data=traces, layout=layout)
+
+    def create_shooting_chart(self, df: pd.DataFrame, binned: bool) -> go.Figure:
+        '''
+        Field goals attempted against field goal percentage. Box scores are
+        drawn as WebGL markers sized and colored by fga times the min-max
+        scaled fgp; cells are drawn as a heatmap of the number of games, so
+        the payload is bounded by the grid and not by the number of games.
+        Args:
+            df (pd.DataFrame): Output of Calculation.get_shooting_data.
+            binned (bool): Whether df holds cells.
+        Returns:
+            fig (go.Figure): The chart.
+        '''
+        if binned:
+            fig = go.Figure(self._shooting_heatmap(df))
+        else:
+            fgp = df['fgp']
+            marker_size = df['fga'] * (fgp - fgp.min()) / (fgp.max() - fgp.min())
+            fig = go.Figure(go.Scattergl(x=df['fga'], y=fgp, mode='markers',
+                                         marker=dict(size=marker_size / 5, color=marker_size,
+                                                     colorscale=SHOOTING_COLOR_SCALE,
+                                                     colorbar=dict(title='Marker size'),
+                                                     line=dict(color='gray', width=1))))
+        fig.update_layout(
+            xaxis_title='Field Goals Attempted',
+            yaxis_title='Field Goal Percentage',
+            height=600)
+        return fig
+
+    @staticmethod
+    def _shooting_heatmap(df: pd.DataFrame) -> go.Heatmap:
+        # Cells are keyed by their lower edges, the heatmap wants centres
+        x = np.arange(df['fga'].min(), df['fga'].max() + SHOOTING_BIN_FGA, SHOOTING_BIN_FGA)
+        y = np.arange(df['fgp'].min(), df['fgp'].max() + SHOOTING_BIN_FGP / 2, SHOOTING_BIN_FGP)
+        z = np.full((len(y), len(x)), np.nan)
+        xi = ((df['fga'] - x[0]) / SHOOTING_BIN_FGA).round().astype(int)
+        yi = ((df['fgp'] - y[0]) / SHOOTING_BIN_FGP).round().astype(int)
+        z[yi, xi] = df['games']
+        return go.Heatmap(x=x + SHOOTING_BIN_FGA / 2, y=y + SHOOTING_BIN_FGP / 2, z=z,
+                          colorscale=SHOOTING_COLOR_SCALE, colorbar=dict(title='Games'),
+                          hovertemplate='FGA %{x}<br>FG% %{y}<br>%{z} games<extra></extra>')
+
+    def create_form_chart(self, df: pd.DataFrame, stat: str, team_names: dict) -> go.Figure:
+        '''
+        Form of some teams over a season: the rolling mean of a stat as a
+        solid line and its exponentially weighted mean as a dashed line of
+        the same color, per team.
+        Args:
+            df (pd.DataFrame): Rows of Calculation.get_team_form, of the teams to draw.
+            stat (str): One of FORM_STATS.
+            team_names (dict): team_id -> team_name of the teams to draw, in legend order.
+        Returns:
+            fig (go.Figure): The chart.
+        '''
+        label = FORM_LABELS[stat]
+        colors = list(self.color_palette)
+        traces = []
+        for i, (team_id, team_name) in enumerate(team_names.items()):
+            games = df[df['team_id'] == team_id]
+            color = colors[i % len(colors)]
+            traces.append(go.Scatter(x=games['game_date'], y=games[f'{stat}_roll'], mode='lines',
+                                     name=team_name, legendgroup=team_id, line=dict(color=color),
+                                     hovertemplate=f'{team_name}<br>%{{x|%d %b %Y}}<br>'
+                                                   f'Last {FORM_WINDOW}: %{{y:.1f}}<extra></extra>'))
+            traces.append(go.Scatter(x=games['game_date'], y=games[f'{stat}_ewm'], mode='lines',
+                                     name=f'{team_name} (weighted)', legendgroup=team_id, showlegend=False,
+                                     line=dict(color=color, dash='dash'),
+                                     hovertemplate=f'{team_name}<br>%{{x|%d %b %Y}}<br>'
+                                                   f'Weighted: %{{y:.1f}}<extra></extra>'))
+        fig = go.Figure(traces)
+        fig.update_layout(
+            title=f'{label} over the last {FORM_WINDOW} games (solid) and weighted (dashed)',
+            yaxis_title=label,
+            hovermode='closest',
+            height=500)
+        return fig
+
+    def create_head_to_head_heatmap(self, h2h: HeadToHead, stat: str = None) -> go.Figure:
+        '''
+        Team x team heatmap of the head-to-head records, read along the rows:
+        the share of the games the row team won against the column team, or
+        its mean margin per game in a stat. Pairs that never met are blank,
+        teams without any game are left out.
+        Args:
+            h2h (HeadToHead): As returned by Calculation.get_head_to_head.
+            stat (str): One of H2H_STATS, None for the win percentage.
+        Returns:
+            fig (go.Figure): The heatmap.
+        '''
+        if stat is None:
+            z = 100 * h2h.per_game(h2h.wins)
+            title, value, midpoint = 'Win %', '%{z:.0f}%', 50
         else:
-            fig = go.Figure()
-            fig.add_trace(go.Bar(
-                x=[stats1],
-                y=[0],
-                orientation='h',
-                name=f'{title}',
-                marker=dict(color='#0bb4ff')
-            ))
-
-            fig.add_trace(go.Bar(
-                x=[stats2 - stats1],
-                y=[0],
-                name=f'{title2}',
-                orientation='h',
-                marker=dict(color='#474440')
-            ))
-
-            fig.update_layout(
-        barmode="stack",
-        yaxis=dict(visible=False, showticklabels=False),
-        xaxis=dict(
-            range=[stats2, 0],
-            visible=False,
-            showticklabels=False,
-            showgrid=False,
-        ),
-        margin=dict(l=0, r=0, t=0, b=0),
-        height=50,
-    )
+            z = h2h.per_game(h2h.delta(stat))
+            title, value, midpoint = f'{H2H_LABELS[stat]} margin per game', '%{z:+.1f}', 0
+        records = np.char.add(np.char.add(h2h.wins.astype(str), '-'), h2h.losses.astype(str))
+        # Teams without a game (e.g. listed under another id) would be a blank row and column
+        played = np.flatnonzero(h2h.games.sum(axis=1) > 0)
+        teams = [h2h.team_ids[i] for i in played]
+        fig = go.Figure(go.Heatmap(
+            x=teams, y=teams, z=z[np.ix_(played, played)], customdata=records[np.ix_(played, played)],
+            zmid=midpoint,
+            colorscale=SHOOTING_COLOR_SCALE, colorbar=dict(title=title),
+            hovertemplate=f'%{{y}} vs %{{x}}<br>{value}<br>Record %{{customdata}}<extra></extra>'))
+        fig.update_layout(
+            xaxis_title='Opponent',
+            xaxis_side='top',
+            yaxis_title='Team',
+            yaxis_autorange='reversed',
+            height=700)
         return fig
 
 
+def box_score_table(df: pd.DataFrame) -> pd.DataFrame:
+    '''
+    Turn box scores with one row per team and match into one row per match.
+    The home team is the one whose id follows the date (MMDDYYYY) in the
+    match_id. Matches without exactly one home and one away row are left out.
+    Args:
+        df (pd.DataFrame): Columns match_id, team_id, team_name and BOX_SCORE_STATS.
+    Returns:
+        df (pd.DataFrame): Indexed by match_id, columns (side, stat) with side 'home'
+        or 'away': team_id and team_name (categorical), BOX_SCORE_STATS (int16),
+        fgp, tpp and ftp, dreb_share (share of the team's rebounds) and
+        <stat>_share for OPPONENT_SHARE_STATS (share of both teams' total),
+        all percentages (float32, 0 when the total is 0).
+    '''
+    df = df.assign(is_home=df['team_id'].to_numpy() == df['match_id'].str[8:11].to_numpy())
+    df = df[~df.duplicated(['match_id', 'is_home'], keep=False)]
+    df = df[df.groupby('match_id')['is_home'].transform('size') == 2]
+    # Sorted this way every match is an away row followed by its home row
+    df = df.sort_values(['match_id', 'is_home'])
+    sides = {'home': df.iloc[1::2], 'away': df.iloc[0::2]}
+
+    def percentage(part, whole):
+        return np.divide(100 * part, whole, out=np.zeros(len(part)), where=whole > 0).astype(PERCENT)
+
+    team_ids = sorted(df['team_id'].unique())
+    team_names = sorted(df['team_name'].unique())
+    columns = {}
+    for side, other in (('home', 'away'), ('away', 'home')):
+        stats = {stat: sides[side][stat].to_numpy(COUNT) for stat in BOX_SCORE_STATS}
+        opponent = {stat: sides[other][stat].to_numpy(COUNT) for stat in OPPONENT_SHARE_STATS}
+        columns[side, 'team_id'] = pd.Categorical(sides[side]['team_id'], categories=team_ids)
+        columns[side, 'team_name'] = pd.Categorical(sides[side]['team_name'], categories=team_names)
+        columns.update({(side, stat): values for stat, values in stats.items()})
+        for made, attempted, pct in (('fgm', 'fga', 'fgp'), ('tpm', 'tpa', 'tpp'), ('ftm', 'fta', 'ftp')):
+            columns[side, pct] = percentage(stats[made], stats[attempted])
+        columns[side, 'dreb_share'] = percentage(stats['dreb'], stats['reb'])
+        for stat in OPPONENT_SHARE_STATS:
+            columns[side, f'{stat}_share'] = percentage(stats[stat], stats[stat] + opponent[stat].astype(np.int32))
+    return pd.DataFrame(columns, index=pd.Index(sides['home']['match_id'].to_numpy(), name='match_id'))
+
 
-    
 class Calculation:    
-    def __init__(self, conn: sqlite3.Connection):
+    def __init__(self, conn, cache: ResultCache = RESULT_CACHE, snapshot: Snapshot = None,
+                 profiler: QueryProfiler = None):
+        '''
+        Args:
+            conn (sqlite3.Connection | ConnectionPool): Database to read from. With a
+                pool, every query borrows its own read-only connection.
+            cache (ResultCache): Cache for the method results, None disables caching.
+            snapshot (Snapshot): Columnar snapshot (see modules.snapshot). When given,
+                the aggregates are computed from it instead of SQL.
+            profiler (QueryProfiler): Records the timing, size and plan of every query.
+        '''
         self.conn = conn
+        self.cache = cache
+        self.snapshot = snapshot
+        self.profiler = profiler
+
+    def _read_sql(self, name: str, sql: str, params=None) -> pd.DataFrame:
+        '''
+        Run a query on a borrowed connection, recorded by the profiler under name.
+        '''
+        with borrow(self.conn) as conn:
+            if self.profiler is not None:
+                return self.profiler.read_sql(name, sql, conn, params=params)
+            return pd.read_sql(sql, conn, params=params)
 
+    @cached
+    @typed
     def calculate_mean_values(self):
-        df = pd.read_sql('''
+        '''
+        League-wide per-game averages. Every box score is paired with its own
+        result row, so each game counts exactly twice (once per side) and the
+        join is an integer primary key lookup per row.
+        '''
+        if self.snapshot is not None:
+            return self.snapshot.mean_values()
+        df = self._read_sql('calculate_mean_values', '''
             SELECT 
             ROUND(AVG(mi.pts), 2) AS avg_pts,
             ROUND(AVG(ms.ast),2) AS avg_ast,
@@ -99,138 +412,309 @@ class Calculation:
             ROUND(AVG(ms.blk), 2) AS avg_blk,
             ROUND(AVG(ms.tov), 2) AS avg_tov,
             ROUND(AVG(ms.pf), 2) AS avg_pf
-            FROM match_stats ms
-            JOIN match_info mi ON ms.match_id = mi.match_id
-        ''', self.conn)
+            FROM box_scores ms
+            JOIN match_results mi ON ms.match_key = mi.match_key AND ms.team_key = mi.team_key
+        ''')
         return df
     
+    @cached
+    @typed
+    def calculate_team_aggregates(self):
+        '''
+        Compute every per-team, per-game metric in a single scan.
+        Returns:
+            df (pd.DataFrame): One row per team with the per-game averages
+            (ppg, astpg, rebpg, stlpg, tovpg, blkpg, pfpg), the shooting
+            percentages (fgp, tpp, ftp) and the number of games played.
+        '''
+        if self.snapshot is not None:
+            return self.snapshot.team_aggregates()
+        df = self._read_sql('calculate_team_aggregates', '''
+            SELECT t.team_id, d.team_name,
+            ROUND(AVG(mi.pts), 2) AS ppg,
+            ROUND(AVG(ms.ast), 2) AS astpg,
+            ROUND(AVG(ms.reb), 2) AS rebpg,
+            ROUND(AVG(ms.stl), 2) AS stlpg,
+            ROUND(AVG(ms.tov), 2) AS tovpg,
+            ROUND(AVG(ms.blk), 2) AS blkpg,
+            ROUND(AVG(ms.pf), 2) AS pfpg,
+            ROUND(100.0 * SUM(ms.fgm) / SUM(ms.fga), 2) AS fgp,
+            ROUND(100.0 * SUM(ms.tpm) / SUM(ms.tpa), 2) AS tpp,
+            ROUND(100.0 * SUM(ms.ftm) / SUM(ms.fta), 2) AS ftp,
+            COUNT(*) AS games
+            FROM team_details d
+            JOIN teams t ON t.team_key = d.team_key
+            JOIN box_scores ms ON t.team_key = ms.team_key
+            JOIN match_results mi ON ms.match_key = mi.match_key AND ms.team_key = mi.team_key
+            GROUP BY t.team_key
+            ORDER BY t.team_id
+        ''')
+        return df
+
+    @staticmethod
+    def rank_team_metric(df_aggregates: pd.DataFrame, metric: str) -> pd.DataFrame:
+        '''
+        Project a single metric out of the team aggregates, ranked best first.
+        Args:
+            df_aggregates (pd.DataFrame): Frame returned by calculate_team_aggregates.
+            metric (str): Name of the metric column, e.g. "ppg".
+        Returns:
+            df (pd.DataFrame): Columns team_name and metric, sorted descending.
+        '''
+        df = df_aggregates[['team_name', metric]].sort_values(metric, ascending=False, kind='mergesort')
+        return df.reset_index(drop=True)
+
     def calc_ppg(self):
-        df = pd.read_sql('''
-            SELECT t.team_name, round(AVG(mi.pts), 2) as ppg
-            FROM team_info t
-            JOIN match_info mi ON t.team_id = mi.team_id
-            GROUP BY t.team_name
-            ORDER BY ppg DESC
-        ''', self.conn)
-        return df 
-    
+        return self.rank_team_metric(self.calculate_team_aggregates(), 'ppg')
+
     def calculate_team_stats(self):
-        df_ppg = pd.read_sql('''
-            SELECT t.team_name, round(AVG(mi.pts), 2) as ppg
-            FROM team_info t
-            JOIN match_info mi ON t.team_id = mi.team_id
-            GROUP BY t.team_name
-            ORDER BY ppg DESC
-        ''', self.conn)
-
-        df_astpg = pd.read_sql('''
-            SELECT t.team_name, round(AVG(mi.ast), 2) as astpg
-            FROM team_info t
-            JOIN match_stats mi ON t.team_id = mi.team_id
-            GROUP BY t.team_name
-            ORDER BY astpg DESC
-        ''', self.conn)
-
-        df_rebpg = pd.read_sql('''
-            SELECT t.team_name, round(AVG(mi.reb), 2) as rebpg
-            FROM team_info t
-            JOIN match_stats mi ON t.team_id = mi.team_id
-            GROUP BY t.team_name
-            ORDER BY rebpg DESC
-        ''', self.conn)
-
-        df_tovpg = pd.read_sql('''
-            SELECT t.team_name, round(AVG(mi.tov), 2) as tovpg
-            FROM team_info t
-            JOIN match_stats mi ON t.team_id = mi.team_id
-            GROUP BY t.team_name
-            ORDER BY tovpg DESC
-        ''', self.conn)
-
-        df_stlpg = pd.read_sql('''
-            SELECT t.team_name, round(AVG(mi.stl), 2) as stlpg
-            FROM team_info t
-            JOIN match_stats mi ON t.team_id = mi.team_id
-            GROUP BY t.team_name
-            ORDER BY stlpg DESC
-        ''', self.conn)
-
-        df_blkpg = pd.read_sql('''
-            SELECT t.team_name, round(AVG(mi.blk), 2) as blkpg
-            FROM team_info t
-            JOIN match_stats mi ON t.team_id = mi.team_id
-            GROUP BY t.team_name
-            ORDER BY blkpg DESC
-        ''', self.conn)
-
-        df_pfpg = pd.read_sql('''
-            SELECT t.team_name, round(AVG(mi.pf), 2) as pfpg
-            FROM team_info t
-            JOIN match_stats mi ON t.team_id = mi.team_id
-            GROUP BY t.team_name
-            ORDER BY pfpg DESC
-        ''', self.conn)
-        
-        return df_ppg, df_astpg, df_rebpg, df_stlpg, df_tovpg, df_blkpg, df_pfpg
+        df_aggregates = self.calculate_team_aggregates()
+        return tuple(self.rank_team_metric(df_aggregates, metric) for metric in TEAM_METRICS)
     
+    @cached
+    @typed
     def calculate_total_stats(self):
-        df_min = pd.read_sql('''
-            SELECT SUM(min) as tot_minutes
-            FROM(
-                SELECT DISTINCT match_id, min
-                FROM match_info)
-        ''', self.conn)    
-        
-        df_count = pd.read_sql('''
-            SELECT COUNT(DISTINCT match_id) as tot_matches
-            FROM match_info
-        ''', self.conn)  
-        
-        df_dates = pd.read_sql('''
-            SELECT COUNT(DISTINCT date_id) as tot_dates
-            FROM game_dates
-        ''', self.conn)      
-        
-        df_fgm = pd.read_sql('''
-            SELECT SUM(fgm) as tot_fgm
-            FROM match_stats
-        ''', self.conn)   
+        '''
+        League totals, read from the single row of league_totals kept current
+        by triggers (see modules.database).
+        Returns:
+            (df_count, df_dates, df_min, df_points, df_fgm) (tuple): One single-value frame per total.
+        '''
+        if self.snapshot is not None:
+            return self.snapshot.total_stats()
+        df = self._read_sql('calculate_total_stats', '''
+            SELECT tot_matches, tot_dates, tot_minutes, tot_pts, tot_fgm
+            FROM league_totals
+        ''')
+        return tuple(df[[column]] for column in ['tot_matches', 'tot_dates', 'tot_minutes', 'tot_pts', 'tot_fgm'])
+    
+    @cached
+    @typed
+    def get_win_loss(self):
+        if self.snapshot is not None:
+            return self.snapshot.win_loss()
+        df = self._read_sql('get_win_loss', '''
+            SELECT team_name, SUM(wins) AS wins, SUM(losses) AS losses
+            FROM team_details
+            JOIN team_season_totals ON team_details.team_key = team_season_totals.team_key
+            GROUP BY team_name
+            ORDER BY wins DESC, team_name
+        ''')
+        return df
 
-        df_points = pd.read_sql('''
-            SELECT SUM(pts) as tot_pts
-            FROM match_info
-        ''', self.conn)  
+    @cached
+    @typed
+    def get_shooting_points(self):
+        if self.snapshot is not None:
+            return self.snapshot.shooting_points()
+        df = self._read_sql('get_shooting_points', '''
+            SELECT fga, fgp
+            FROM box_scores
+        ''')
+        return df
 
-        return df_count, df_dates, df_min, df_points, df_fgm
-    
+    @cached
+    @typed
+    def get_shooting_data(self, max_points: int = SHOOTING_MAX_POINTS):
+        '''
+        Data of the FGA vs FG% chart. Up to max_points box scores are returned
+        as they are; beyond that they are counted per cell of a 2-D grid in
+        SQL, so the size of the result no longer grows with the data.
+        Args:
+            max_points (int): Largest number of box scores returned unbinned.
+        Returns:
+            df (pd.DataFrame), binned (bool): Columns fga and fgp, one row per box
+            score, or fga, fgp (lower edges of the cell) and games, one row per
+            non-empty cell.
+        '''
+        if self.snapshot is not None:
+            points = len(self.snapshot['match_stats'])
+        else:
+            points = self._read_sql('get_shooting_data', 'SELECT COUNT(*) AS points FROM box_scores')['points'][0]
+        if points <= max_points:
+            return self.get_shooting_points(), False
+        if self.snapshot is not None:
+            return self.snapshot.shooting_bins(SHOOTING_BIN_FGA, SHOOTING_BIN_FGP), True
+        df = self._read_sql('get_shooting_data', '''
+            SELECT (fga / :fga_step) * :fga_step AS fga,
+            CAST(fgp / :fgp_step AS INTEGER) * :fgp_step AS fgp,
+            COUNT(*) AS games
+            FROM box_scores
+            GROUP BY 1, 2
+        ''', params={'fga_step': SHOOTING_BIN_FGA, 'fgp_step': SHOOTING_BIN_FGP})
+        return df, True
+
+    @cached
+    @typed
+    def get_teams(self):
+        if self.snapshot is not None:
+            return self.snapshot.teams()
+        df = self._read_sql('get_teams', '''
+            SELECT team_name, team_id
+            FROM team_info
+        ''')
+        return df
+
+    @cached
+    def get_box_scores(self):
+        '''
+        Box score of every match, home and away side by side, with the
+        shooting percentages and the opponent shares computed for all matches
+        at once (see box_score_table).
+        Returns:
+            df (pd.DataFrame): One row per match, indexed by match_id.
+        '''
+        if self.snapshot is not None:
+            return box_score_table(self.snapshot.team_box_scores())
+        df = self._read_sql('get_box_scores', '''
+            SELECT ma.match_id, t.team_id, COALESCE(d.team_name, t.team_id) AS team_name, r.pts,
+            b.fgm, b.fga, b.tpm, b.tpa, b.ftm, b.fta, b.oreb, b.dreb, b.reb, b.ast, b.tov, b.stl, b.blk, b.pf
+            FROM box_scores b
+            JOIN match_results r ON r.match_key = b.match_key AND r.team_key = b.team_key
+            JOIN matches ma ON ma.match_key = b.match_key
+            JOIN teams t ON t.team_key = b.team_key
+            LEFT JOIN team_details d ON d.team_key = b.team_key
+        ''')
+        return box_score_table(df)
+
+    @cached
+    def get_box_score(self, match_id: str) -> pd.Series:
+        '''
+        Row of get_box_scores for one match; index it with 'home' or 'away'
+        for the stats of one side.
+        '''
+        return self.get_box_scores().loc[match_id]
+
+    @typed
+    def get_team_form(self, window: int = FORM_WINDOW, span: int = FORM_SPAN) -> pd.DataFrame:
+        '''
+        Form of every team after each of its games: the mean of FORM_STATS
+        over its last `window` games and their exponentially weighted mean
+        (as pandas' ewm(span=span)), carried across seasons. The table is kept
+        by FORM_ENGINE rather than the result cache and extended with the
+        games of new dates only (see modules.form).
+        Returns:
+            df (pd.DataFrame): team_id, date_id, game_date, season, game (number of
+            the team's game) and <stat>_roll and <stat>_ewm for every stat, sorted
+            by team and date.
+        '''
+        stats = ', '.join(f'r.pts' if stat == 'pts' else f'b.{stat}' for stat in FORM_STATS)
+        joins = '''
+            FROM box_scores b
+            JOIN match_results r ON r.match_key = b.match_key AND r.team_key = b.team_key
+            JOIN matches ma ON ma.match_key = b.match_key
+        '''
+
+        def read_games(after_date_id):
+            df = self._read_sql('get_team_form.games', f'''
+                SELECT t.team_id, ma.date_id, g.game_date, ma.season, {stats}
+                {joins}
+                JOIN game_dates g ON g.date_id = ma.date_id
+                JOIN teams t ON t.team_key = b.team_key
+                WHERE ma.date_id > ?
+            ''', params=[after_date_id])
+            return df.assign(game_date=pd.to_datetime(df['game_date']))
+
+        def read_checksum(up_to_date_id):
+            weighted = ' + '.join(f"{weight} * {column}" for weight, column in
+                                  zip(CHECKSUM_WEIGHTS.values(), stats.split(', ')))
+            df = self._read_sql('get_team_form.checksum', f'''
+                SELECT COUNT(*) AS games, COALESCE(SUM(({weighted}) * ma.date_id), 0) AS checksum
+                {joins}
+                WHERE ma.date_id <= ?
+            ''', params=[up_to_date_id])
+            return int(df['games'][0]), int(df['checksum'][0])
+
+        fingerprint = database_fingerprint(self.conn)
+        # The path of a file database, the connection of an in-memory one
+        table = FORM_ENGINE.team_form(fingerprint[0], fingerprint, window, 2 / (span + 1), read_games, read_checksum)
+        return table.copy()
+
+    @cached
+    @typed
+    def get_ratings(self) -> pd.DataFrame:
+        '''
+        Current Elo rating of every team, as maintained in team_ratings by
+        database.prepare_database (see modules.ratings).
+        Returns:
+            df (pd.DataFrame): team_id, team_name (the id when the team has no
+            details), rating and games rated, best rating first.
+        '''
+        df = self._read_sql('get_ratings', '''
+            SELECT t.team_id, COALESCE(d.team_name, t.team_id) AS team_name, r.rating, r.games
+            FROM team_ratings r
+            JOIN teams t ON t.team_key = r.team_key
+            LEFT JOIN team_details d ON d.team_key = r.team_key
+            ORDER BY r.rating DESC, t.team_id
+        ''')
+        return df
+
+    @cached
+    @typed
     def get_match_stats(self, team_id1: str, team_id2: str):
+        '''
+        Box scores of every game between two teams, read through the matchups
+        index. Returns exactly two rows (one per team) for each game, named
+        after the team id when the team has no details.
+        Args:
+            team_id1 (str): Abbreviation of the first team.
+            team_id2 (str): Abbreviation of the second team.
+        Returns:
+            df (pd.DataFrame), match_ids (list): The box scores and the distinct match ids.
+        '''
         sql_query = """
-            SELECT ms.match_id, ms.team_id, ti.team_name, ms.fgm, ms.fga, ms.tpm, ms.tpa, ms.ftm, ms.fta, ms.oreb, ms.dreb, 
-            ms.reb, ms.ast, ms.tov, ms.stl, ms.blk, pf, mi.pts
-            FROM match_stats ms
-            JOIN match_info mi ON ms.match_id = mi.match_id
-            JOIN team_info ti ON ms.team_id = ti.team_id
-            WHERE (ms.team_id = ? AND mi.team_id = ?) OR (ms.team_id = ? AND mi.team_id = ?)
+            WITH pair AS (
+                SELECT MIN(team_key) AS team_a, MAX(team_key) AS team_b
+                FROM teams
+                WHERE team_id IN (?, ?)
+                HAVING COUNT(*) = 2
+            )
+            SELECT ma.match_id, ti.team_id, COALESCE(td.team_name, ti.team_id) AS team_name, ms.fgm, ms.fga, ms.tpm, ms.tpa, ms.ftm, ms.fta, ms.oreb, ms.dreb, 
+            ms.reb, ms.ast, ms.tov, ms.stl, ms.blk, ms.pf, mi.pts
+            FROM pair p
+            JOIN matchups m ON m.team_a = p.team_a AND m.team_b = p.team_b
+            JOIN matches ma ON ma.match_key = m.match_key
+            JOIN box_scores ms ON ms.match_key = m.match_key
+            JOIN match_results mi ON mi.match_key = ms.match_key AND mi.team_key = ms.team_key
+            JOIN teams ti ON ti.team_key = ms.team_key
+            LEFT JOIN team_details td ON td.team_key = ms.team_key
+            ORDER BY ma.date_id, ma.match_id, ti.team_id
         """
-        params = [team_id1, team_id1, team_id2, team_id2]
+        params = [team_id1, team_id2]
 
-        df = pd.read_sql(sql_query, self.conn, params=params)
-        df = df[df.groupby('match_id')['team_id'].transform('nunique') == 2]
+        df = self._read_sql('get_match_stats', sql_query, params=params)
         
         return df, df['match_id'].unique().tolist()
-    def get_match_statss(self, team_id1: str, team_id2: str):
-        sql_query = """
-            SELECT ms.match_id, ms.team_id, ti.team_name, ms.fgm, ms.fga, ms.tpm, ms.tpa, ms.ftm, ms.fta, ms.oreb, ms.dreb, ms.reb, 
-            ms.ast, ms.tov, ms.stl, ms.blk, pf, mi.pts
-            FROM match_stats ms
-            JOIN match_info mi ON ms.match_id = mi.match_id
-            JOIN team_info ti on ms.match_id = ti.team_id
-
-            WHERE (ms.team_id = ? AND mi.team_id = ?) OR (ms.team_id = ? AND mi.team_id = ?)
-        """
-        params = [team_id1, team_id1, team_id2, team_id2]
 
-        df = pd.read_sql(sql_query, self.conn, params=params)
-        df = df[df.groupby('match_id')['team_id'].transform('nunique') == 2]
-        
-        return df, df['match_id'].unique().tolist()
\ No newline at end of file
+    @cached
+    def get_head_to_head(self) -> HeadToHead:
+        '''
+        Head-to-head records of every pair of teams in one grouped pass over
+        the results, each joined to the other result of its match. A game is
+        counted once, from the side of the team with the lower key, and the
+        other side is filled in by head_to_head_matrix. The analyzer reads the
+        record of the pair it shows from here.
+        Returns:
+            h2h (HeadToHead): Games, wins and summed margins in H2H_STATS, team x team,
+            over the teams of get_teams.
+        '''
+        deltas = ',\n'.join('SUM(ra.pts - rb.pts) AS pts_delta' if stat == 'pts' else
+                             f'SUM(ba.{stat} - bb.{stat}) AS {stat}_delta' for stat in H2H_STATS)
+        df = self._read_sql('get_head_to_head', f'''
+            SELECT ta.team_id, tb.team_id AS opponent_id, p.*
+            FROM (
+                SELECT ra.team_key AS team_a, rb.team_key AS team_b,
+                COUNT(*) AS games,
+                SUM(ra.result = 'W') AS wins,
+                {deltas}
+                FROM match_results ra
+                JOIN match_results rb ON rb.match_key = ra.match_key AND rb.team_key > ra.team_key
+                JOIN box_scores ba ON ba.match_key = ra.match_key AND ba.team_key = ra.team_key
+                JOIN box_scores bb ON bb.match_key = rb.match_key AND bb.team_key = rb.team_key
+                GROUP BY ra.team_key, rb.team_key
+            ) p
+            JOIN teams ta ON ta.team_key = p.team_a
+            JOIN teams tb ON tb.team_key = p.team_b
+        ''')
+        team_ids = set(self.get_teams()['team_id']) | set(df['team_id']) | set(df['opponent_id'])
+        return head_to_head_matrix(df, list(team_ids))
@@ -0,0 +1,234 @@
+'''
+Load the semicolon separated CSV files of ./data into the SQLite database.
+
+    python -m modules.ingest [--db nba.db] [--data ./data] [--batch-size 5000] [--snapshot]
+
+The files are streamed and upserted in batches inside a single transaction.
+Rows that are already in the database with the same values are left
+untouched, so adding one night of games only writes the new rows.
+'''
+import argparse
+import csv
+import os
+import re
+import sqlite3
+import time
+from dataclasses import dataclass
+
+import modules.database as db
+
+
+@dataclass(frozen=True)
+class TableSpec:
+    name: str
+    columns: tuple
+    types: tuple
+    primary_key: tuple
+    # Views over the compact schema (see modules.database), written through their base tables
+    view: bool = False
+
+    def __post_init__(self):
+        if len(self.types) != len(self.columns):
+            raise ValueError(f"{self.name}: {len(self.columns)} columns but {len(self.types)} types")
+        if not self.primary_key or not set(self.primary_key) <= set(self.columns):
+            raise ValueError(f"{self.name}: primary key {self.primary_key} is not a subset of {self.columns}")
+
+    @property
+    def csv_file(self) -> str:
+        return f'{self.name}.csv'
+
+
+# Loaded in this order, so dates and teams exist before the games referencing them
+TABLES = [
+    TableSpec('team_info',
+              ('team_id', 'team_name', 'arena_name', 'latitude', 'longitude'),
+              (str, str, str, float, float),
+              ('team_id',),
+              view=True),
+    TableSpec('game_dates',
+              ('date_id', 'game_date'),
+              (int, str),
+              ('date_id',)),
+    TableSpec('match_info',
+              ('match_id', 'team_id', 'date_id', 'result', 'min', 'pts'),
+              (str, str, int, str, int, int),
+              ('match_id', 'team_id'),
+              view=True),
+    TableSpec('match_stats',
+              ('match_id', 'team_id', 'date_id', 'fgm', 'fga', 'fgp', 'tpm', 'tpa', 'tpp', 'ftm', 'fta', 'ftp',
+               'oreb', 'dreb', 'reb', 'ast', 'tov', 'stl', 'blk', 'pf'),
+              (str, str, int, int, int, float, int, int, float, int, int, float,
+               int, int, int, int, int, int, int, int),
+              ('match_id', 'team_id'),
+              view=True),
+]
+
+
+class IngestError(ValueError):
+    '''Raised when a CSV file does not match the table it is loaded into.'''
+
+
+@dataclass
+class IngestReport:
+    table: str
+    rows_read: int = 0
+    rows_written: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows_read / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        return (f"{self.table}: {self.rows_read} rows read, {self.rows_written} inserted or updated "
+                f"in {self.seconds:.3f}s ({self.rows_per_second:,.0f} rows/s)")
+
+
+def upsert_statements(spec: TableSpec) -> list:
+    '''
+    Build the upserts of a table, run in order on every batch. The WHERE
+    clause of the update skips rows whose values did not change, so they are
+    not rewritten. Views are written with the statements of their insert
+    trigger, run on the base tables directly (see modules.database.view_upserts).
+    '''
+    if spec.view:
+        return db.view_upserts(spec.name, spec.columns)
+    columns = ', '.join(spec.columns)
+    placeholders = ', '.join('?' * len(spec.columns))
+    values = [c for c in spec.columns if c not in spec.primary_key]
+    assignments = ', '.join(f'{c} = excluded.{c}' for c in values)
+    changed = ' OR '.join(f'{c} IS NOT excluded.{c}' for c in values)
+    return [f"INSERT INTO {spec.name}({columns}) VALUES({placeholders}) "
+            f"ON CONFLICT({', '.join(spec.primary_key)}) DO UPDATE SET {assignments} WHERE {changed}"]
+
+
+def read_rows(path: str, spec: TableSpec):
+    '''
+    Stream the typed rows of a CSV file and validate its primary key.
+    Raises:
+        IngestError: On an unexpected header, a malformed value, an empty or a duplicated key.
+    '''
+    key_positions = [spec.columns.index(c) for c in spec.primary_key]
+    seen = set()
+    with open(path, newline='') as f:
+        reader = csv.reader(f, delimiter=';')
+        header = tuple(next(reader, ()))
+        if header != spec.columns:
+            raise IngestError(f"{path}: expected columns {spec.columns}, found {header}")
+        for line, row in enumerate(reader, start=2):
+            if not row:
+                continue
+            if len(row) != len(spec.columns):
+                raise IngestError(f"{path}:{line}: expected {len(spec.columns)} values, found {len(row)}")
+            try:
+                values = tuple(cast(value) for cast, value in zip(spec.types, row))
+            except ValueError as e:
+                raise IngestError(f"{path}:{line}: {e}") from None
+            key = tuple(values[i] for i in key_positions)
+            if any(v == '' for v in key):
+                raise IngestError(f"{path}:{line}: empty primary key {dict(zip(spec.primary_key, key))}")
+            if key in seen:
+                raise IngestError(f"{path}:{line}: duplicated primary key {dict(zip(spec.primary_key, key))}")
+            seen.add(key)
+            yield values
+
+
+def write_batch(conn: sqlite3.Connection, statements: list, batch: list, spec: TableSpec) -> int:
+    '''
+    Run the upserts of a table on a batch, one executemany call each.
+    Returns:
+        written (int): Number of rows of the batch that were inserted or updated.
+    '''
+    for statement in statements[:-1]:
+        # The matches and teams the rows reference: each is upserted
+        # once, bound to the values up to the last parameter of the statement
+        keys = sorted({int(i) - 1 for i in re.findall(r'\?(\d+)', statement)})
+        rows = {tuple(values[i] for i in keys): values[:keys[-1] + 1] for values in batch}
+        conn.executemany(statement, rows.values())
+    # The last statement writes the rows themselves. Unlike total_changes,
+    # rowcount leaves out the totals the triggers of the base tables update.
+    return conn.executemany(statements[-1], batch).rowcount
+
+
+def ingest_table(conn: sqlite3.Connection, path: str, spec: TableSpec, batch_size: int = 5000) -> IngestReport:
+    '''
+    Upsert a CSV file into its table in batches. Runs inside the caller's transaction.
+    '''
+    report = IngestReport(spec.name)
+    statements = upsert_statements(spec)
+    start = time.perf_counter()
+    batch = []
+    for values in read_rows(path, spec):
+        batch.append(values)
+        if len(batch) >= batch_size:
+            report.rows_written += write_batch(conn, statements, batch, spec)
+            report.rows_read += len(batch)
+            batch = []
+    if batch:
+        report.rows_written += write_batch(conn, statements, batch, spec)
+        report.rows_read += len(batch)
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+def ingest(db_file: str = 'nba.db', data_dir: str = './data', batch_size: int = 5000) -> list:
+    '''
+    Load every CSV of the data folder into the database and refresh the derived
+    tables, all in one transaction: nothing is written if any file fails
+    validation, and the matchups and ratings always match the games.
+    Args:
+        db_file (str): Path to the database file, created if missing.
+        data_dir (str): Folder containing the CSV files.
+        batch_size (int): Number of rows per executemany call.
+    Returns:
+        reports (list): One IngestReport per table.
+    '''
+    conn = sqlite3.connect(db_file, timeout=30, isolation_level=None)
+    try:
+        db.enable_wal(conn)
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            migrated = db.create_tables(conn)
+            reports = [ingest_table(conn, os.path.join(data_dir, spec.csv_file), spec, batch_size)
+                       for spec in TABLES]
+            db.refresh_derived_tables(conn)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        if migrated:
+            db.reclaim_space(conn)
+    finally:
+        conn.close()
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='nba.db', help='Path to the SQLite database file.')
+    parser.add_argument('--data', default='./data', help='Folder containing the CSV files.')
+    parser.add_argument('--batch-size', type=int, default=5000, help='Rows per executemany batch.')
+    parser.add_argument('--snapshot', action='store_true', help='Also rewrite the columnar snapshot.')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    try:
+        reports = ingest(args.db, args.data, args.batch_size)
+    except (IngestError, FileNotFoundError) as e:
+        parser.exit(1, f"Ingestion failed, nothing was written: {e}\n")
+    for report in reports:
+        print(report)
+    total = sum(report.rows_read for report in reports)
+    elapsed = time.perf_counter() - start
+    print(f"Total: {total} rows in {elapsed:.3f}s ({total / elapsed:,.0f} rows/s)")
+
+    if args.snapshot:
+        from modules.snapshot import write_snapshot
+        conn = sqlite3.connect(args.db)
+        write_snapshot(conn)
+        conn.close()
+        print("Columnar snapshot written.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+import datetime
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+
+import pandas as pd
+
+# Plan steps reading a whole table: "SCAN <table>" without an index, as
+# opposed to "SCAN <table> USING [COVERING] INDEX ..." and the scans of
+# subqueries, CTEs and constant rows
+_FULL_SCAN = re.compile(r'^SCAN (?!CONSTANT ROW|\(|SUBQUERY|CTE )(\w+)(?!.*USING)')
+_TABLE_ALIAS = re.compile(r'\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', re.IGNORECASE)
+_CTE = re.compile(r'\b(\w+)\s+AS\s*\(', re.IGNORECASE)
+_KEYWORDS = {'ON', 'USING', 'WHERE', 'JOIN', 'LEFT', 'INNER', 'CROSS', 'NATURAL', 'GROUP', 'ORDER', 'LIMIT',
+             'UNION', 'WINDOW', 'HAVING'}
+
+
+def query_plan(conn: sqlite3.Connection, sql: str, params=None) -> list:
+    '''
+    Returns:
+        plan (list): The detail column of EXPLAIN QUERY PLAN, one string per step.
+    '''
+    return [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params or ())]
+
+
+def full_scans(plan: list, sql: str = '') -> list:
+    '''
+    Args:
+        plan (list): Output of query_plan.
+        sql (str): The statement, to name tables the plan refers to by their
+            alias, and to leave out its common table expressions.
+    Returns:
+        tables (list): Tables the plan reads in full.
+    '''
+    aliases = {alias: table for table, alias in _TABLE_ALIAS.findall(sql)
+               if alias and alias.upper() not in _KEYWORDS}
+    ctes = set(_CTE.findall(sql))
+    tables = [aliases.get(match.group(1), match.group(1)) for step in plan if (match := _FULL_SCAN.match(step))]
+    return [table for table in tables if table not in ctes]
+
+
+class QueryProfiler:
+    '''
+    Thread-safe record of the SQL statements run by a Calculation: wall time,
+    rows returned, bytes of the resulting DataFrame and query plan of each.
+    Results served from the result cache run no SQL and are not recorded.
+    With a log path every record is also appended to it as one JSON line.
+
+    Example:
+        profiler = QueryProfiler(log_path='queries.jsonl')
+        calc = Calculation(conn, profiler=profiler)
+        calc.get_win_loss()
+        profiler.to_frame()
+    '''
+    def __init__(self, log_path: str = None, maxlen: int = 1000):
+        '''
+        Args:
+            log_path (str): JSON lines file the records are appended to, None to keep them in memory only.
+            maxlen (int): Number of most recent records kept in memory.
+        '''
+        self.log_path = log_path
+        self.records = deque(maxlen=maxlen)
+        self._plans = {}
+        self._lock = threading.Lock()
+
+    def _plan(self, conn: sqlite3.Connection, sql: str, params) -> tuple:
+        # The plan depends on the statement and the schema, not on the parameter values
+        found = self._plans.get(sql)
+        if found is None:
+            plan = query_plan(conn, sql, params)
+            # Steps inside a view refer to the aliases of the view definition
+            views = [row[0] for row in conn.execute("SELECT sql FROM sqlite_master WHERE type = 'view'")]
+            found = self._plans[sql] = plan, full_scans(plan, '\n'.join(views + [sql]))
+        return found
+
+    def read_sql(self, name: str, sql: str, conn: sqlite3.Connection, params=None) -> pd.DataFrame:
+        '''
+        pd.read_sql, recorded under `name`.
+        Args:
+            name (str): Label of the query, the Calculation method running it.
+            sql (str): Statement to run.
+            conn (sqlite3.Connection): Connection to run it on.
+            params: Parameters of the statement.
+        Returns:
+            df (pd.DataFrame): Result of the query.
+        '''
+        start = time.perf_counter()
+        df = pd.read_sql(sql, conn, params=params)
+        elapsed = time.perf_counter() - start
+        plan, scans = self._plan(conn, sql, params)
+        record = {
+            'time': datetime.datetime.now().isoformat(timespec='milliseconds'),
+            'name': name,
+            'sql': ' '.join(sql.split()),
+            'params': params,
+            'ms': round(elapsed * 1000, 3),
+            'rows': len(df),
+            'bytes': int(df.memory_usage(index=True, deep=True).sum()),
+            'full_scans': scans,
+            'plan': plan,
+        }
+        with self._lock:
+            self.records.append(record)
+            if self.log_path:
+                with open(self.log_path, 'a') as f:
+                    f.write(json.dumps(record, default=str) + '\n')
+        return df
+
+    def to_frame(self) -> pd.DataFrame:
+        '''
+        Returns:
+            df (pd.DataFrame): One row per recorded query, the slowest first.
+        '''
+        with self._lock:
+            records = list(self.records)
+        columns = ['name', 'ms', 'rows', 'bytes', 'full_scans', 'plan', 'sql']
+        df = pd.DataFrame(records, columns=columns)
+        return df.sort_values('ms', ascending=False, ignore_index=True)
+
+    def clear(self):
+        with self._lock:
+            self.records.clear()
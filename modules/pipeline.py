@@ -0,0 +1,147 @@
+'''
+Turn the scraped box scores (data/raw_data.csv) into the normalized CSV files
+loaded by modules.ingest: game_dates, match_info, match_stats and team_info.
+This is the cleaning of process.ipynb as vectorized pandas operations.
+
+    python -m modules.pipeline [--raw ./data/raw_data.csv] [--out ./data] [--chunksize 50000]
+
+The raw file is read in chunks: a first pass collects the game dates to number
+them, a second pass transforms and appends one chunk at a time, so memory
+stays bounded whatever the number of seasons in the export.
+'''
+import argparse
+import os
+
+import pandas as pd
+
+# Raw column -> clean column, "+/-" is dropped
+RAW_COLUMNS = {
+    'MATCH UP': 'match_up', 'GAME DATE': 'game_date', 'W/L': 'result', 'MIN': 'min', 'PTS': 'pts',
+    'FGM': 'fgm', 'FGA': 'fga', 'FG%': 'fgp', '3PM': 'tpm', '3PA': 'tpa', '3P%': 'tpp',
+    'FTM': 'ftm', 'FTA': 'fta', 'FT%': 'ftp', 'OREB': 'oreb', 'DREB': 'dreb', 'REB': 'reb',
+    'AST': 'ast', 'TOV': 'tov', 'STL': 'stl', 'BLK': 'blk', 'PF': 'pf',
+}
+
+MATCH_INFO_COLUMNS = ['match_id', 'team_id', 'date_id', 'result', 'min', 'pts']
+MATCH_STATS_COLUMNS = ['match_id', 'team_id', 'date_id', 'fgm', 'fga', 'fgp', 'tpm', 'tpa', 'tpp', 'ftm', 'fta',
+                       'ftp', 'oreb', 'dreb', 'reb', 'ast', 'tov', 'stl', 'blk', 'pf']
+
+RAW_DATE_FORMAT = '%m/%d/%Y'
+
+TEAM_INFO = [
+    ('ATL', 'Atlanta Hawks', 'State Farm Arena', 33.7573, -84.3963),
+    ('BOS', 'Boston Celtics', 'TD Garden', 42.3662, -71.0621),
+    ('BKN', 'Brooklyn Nets', 'Barclays Center', 40.6826, -73.9754),
+    ('CHA', 'Charlotte Hornets', 'Spectrum Center', 35.2251, -80.8392),
+    ('CHI', 'Chicago Bulls', 'United Center', 41.8807, -87.6742),
+    ('CLE', 'Cleveland Cavaliers', 'Rocket Mortgage FieldHouse', 41.4965, -81.688),
+    ('DAL', 'Dallas Mavericks', 'American Airlines Center', 32.7906, -96.8101),
+    ('DEN', 'Denver Nuggets', 'Ball Arena', 39.7487, -105.0077),
+    ('DET', 'Detroit Pistons', 'Little Caesars Arena', 42.3426, -83.0554),
+    ('GSW', 'Golden State Warriors', 'Chase Center', 37.768, -122.3862),
+    ('HOU', 'Houston Rockets', 'Toyota Center', 29.7508, -95.3621),
+    ('IND', 'Indiana Pacers', 'Bankers Life Fieldhouse', 39.7639, -86.1555),
+    ('LAC', 'Los Angeles Clippers', 'Staples Center', 34.043, -118.2673),
+    ('LAL', 'Los Angeles Lakers', 'Staples Center', 34.043, -118.2673),
+    ('MEM', 'Memphis Grizzlies', 'FedExForum', 35.1381, -90.0507),
+    ('MIA', 'Miami Heat', 'AmericanAirlines Arena', 25.7814, -80.187),
+    ('MIL', 'Milwaukee Bucks', 'Fiserv Forum', 43.0451, -87.9173),
+    ('MIN', 'Minnesota Timberwolves', 'Target Center', 44.9795, -93.2768),
+    ('NOP', 'New Orleans Pelicans', 'Smoothie King Center', 29.9489, -90.0812),
+    ('NYK', 'New York Knicks', 'Madison Square Garden', 40.7505, -73.9934),
+    ('OKC', 'Oklahoma City Thunder', 'Paycom Center', 35.4634, -97.5151),
+    ('ORL', 'Orlando Magic', 'Amway Center', 28.5392, -81.3839),
+    ('PHI', 'Philadelphia 76ers', 'Wells Fargo Center', 39.9012, -75.1719),
+    ('PHO', 'Phoenix Suns', 'Footprint Center', 33.4457, -112.0712),
+    ('POR', 'Portland Trail Blazers', 'Moda Center', 45.5316, -122.666),
+    ('SAC', 'Sacramento Kings', 'Golden 1 Center', 38.5802, -121.4991),
+    ('SAS', 'San Antonio Spurs', 'AT&T Center', 29.4271, -98.4375),
+    ('TOR', 'Toronto Raptors', 'Scotiabank Arena', 43.6435, -79.3791),
+    ('UTA', 'Utah Jazz', 'Vivint Arena', 40.7683, -111.9011),
+    ('WAS', 'Washington Wizards', 'Capital One Arena', 38.898, -77.0209),
+]
+
+
+def read_raw(path: str, chunksize: int = None):
+    '''
+    Read the raw export, optionally as an iterator of chunks.
+    '''
+    return pd.read_csv(path, sep=';', index_col=0, chunksize=chunksize)
+
+
+def build_game_dates(path: str, chunksize: int = 50000) -> pd.DataFrame:
+    '''
+    First pass: number the distinct game dates in chronological order.
+    Returns:
+        df_gd (pd.DataFrame): Columns date_id (starting at 1) and game_date.
+    '''
+    dates = set()
+    for chunk in pd.read_csv(path, sep=';', usecols=['GAME DATE'], chunksize=chunksize):
+        dates.update(chunk['GAME DATE'].unique())
+    unique_dates = pd.to_datetime(pd.Series(list(dates)), format=RAW_DATE_FORMAT).sort_values()
+    return pd.DataFrame({'date_id': range(1, len(unique_dates) + 1),
+                         'game_date': unique_dates.to_numpy()})
+
+
+def transform_chunk(raw: pd.DataFrame, df_gd: pd.DataFrame) -> tuple:
+    '''
+    Clean a chunk of the raw export.
+    "ATL vs. DAL" is a home game of ATL, "ATL @ DAL" an away game at DAL. The
+    match_id is the game date without slashes followed by the home team.
+    Args:
+        raw (pd.DataFrame): Rows of raw_data.csv.
+        df_gd (pd.DataFrame): Output of build_game_dates.
+    Returns:
+        (df_mi, df_ms) (tuple): The match_info and match_stats rows of the chunk.
+    '''
+    df = raw[list(RAW_COLUMNS)].rename(columns=RAW_COLUMNS)
+    match_up = df['match_up']
+    is_home = match_up.str.contains(' vs. ', regex=False)
+    unexpected = ~(is_home | match_up.str.contains(' @ ', regex=False))
+    if unexpected.any():
+        raise ValueError(f"Unexpected match up {match_up[unexpected].iloc[0]!r}")
+    df['team_id'] = match_up.str[:3]
+    home = df['team_id'].where(is_home, match_up.str[-3:])
+    df['match_id'] = df['game_date'].str.replace('/', '', regex=False) + home
+    # Look the raw date strings up instead of parsing every row
+    raw_dates = pd.Index(df_gd['game_date'].dt.strftime(RAW_DATE_FORMAT))
+    df['date_id'] = df_gd['date_id'].to_numpy()[raw_dates.get_indexer(df['game_date'])]
+    return df[MATCH_INFO_COLUMNS], df[MATCH_STATS_COLUMNS]
+
+
+def run_pipeline(raw_path: str = './data/raw_data.csv', out_dir: str = './data', chunksize: int = 50000) -> dict:
+    '''
+    Write game_dates.csv, team_info.csv, match_info.csv and match_stats.csv
+    from the raw export.
+    Returns:
+        rows (dict): Number of rows written per file.
+    '''
+    os.makedirs(out_dir, exist_ok=True)
+    df_gd = build_game_dates(raw_path, chunksize)
+    df_gd.to_csv(os.path.join(out_dir, 'game_dates.csv'), sep=';', index=False)
+    df_ti = pd.DataFrame(TEAM_INFO, columns=['team_id', 'team_name', 'arena_name', 'latitude', 'longitude'])
+    df_ti.to_csv(os.path.join(out_dir, 'team_info.csv'), sep=';', index=False)
+
+    rows = {'game_dates': len(df_gd), 'team_info': len(df_ti), 'match_info': 0, 'match_stats': 0}
+    for i, chunk in enumerate(read_raw(raw_path, chunksize)):
+        df_mi, df_ms = transform_chunk(chunk, df_gd)
+        for name, df in (('match_info', df_mi), ('match_stats', df_ms)):
+            df.to_csv(os.path.join(out_dir, f'{name}.csv'), sep=';', index=False,
+                      mode='w' if i == 0 else 'a', header=i == 0)
+            rows[name] += len(df)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--raw', default='./data/raw_data.csv', help='Raw export to transform.')
+    parser.add_argument('--out', default='./data', help='Folder of the output CSV files.')
+    parser.add_argument('--chunksize', type=int, default=50000, help='Raw rows per chunk.')
+    args = parser.parse_args()
+
+    for name, count in run_pipeline(args.raw, args.out, args.chunksize).items():
+        print(f"{name}.csv: {count} rows")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+
+
+def read_only_uri(db_file: str) -> str:
+    '''
+    URI opening a database file read-only. The path is percent-encoded, so
+    file names containing '?', '#' or '%' are not mistaken for URI syntax.
+    '''
+    return f'{Path(db_file).resolve().as_uri()}?mode=ro'
+
+
+class PoolTimeout(Exception):
+    '''Raised when no connection became available within the pool timeout.'''
+
+
+# Connections borrowed from any pool, by thread, so that another thread can
+# interrupt the query a borrower is running (see interrupt_thread)
+_borrowed = {}
+_borrowed_lock = threading.Lock()
+
+
+def interrupt_thread(thread_id: int) -> int:
+    '''
+    Abort the query running on the pooled connections a thread has borrowed:
+    it raises sqlite3.OperationalError('interrupted') in that thread, which
+    then returns the connections. A connection running nothing is left as it is.
+    Args:
+        thread_id (int): threading.get_ident() of the borrowing thread.
+    Returns:
+        interrupted (int): Number of connections interrupted.
+    '''
+    with _borrowed_lock:
+        connections = list(_borrowed.get(thread_id, ()))
+    for conn in connections:
+        conn.interrupt()
+    return len(connections)
+
+
+class ConnectionPool:
+    '''
+    Bounded pool of read-only SQLite connections. A thread borrows a connection
+    for the duration of a `with pool.connection()` block and nested blocks in
+    the same thread reuse it, so no connection is ever used by two threads at
+    once. Ingestion switches the database to WAL mode (see modules.ingest), so
+    it can write while readers keep going.
+    With a MemoryReplica the connections are opened on the in-memory copy of
+    the database instead, and connections to a replaced copy are closed as
+    soon as they are returned.
+    '''
+    def __init__(self, db_file: str, max_size: int = 8, timeout: float = 30.0, mmap_size: int = 256 * 1024 * 1024,
+                 replica=None):
+        self.db_file = db_file
+        self.replica = replica
+        self.max_size = max_size
+        self.timeout = timeout
+        self.mmap_size = mmap_size
+        self._idle = deque()
+        self._size = 0
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._generations = {}
+        self._acquisitions = 0
+        self._waits = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def _generation(self) -> int:
+        return self.replica.generation if self.replica is not None else 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.replica is not None:
+            uri, generation = self.replica.target()
+        else:
+            uri, generation = read_only_uri(self.db_file), 0
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.execute(f'PRAGMA mmap_size = {int(self.mmap_size)}')
+        conn.execute('PRAGMA query_only = ON')
+        with self._cond:
+            self._generations[conn] = generation
+        return conn
+
+    def _is_stale(self, conn: sqlite3.Connection) -> bool:
+        return self._generations.get(conn) != self._generation()
+
+    def _discard(self, conn: sqlite3.Connection):
+        self._generations.pop(conn, None)
+        conn.close()
+
+    def _acquire(self) -> sqlite3.Connection:
+        start = time.perf_counter()
+        deadline = start + self.timeout
+        waited = False
+        with self._cond:
+            while not self._idle and self._size >= self.max_size:
+                waited = True
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    raise PoolTimeout(f'No connection to {self.db_file} available after {self.timeout}s')
+                self._cond.wait(remaining)
+            if self._idle:
+                conn = self._idle.pop()
+                if self._is_stale(conn):
+                    self._discard(conn)
+                    conn = None
+            else:
+                conn = None
+                self._size += 1
+            self._in_use += 1
+            wait = time.perf_counter() - start
+            self._acquisitions += 1
+            self._waits += int(waited)
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._in_use -= 1
+                    self._cond.notify()
+                raise
+        return conn
+
+    def _release(self, conn: sqlite3.Connection):
+        with self._cond:
+            self._in_use -= 1
+            if self._is_stale(conn):
+                self._discard(conn)
+                self._size -= 1
+            else:
+                self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        '''
+        Borrow a read-only connection for the current thread.
+        Yields:
+            conn (sqlite3.Connection): Connection owned by this thread until the block exits.
+        '''
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            yield conn
+            return
+        conn = self._acquire()
+        self._local.conn = conn
+        thread_id = threading.get_ident()
+        with _borrowed_lock:
+            _borrowed.setdefault(thread_id, []).append(conn)
+        try:
+            yield conn
+        finally:
+            with _borrowed_lock:
+                _borrowed[thread_id].remove(conn)
+                if not _borrowed[thread_id]:
+                    del _borrowed[thread_id]
+            self._local.conn = None
+            self._release(conn)
+
+    def close(self):
+        with self._cond:
+            while self._idle:
+                self._discard(self._idle.pop())
+                self._size -= 1
+
+    def stats(self) -> dict:
+        '''
+        Returns:
+            stats (dict): Pool size, connections in use and wait-time metrics in milliseconds.
+        '''
+        with self._cond:
+            return {
+                'size': self._size,
+                'max_size': self.max_size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'acquisitions': self._acquisitions,
+                'waits': self._waits,
+                'total_wait_ms': round(self._total_wait * 1000, 3),
+                'avg_wait_ms': round(self._total_wait * 1000 / self._acquisitions, 3) if self._acquisitions else 0.0,
+                'max_wait_ms': round(self._max_wait * 1000, 3),
+            }
+
+
+@contextmanager
+def borrow(source):
+    '''
+    Yield a connection from either a ConnectionPool or a plain sqlite3.Connection,
+    so callers can be handed either one.
+    '''
+    if isinstance(source, ConnectionPool):
+        with source.connection() as conn:
+            yield conn
+    else:
+        yield source
@@ -0,0 +1,252 @@
+'''
+Elo power ratings of the teams, stored in the database next to the games.
+
+Ratings depend on the order of the games, so they are computed by walking
+the games in (date_id, match_key) order, each game moving the ratings of its
+two teams. The walk is done once: team_ratings keeps every team's current
+rating and its history, as arrays packed into BLOBs (the match_key and the
+rating after each game, 8 bytes per game), and rating_checkpoint records
+how far the walk got. update_ratings, run by database.refresh_derived_tables
+on every preparation and ingestion, walks only the games of the dates after
+the checkpoint. If the games up to the checkpoint changed (same count and
+checksum expected) or the parameters did, the ratings are rebuilt from
+scratch, which gives the same ratings as the incremental updates.
+
+The model is the margin-of-victory Elo of FiveThirtyEight's NBA ratings:
+home court advantage, a multiplier growing with the margin and shrinking with
+the winner's rating edge, and a partial reset towards the mean between
+seasons. The home team is the one whose id follows the date in the match_id.
+'''
+import sqlite3
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class EloParams:
+    # Rating of a new team, and the mean ratings revert to between seasons
+    initial: float = 1500.0
+    # Largest move of a game before the margin-of-victory multiplier
+    k: float = 20.0
+    # Points of rating the home team gets when computing the expected result
+    home_advantage: float = 100.0
+    # Share of its rating a team keeps into the next season
+    season_carry: float = 0.75
+
+
+DEFAULT_ELO = EloParams()
+
+q_create_team_ratings_table = '''
+    CREATE TABLE IF NOT EXISTS team_ratings(
+        team_key INTEGER PRIMARY KEY,
+        rating REAL NOT NULL,
+        season INTEGER,
+        games INTEGER NOT NULL,
+        match_keys BLOB NOT NULL,
+        ratings BLOB NOT NULL
+    );
+'''
+
+q_create_rating_checkpoint_table = '''
+    CREATE TABLE IF NOT EXISTS rating_checkpoint(
+        id INTEGER PRIMARY KEY CHECK (id = 0),
+        params TEXT NOT NULL,
+        last_date_id INTEGER NOT NULL,
+        games INTEGER NOT NULL,
+        checksum INTEGER NOT NULL
+    );
+'''
+
+# Games with both results, in the order they are rated. a_home tells which
+# side played at home.
+q_rated_games = '''
+    SELECT m.match_key, ma.date_id, ma.season, m.team_a, m.team_b, ra.pts, rb.pts,
+    ta.team_id = SUBSTR(ma.match_id, 9, 3) AS a_home
+    FROM matchups m
+    JOIN matches ma ON ma.match_key = m.match_key
+    JOIN match_results ra ON ra.match_key = m.match_key AND ra.team_key = m.team_a
+    JOIN match_results rb ON rb.match_key = m.match_key AND rb.team_key = m.team_b
+    JOIN teams ta ON ta.team_key = m.team_a
+    WHERE ma.date_id > ?
+    ORDER BY ma.date_id, m.match_key
+'''
+
+# Count and checksum of the results of the dates up to a date_id: of every
+# result, rated or not, so that it takes a single join
+q_results_checksum = '''
+    SELECT COUNT(*), COALESCE(SUM(r.match_key * (7 * IFNULL(r.pts, 0) + r.team_key) + IFNULL(ma.season, 0)), 0)
+    FROM match_results r
+    JOIN matches ma ON ma.match_key = r.match_key
+    WHERE ma.date_id <= ?
+'''
+
+_MATCH_KEY = np.dtype('<i4')
+_RATING = np.dtype('<f4')
+
+
+def create_ratings(conn: sqlite3.Connection):
+    '''
+    Create the tables of the ratings if they do not exist yet.
+    Args:
+        conn (sqlite3.Connection): Writable connection to the database.
+    '''
+    conn.execute(q_create_team_ratings_table)
+    conn.execute(q_create_rating_checkpoint_table)
+
+
+class _Team:
+    __slots__ = ('rating', 'season', 'match_keys', 'ratings')
+
+    def __init__(self, rating: float, season):
+        self.rating = rating
+        self.season = season
+        self.match_keys = []
+        self.ratings = []
+
+
+def rate_games(games, teams: dict, params: EloParams = DEFAULT_ELO) -> dict:
+    '''
+    Walk games in order, updating the ratings of their teams.
+    Args:
+        games: Rows of q_rated_games.
+        teams (dict): team_key -> _Team, updated in place; teams not in it start at params.initial.
+        params (EloParams): Model parameters.
+    Returns:
+        teams (dict): The same dict.
+    '''
+    for match_key, _, season, team_a, team_b, pts_a, pts_b, a_home in games:
+        sides = []
+        for team_key in (team_a, team_b):
+            team = teams.get(team_key)
+            if team is None:
+                team = teams[team_key] = _Team(params.initial, season)
+            elif team.season != season:
+                team.rating = params.season_carry * team.rating + (1 - params.season_carry) * params.initial
+                team.season = season
+            sides.append(team)
+        a, b = sides
+        # Rating edge of team a, with the home court
+        edge = a.rating - b.rating + (params.home_advantage if a_home else -params.home_advantage)
+        expected_a = 1 / (1 + 10 ** (-edge / 400))
+        margin = (pts_a or 0) - (pts_b or 0)
+        score_a = 1.0 if margin > 0 else 0.0 if margin < 0 else 0.5
+        winner_edge = edge if margin >= 0 else -edge
+        multiplier = (abs(margin) + 3) ** 0.8 / (7.5 + 0.006 * winner_edge)
+        shift = params.k * multiplier * (score_a - expected_a)
+        a.rating += shift
+        b.rating -= shift
+        for team in sides:
+            team.match_keys.append(match_key)
+            team.ratings.append(team.rating)
+    return teams
+
+
+def read_ratings(conn: sqlite3.Connection) -> dict:
+    '''
+    Returns:
+        history (dict): team_key -> (match_keys, ratings, rating, season): the games of
+        the team in order and its rating after each (np.ndarray), its current
+        rating (float64) and the season of its last game.
+    '''
+    return {team_key: (np.frombuffer(match_keys, dtype=_MATCH_KEY), np.frombuffer(ratings, dtype=_RATING),
+                       rating, season)
+            for team_key, rating, season, match_keys, ratings in
+            conn.execute('SELECT team_key, rating, season, match_keys, ratings FROM team_ratings')}
+
+
+def _write_teams(conn: sqlite3.Connection, teams: dict, history: dict):
+    '''
+    Append the new games of the teams to their stored history.
+    '''
+    rows = []
+    for team_key, team in teams.items():
+        match_keys = np.asarray(team.match_keys, dtype=_MATCH_KEY)
+        ratings = np.asarray(team.ratings, dtype=_RATING)
+        if team_key in history:
+            match_keys = np.concatenate([history[team_key][0], match_keys])
+            ratings = np.concatenate([history[team_key][1], ratings])
+        rows.append((team_key, team.rating, team.season, len(match_keys), match_keys.tobytes(), ratings.tobytes()))
+    conn.executemany('INSERT OR REPLACE INTO team_ratings VALUES (?, ?, ?, ?, ?, ?)', rows)
+
+
+def rebuild_ratings(conn: sqlite3.Connection, params: EloParams = DEFAULT_ELO) -> int:
+    '''
+    Rate every game from scratch. Runs inside the caller's transaction.
+    Args:
+        conn (sqlite3.Connection): Writable connection to the database.
+        params (EloParams): Model parameters.
+    Returns:
+        games (int): Number of games rated.
+    '''
+    create_ratings(conn)
+    conn.execute('DELETE FROM team_ratings')
+    conn.execute('DELETE FROM rating_checkpoint')
+    return _rate_after(conn, -1, {}, {}, params)
+
+
+def _rate_after(conn, last_date_id: int, teams: dict, history: dict, params: EloParams) -> int:
+    games = conn.execute(q_rated_games, (last_date_id,)).fetchall()
+    rate_games(games, teams, params)
+    if games:
+        last_date_id = games[-1][1]
+    _write_teams(conn, {key: team for key, team in teams.items() if team.match_keys}, history)
+    count, checksum = conn.execute(q_results_checksum, (last_date_id,)).fetchone()
+    conn.execute('INSERT OR REPLACE INTO rating_checkpoint VALUES (0, ?, ?, ?, ?)',
+                 (repr(params), last_date_id, count, checksum))
+    return len(games)
+
+
+def update_ratings(conn: sqlite3.Connection, params: EloParams = DEFAULT_ELO) -> int:
+    '''
+    Rate the games of the dates after the checkpoint, or rebuild the ratings
+    when the rated games or the parameters changed since. Runs inside the
+    caller's transaction, after the matchups are refreshed.
+    Args:
+        conn (sqlite3.Connection): Writable connection to the database.
+        params (EloParams): Model parameters.
+    Returns:
+        games (int): Number of games rated.
+    '''
+    create_ratings(conn)
+    checkpoint = conn.execute('SELECT params, last_date_id, games, checksum FROM rating_checkpoint').fetchone()
+    if checkpoint is None or checkpoint[0] != repr(params):
+        return rebuild_ratings(conn, params)
+    _, last_date_id, count, checksum = checkpoint
+    if conn.execute(q_results_checksum, (last_date_id,)).fetchone() != (count, checksum):
+        return rebuild_ratings(conn, params)
+    if conn.execute('SELECT 1 FROM matches WHERE date_id > ? LIMIT 1', (last_date_id,)).fetchone() is None:
+        # Nothing new: leave the tables, and so the file, untouched
+        return 0
+    history = read_ratings(conn)
+    teams = {}
+    for team_key, (_, _, rating, season) in history.items():
+        teams[team_key] = _Team(rating, season)
+    return _rate_after(conn, last_date_id, teams, history, params)
+
+
+def check_ratings(conn: sqlite3.Connection, params: EloParams = DEFAULT_ELO) -> list:
+    '''
+    Compare the stored ratings with ratings computed from scratch, in memory.
+    Args:
+        conn (sqlite3.Connection): Connection to the database.
+        params (EloParams): Model parameters.
+    Returns:
+        differences (list): (team_key, column, stored, rebuilt) tuples, empty if consistent.
+    '''
+    rebuilt = rate_games(conn.execute(q_rated_games, (-1,)).fetchall(), {}, params)
+    stored = read_ratings(conn)
+    differences = []
+    for team_key in sorted(stored.keys() | rebuilt.keys()):
+        if team_key not in stored or team_key not in rebuilt:
+            differences.append((team_key, 'team', team_key in stored, team_key in rebuilt))
+            continue
+        match_keys, ratings, rating, _ = stored[team_key]
+        team = rebuilt[team_key]
+        if rating != team.rating:
+            differences.append((team_key, 'rating', rating, team.rating))
+        if not np.array_equal(match_keys, np.asarray(team.match_keys, dtype=_MATCH_KEY)):
+            differences.append((team_key, 'match_keys', len(match_keys), len(team.match_keys)))
+        elif not np.array_equal(ratings, np.asarray(team.ratings, dtype=_RATING)):
+            differences.append((team_key, 'ratings', len(ratings), len(team.ratings)))
+    return differences
@@ -0,0 +1,105 @@
+import itertools
+import sqlite3
+import threading
+
+from modules.pool import read_only_uri
+
+_replica_ids = itertools.count(1)
+
+
+class MemoryReplica:
+    '''
+    Copy of an SQLite database file held in a shared-cache in-memory database.
+    The copy is made with the online backup API, so it is consistent even while
+    the file is being written to. A background watcher polls the data_version of
+    the source and, when it changes, loads a fresh copy under a new name and
+    swaps it in. Readers of the previous copy finish their queries undisturbed;
+    a ConnectionPool built with `replica=` opens new connections on the new copy.
+    '''
+    def __init__(self, db_file: str, poll_interval: float = 5.0):
+        '''
+        Args:
+            db_file (str): Path to the source database file.
+            poll_interval (float): Seconds between two checks of the source.
+        '''
+        self.db_file = db_file
+        self.poll_interval = poll_interval
+        self.generation = 0
+        self.uri = None
+        self.source_version = None
+        self._id = next(_replica_ids)
+        self._keeper = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+        # Dedicated connection whose data_version changes when any other
+        # connection commits to the source file.
+        self._source = sqlite3.connect(read_only_uri(db_file), uri=True, check_same_thread=False)
+
+    def _data_version(self) -> int:
+        return self._source.execute('PRAGMA data_version').fetchone()[0]
+
+    def load(self) -> int:
+        '''
+        Copy the source database into a new in-memory database and make it the
+        current replica.
+        Returns:
+            generation (int): Generation number of the new replica.
+        '''
+        generation = self.generation + 1
+        uri = f'file:nba_replica_{self._id}_{generation}?mode=memory&cache=shared'
+        # The keeper connection holds the in-memory database alive
+        keeper = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        version = self._data_version()
+        self._source.backup(keeper)
+        with self._lock:
+            previous = self._keeper
+            self._keeper, self.uri, self.source_version = keeper, uri, version
+            self.generation = generation
+        # Open readers keep the previous copy alive until they are closed
+        if previous is not None:
+            previous.close()
+        return generation
+
+    def target(self) -> tuple:
+        '''
+        Returns:
+            (uri, generation) (tuple): URI of the current replica and its generation.
+        '''
+        with self._lock:
+            return self.uri, self.generation
+
+    def refresh(self) -> bool:
+        '''
+        Reload the replica if the source changed since the last load.
+        Returns:
+            reloaded (bool): True if a new replica was swapped in.
+        '''
+        if self._data_version() == self.source_version:
+            return False
+        self.load()
+        return True
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except sqlite3.Error as e:
+                print(f"Refreshing the replica of {self.db_file} failed: {e}")
+
+    def start(self):
+        '''
+        Load the replica if needed and start the background watcher.
+        '''
+        if self.uri is None:
+            self.load()
+        if self._watcher is None:
+            self._watcher = threading.Thread(target=self._watch, name='replica-watcher', daemon=True)
+            self._watcher.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
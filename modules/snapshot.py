@@ -0,0 +1,254 @@
+import argparse
+import json
+import os
+import sqlite3
+
+import pandas as pd
+
+from modules.cache import RESULT_CACHE, ResultCache, database_fingerprint
+from modules.pool import borrow
+
+SNAPSHOT_DIR = './data/snapshot'
+SNAPSHOT_TABLES = ['match_stats', 'match_info', 'team_info', 'game_dates']
+# Checksum of the data the snapshot was written from, see data_checksum
+SOURCE_FILE = 'source.json'
+
+_BOX_SCORE_COUNTS = ['fgm', 'fga', 'tpm', 'tpa', 'ftm', 'fta', 'oreb', 'dreb', 'reb', 'ast', 'tov', 'stl', 'blk', 'pf']
+_PRIMES = [2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43]
+
+# Row count and weighted sum of every base table behind SNAPSHOT_TABLES, the
+# rows weighted by their keys so that values moved between rows count too.
+# The percentages of the box scores follow from the counts, they are left out.
+q_data_checksum = f'''
+    SELECT
+    (SELECT COUNT(*) FROM game_dates),
+    (SELECT SUM(date_id * CAST(REPLACE(game_date, '-', '') AS INTEGER)) FROM game_dates),
+    (SELECT COUNT(*) FROM team_details),
+    (SELECT SUM(team_key * (LENGTH(team_name) + 3 * LENGTH(arena_name)
+                            + 5 * CAST(latitude * 1e4 AS INTEGER) + 7 * CAST(longitude * 1e4 AS INTEGER)))
+     FROM team_details),
+    (SELECT COUNT(*) FROM matches),
+    (SELECT SUM(match_key * (date_id + 7 * LENGTH(match_id))) FROM matches),
+    (SELECT COUNT(*) FROM match_results),
+    (SELECT SUM((match_key % 9973 + 1) * (team_key + 1) * (2 * pts + 3 * min + 5 * (result = 'W')))
+     FROM match_results),
+    (SELECT COUNT(*) FROM box_scores),
+    (SELECT SUM((match_key % 9973 + 1) * (team_key + 1)
+                * ({' + '.join(f'{p} * {c}' for p, c in zip(_PRIMES, _BOX_SCORE_COUNTS))})) FROM box_scores)
+'''
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.feather
+    except ImportError as e:
+        raise ImportError("The columnar snapshot needs pyarrow, install it with `pip install pyarrow`.") from e
+    return pyarrow
+
+
+def write_snapshot(conn: sqlite3.Connection, directory: str = SNAPSHOT_DIR) -> dict:
+    '''
+    Write every table of the database as an uncompressed Arrow IPC (Feather v2)
+    file, the layout that can be memory-mapped and read without copying.
+    Each file is written next to the old one and then moved in place, so
+    readers never see a half-written snapshot. The data_checksum of the rows
+    is recorded with them, see snapshot_is_current.
+    Args:
+        conn (sqlite3.Connection): Connection to the database.
+        directory (str): Folder of the snapshot.
+    Returns:
+        rows (dict): Number of rows written per table.
+    '''
+    pa = _require_pyarrow()
+    os.makedirs(directory, exist_ok=True)
+    # Read in one transaction, so the checksum is the one of the rows written
+    own_transaction = not conn.in_transaction
+    if own_transaction:
+        conn.execute('BEGIN')
+    try:
+        rows = _write_tables(pa, conn, directory)
+        checksum = data_checksum(conn)
+    finally:
+        if own_transaction:
+            conn.commit()
+    path = os.path.join(directory, SOURCE_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump({'checksum': checksum}, f)
+    os.replace(path + '.tmp', path)
+    return rows
+
+
+def _write_tables(pa, conn: sqlite3.Connection, directory: str) -> dict:
+    rows = {}
+    for table in SNAPSHOT_TABLES:
+        df = pd.read_sql(f'SELECT * FROM {table}', conn)
+        path = os.path.join(directory, f'{table}.arrow')
+        pa.feather.write_feather(pa.Table.from_pandas(df, preserve_index=False), path + '.tmp',
+                                 compression='uncompressed')
+        os.replace(path + '.tmp', path)
+        rows[table] = len(df)
+    return rows
+
+
+def data_checksum(conn: sqlite3.Connection) -> list:
+    '''
+    Returns:
+        checksum (list): Row counts and weighted sums of the tables of the
+        snapshot, equal for a snapshot and the database it was written from.
+    '''
+    return list(conn.execute(q_data_checksum).fetchone())
+
+
+def snapshot_fingerprint(directory: str = SNAPSHOT_DIR) -> tuple:
+    '''
+    Returns:
+        fingerprint (tuple): mtime and size of every snapshot file, changes when it is rewritten.
+    '''
+    fingerprint = []
+    for file in [f'{table}.arrow' for table in SNAPSHOT_TABLES] + [SOURCE_FILE]:
+        try:
+            stat = os.stat(os.path.join(directory, file))
+        except FileNotFoundError:
+            # Snapshots written before the checksum was recorded
+            fingerprint += [None, 0]
+            continue
+        fingerprint += [stat.st_mtime_ns, stat.st_size]
+    return tuple(fingerprint)
+
+
+def load_snapshot(directory: str = SNAPSHOT_DIR) -> 'Snapshot':
+    '''
+    Memory-map the snapshot files. Numeric columns of the returned frames point
+    straight into the mapped files, only the text columns are materialized.
+    Args:
+        directory (str): Folder of the snapshot.
+    Returns:
+        snapshot (Snapshot): Frames of every table.
+    '''
+    pa = _require_pyarrow()
+    fingerprint = snapshot_fingerprint(directory)
+    tables = {}
+    for table in SNAPSHOT_TABLES:
+        source = pa.memory_map(os.path.join(directory, f'{table}.arrow'), 'r')
+        arrow_table = pa.ipc.open_file(source).read_all()
+        tables[table] = arrow_table.to_pandas(split_blocks=True)
+    checksum = None
+    if os.path.exists(os.path.join(directory, SOURCE_FILE)):
+        with open(os.path.join(directory, SOURCE_FILE)) as f:
+            checksum = json.load(f)['checksum']
+    return Snapshot(tables, fingerprint, checksum)
+
+
+def snapshot_is_current(snapshot: 'Snapshot', conn, cache: ResultCache = RESULT_CACHE) -> bool:
+    '''
+    Tell whether a snapshot still holds the data of the database. The sections
+    of the app reading SQL would disagree with a stale one, so it must not be
+    used. The checksum of the database is cached until its files change.
+    Args:
+        snapshot (Snapshot): Loaded snapshot.
+        conn (sqlite3.Connection | ConnectionPool): Connection or pool to the database.
+        cache (ResultCache): Cache of the checksum, None to compute it every time.
+    Returns:
+        current (bool): False if the data changed since the snapshot was written.
+    '''
+    key = ('snapshot.data_checksum', database_fingerprint(conn))
+    found, checksum = cache.get(key) if cache is not None else (False, None)
+    if not found:
+        with borrow(conn) as c:
+            checksum = data_checksum(c)
+        if cache is not None:
+            cache.set(key, checksum)
+    return snapshot.checksum == checksum
+
+
+class Snapshot:
+    '''
+    In-process columnar copy of the database. The methods mirror the
+    aggregates of Calculation and return frames of the same shape, so a
+    Calculation built with `snapshot=` can answer from here instead of SQL.
+    '''
+    def __init__(self, tables: dict, fingerprint: tuple = None, checksum: list = None):
+        self.tables = tables
+        self.fingerprint = fingerprint
+        # data_checksum of the database the snapshot was written from
+        self.checksum = checksum
+
+    def __getitem__(self, table: str) -> pd.DataFrame:
+        return self.tables[table]
+
+    def _team_games(self) -> pd.DataFrame:
+        match_info = self['match_info'][['match_id', 'team_id', 'pts']]
+        return self['match_stats'].merge(match_info, on=['match_id', 'team_id'])
+
+    def team_aggregates(self) -> pd.DataFrame:
+        games = self._team_games().groupby('team_id')
+        df = pd.DataFrame({
+            'ppg': games['pts'].mean(),
+            'astpg': games['ast'].mean(),
+            'rebpg': games['reb'].mean(),
+            'stlpg': games['stl'].mean(),
+            'tovpg': games['tov'].mean(),
+            'blkpg': games['blk'].mean(),
+            'pfpg': games['pf'].mean(),
+            'fgp': 100.0 * games['fgm'].sum() / games['fga'].sum(),
+            'tpp': 100.0 * games['tpm'].sum() / games['tpa'].sum(),
+            'ftp': 100.0 * games['ftm'].sum() / games['fta'].sum(),
+        }).round(2)
+        df['games'] = games.size()
+        teams = self['team_info'][['team_id', 'team_name']]
+        df = teams.merge(df, left_on='team_id', right_index=True)
+        return df.sort_values('team_id').reset_index(drop=True)
+
+    def mean_values(self) -> pd.DataFrame:
+        games = self._team_games()
+        means = games[['pts', 'ast', 'reb', 'stl', 'blk', 'tov', 'pf']].mean().round(2)
+        return pd.DataFrame([means.values], columns=[f'avg_{column}' for column in means.index])
+
+    def total_stats(self) -> tuple:
+        match_info = self['match_info']
+        df_count = pd.DataFrame({'tot_matches': [match_info['match_id'].nunique()]})
+        df_dates = pd.DataFrame({'tot_dates': [self['game_dates']['date_id'].nunique()]})
+        df_min = pd.DataFrame({'tot_minutes': [match_info[['match_id', 'min']].drop_duplicates()['min'].sum()]})
+        df_points = pd.DataFrame({'tot_pts': [match_info['pts'].sum()]})
+        df_fgm = pd.DataFrame({'tot_fgm': [self['match_stats']['fgm'].sum()]})
+        return df_count, df_dates, df_min, df_points, df_fgm
+
+    def win_loss(self) -> pd.DataFrame:
+        df = self['match_info'][['team_id', 'result']].merge(self['team_info'][['team_id', 'team_name']], on='team_id')
+        df = df.assign(wins=df['result'].eq('W').astype('int64'), losses=df['result'].eq('L').astype('int64'))
+        df = df.groupby('team_name', as_index=False)[['wins', 'losses']].sum()
+        return df.sort_values(['wins', 'team_name'], ascending=[False, True]).reset_index(drop=True)
+
+    def shooting_points(self) -> pd.DataFrame:
+        return self['match_stats'][['fga', 'fgp']].copy()
+
+    def shooting_bins(self, fga_step: int, fgp_step: float) -> pd.DataFrame:
+        match_stats = self['match_stats']
+        df = pd.DataFrame({'fga': match_stats['fga'] // fga_step * fga_step,
+                           'fgp': (match_stats['fgp'] // fgp_step) * fgp_step})
+        return df.groupby(['fga', 'fgp'], as_index=False).size().rename(columns={'size': 'games'})
+
+    def team_box_scores(self) -> pd.DataFrame:
+        df = self._team_games().merge(self['team_info'][['team_id', 'team_name']], on='team_id', how='left')
+        return df.assign(team_name=df['team_name'].fillna(df['team_id']))
+
+    def teams(self) -> pd.DataFrame:
+        return self['team_info'][['team_name', 'team_id']].copy()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write the columnar snapshot of an NBA database.')
+    parser.add_argument('--db', default='nba.db', help='Path to the SQLite database file.')
+    parser.add_argument('--out', default=SNAPSHOT_DIR, help='Folder of the snapshot.')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    rows = write_snapshot(conn, args.out)
+    conn.close()
+    for table, count in rows.items():
+        print(f"{table}: {count} rows written to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
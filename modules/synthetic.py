@@ -0,0 +1,277 @@
+'''
+Synthetic NBA databases with the schema of nba.db, to benchmark at sizes the
+scraped data does not reach.
+
+    python -m modules.synthetic --scale 10 [--out ./data/synthetic/nba_10x.db] [--source nba.db] [--seed 0]
+
+A database at scale N holds N seasons ending with the season of the source,
+each with as many games on the same calendar. The teams are the team_info
+rows of the source. Box scores are sampled from a model fitted on the source:
+every season each team gets its own level of every stat, drawn around the
+league average with the spread observed between teams, and its games vary
+around that level with the spread observed within a team. Makes, rebounds
+and assists are binomial draws from the attempts and misses they come from,
+so fgm <= fga, reb = oreb + dreb and pts = 2 fgm + tpm + ftm hold as in the
+real box scores.
+'''
+import argparse
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+import modules.database as db
+from modules.pool import read_only_uri
+
+SYNTHETIC_DIR = './data/synthetic'
+
+# Stats drawn from a normal distribution around the team's level
+VOLUME_STATS = ['fga', 'tpa', 'fta', 'tov', 'stl', 'blk', 'pf']
+
+# Rates of the binomial draws: name -> (numerator, denominator) in the fitting frame
+RATES = {
+    'fg': ('fgm', 'fga'),
+    'tp': ('tpm', 'tpa'),
+    'ft': ('ftm', 'fta'),
+    'oreb': ('oreb', 'fg_miss'),
+    'dreb': ('dreb', 'opp_rebounds'),
+    'ast': ('ast', 'fgm'),
+}
+
+# Minutes of a game decided in regulation and in overtime
+REGULATION_MIN = 48
+OVERTIME_MIN = 53
+
+
+def fit_model(conn: sqlite3.Connection) -> dict:
+    '''
+    Estimate the distributions the box scores are sampled from.
+    Args:
+        conn (sqlite3.Connection): Source database.
+    Returns:
+        model (dict): 'volume': stat -> (league mean, spread between teams,
+        spread within a team); 'rates': rate -> (league rate, spread between teams).
+    '''
+    df = pd.read_sql('''
+        SELECT match_id, team_id, fgm, fga, tpm, tpa, ftm, fta, oreb, dreb, ast, tov, stl, blk, pf
+        FROM match_stats
+    ''', conn)
+    opponent = df[['match_id', 'team_id', 'fga', 'fgm', 'oreb']]
+    df = df.merge(opponent, on='match_id', suffixes=('', '_opp'))
+    df = df[df['team_id'] != df['team_id_opp']]
+    df = df.assign(fg_miss=df['fga'] - df['fgm'],
+                   opp_rebounds=df['fga_opp'] - df['fgm_opp'] - df['oreb_opp'])
+    teams = df.groupby('team_id')
+
+    volume = {}
+    for stat in VOLUME_STATS:
+        team_means = teams[stat].mean()
+        volume[stat] = (team_means.mean(), team_means.std(), np.sqrt(teams[stat].var().mean()))
+    rates = {}
+    for name, (numerator, denominator) in RATES.items():
+        sums = teams[[numerator, denominator]].sum()
+        rates[name] = (df[numerator].sum() / df[denominator].sum(),
+                       (sums[numerator] / sums[denominator]).std())
+    return {'volume': volume, 'rates': rates}
+
+
+def season_calendar(conn: sqlite3.Connection) -> tuple:
+    '''
+    Returns:
+        season (int), calendar (pd.DataFrame): The season of the source and its
+        game dates with the number of games played on each.
+    '''
+    calendar = pd.read_sql('''
+        SELECT g.game_date, COUNT(*) AS games, MIN(m.season) AS season
+        FROM matches m
+        JOIN game_dates g ON g.date_id = m.date_id
+        GROUP BY g.game_date
+        ORDER BY g.game_date
+    ''', conn)
+    season = int(calendar['season'].mode()[0])
+    calendar = calendar[calendar['season'] == season]
+    return season, calendar.assign(game_date=pd.to_datetime(calendar['game_date']))[['game_date', 'games']]
+
+
+def _draw_box_scores(rng: np.random.Generator, model: dict, levels: dict, teams: np.ndarray) -> dict:
+    '''
+    Sample one side of every game, the defensive rebounds excepted.
+    '''
+    def volume(stat, low=0, high=None):
+        _, _, within = model['volume'][stat]
+        values = np.rint(rng.normal(levels[stat][teams], within))
+        return np.clip(values, low, high).astype(np.int64)
+
+    def binomial(attempts, rate):
+        return rng.binomial(attempts, levels[rate][teams])
+
+    side = {'fga': volume('fga', low=1)}
+    side['tpa'] = np.minimum(volume('tpa'), side['fga'])
+    side['fta'] = volume('fta')
+    side['fgm'] = binomial(side['fga'], 'fg')
+    side['tpm'] = np.minimum(binomial(side['tpa'], 'tp'), side['fgm'])
+    side['ftm'] = binomial(side['fta'], 'ft')
+    side['oreb'] = binomial(side['fga'] - side['fgm'], 'oreb')
+    side['ast'] = binomial(side['fgm'], 'ast')
+    for stat in ['tov', 'stl', 'blk', 'pf']:
+        side[stat] = volume(stat)
+    return side
+
+
+def _percentage(made: np.ndarray, attempted: np.ndarray) -> np.ndarray:
+    return np.round(np.divide(100 * made, attempted, out=np.zeros(len(made)), where=attempted > 0), 1)
+
+
+def generate_season(rng: np.random.Generator, model: dict, calendar: pd.DataFrame, team_count: int) -> dict:
+    '''
+    Sample the games of one season.
+    Args:
+        rng (np.random.Generator): Source of randomness.
+        model (dict): Output of fit_model.
+        calendar (pd.DataFrame): Game dates of the season and number of games on each.
+        team_count (int): Number of teams, identified by their position.
+    Returns:
+        season (dict): game_date, home and away (team positions) per game, and
+        'sides': {'home': box scores, 'away': box scores} as dicts of arrays.
+    '''
+    games_per_date = calendar['games'].to_numpy()
+    # Every date pairs up teams of a random permutation, nobody plays twice a day
+    permutations = rng.random((len(calendar), team_count)).argsort(axis=1)
+    home = np.concatenate([p[0:2 * n:2] for p, n in zip(permutations, games_per_date)])
+    away = np.concatenate([p[1:2 * n:2] for p, n in zip(permutations, games_per_date)])
+
+    levels = {stat: rng.normal(mean, between, team_count) for stat, (mean, between, _) in model['volume'].items()}
+    levels.update({name: np.clip(rng.normal(rate, between, team_count), 0.01, 0.99)
+                   for name, (rate, between) in model['rates'].items()})
+    sides = {'home': _draw_box_scores(rng, model, levels, home), 'away': _draw_box_scores(rng, model, levels, away)}
+    for side, other, teams in (('home', 'away', home), ('away', 'home', away)):
+        opponent = sides[other]
+        rebounds = np.maximum(opponent['fga'] - opponent['fgm'] - opponent['oreb'], 0)
+        sides[side]['dreb'] = rng.binomial(rebounds, levels['dreb'][teams])
+
+    # A tie goes to overtime, settled here by one more free throw for a random side
+    pts = {side: 2 * s['fgm'] + s['tpm'] + s['ftm'] for side, s in sides.items()}
+    tie = pts['home'] == pts['away']
+    home_wins_tie = tie & (rng.random(len(tie)) < 0.5)
+    for side, extra in (('home', home_wins_tie), ('away', tie & ~home_wins_tie)):
+        sides[side]['ftm'] = sides[side]['ftm'] + extra
+        sides[side]['fta'] = sides[side]['fta'] + extra
+    for side, s in sides.items():
+        s['pts'] = 2 * s['fgm'] + s['tpm'] + s['ftm']
+        s['reb'] = s['oreb'] + s['dreb']
+        s['fgp'] = _percentage(s['fgm'], s['fga'])
+        s['tpp'] = _percentage(s['tpm'], s['tpa'])
+        s['ftp'] = _percentage(s['ftm'], s['fta'])
+        s['min'] = np.where(tie, OVERTIME_MIN, REGULATION_MIN)
+    for side, other in (('home', 'away'), ('away', 'home')):
+        sides[side]['result'] = np.where(sides[side]['pts'] > sides[other]['pts'], 'W', 'L')
+    return {'game_date': np.repeat(calendar['game_date'].to_numpy(), games_per_date),
+            'home': home, 'away': away, 'sides': sides}
+
+
+def _create_base_tables(conn: sqlite3.Connection):
+    for query in (db.q_create_gamedates_table, db.q_create_teams_table, db.q_create_team_details_table,
+                  db.q_create_matches_table, db.q_create_match_results_table, db.q_create_box_scores_table):
+        conn.execute(query)
+
+
+def write_synthetic_database(target: str, scale: int, source: str = 'nba.db', seed: int = 0) -> dict:
+    '''
+    Write a synthetic database of `scale` seasons. The rows go straight into
+    the base tables; the views, triggers, totals and matchups index are then
+    created by database.prepare_database, as for a real database.
+    Args:
+        target (str): Path of the database to write, replaced if it exists.
+        scale (int): Number of seasons, each the size of the source season.
+        source (str): Prepared database the model, the calendar and the teams come from, only read.
+        seed (int): Seed of the random generator; the same seed gives the same database.
+    Returns:
+        rows (dict): Number of rows written per table.
+    '''
+    source_conn = sqlite3.connect(read_only_uri(source), uri=True)
+    try:
+        db.check_schema(source_conn)
+        model = fit_model(source_conn)
+        last_season, calendar = season_calendar(source_conn)
+        teams = pd.read_sql('SELECT team_id, team_name, arena_name, latitude, longitude FROM team_info', source_conn)
+    finally:
+        source_conn.close()
+
+    os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(target + suffix):
+            os.remove(target + suffix)
+    rng = np.random.default_rng(seed)
+    team_ids = teams['team_id'].to_numpy()
+    conn = sqlite3.connect(target)
+    try:
+        # Nothing to recover if the process dies while writing a new file
+        conn.execute('PRAGMA journal_mode=OFF')
+        conn.execute('PRAGMA synchronous=OFF')
+        _create_base_tables(conn)
+        conn.executemany('INSERT INTO teams(team_key, team_id) VALUES(?, ?)',
+                         enumerate(team_ids.tolist(), start=1))
+        conn.executemany('INSERT INTO team_details VALUES(?, ?, ?, ?, ?)',
+                         [(key, *row) for key, row in enumerate(
+                             teams[['team_name', 'arena_name', 'latitude', 'longitude']].itertuples(index=False), start=1)])
+        rows = {'game_dates': 0, 'matches': 0, 'match_results': 0, 'box_scores': 0}
+        for season in range(last_season - scale + 1, last_season + 1):
+            offset = pd.DateOffset(years=season - last_season)
+            season_calendar_ = calendar.assign(game_date=calendar['game_date'] + offset)
+            games = generate_season(rng, model, season_calendar_, len(teams))
+            n = len(games['home'])
+
+            dates = season_calendar_['game_date'].dt.strftime('%Y-%m-%d').tolist()
+            first_date_id = rows['game_dates'] + 1
+            conn.executemany('INSERT INTO game_dates(date_id, game_date) VALUES(?, ?)',
+                             enumerate(dates, start=first_date_id))
+            date_ids = np.repeat(np.arange(first_date_id, first_date_id + len(dates)),
+                                 season_calendar_['games'].to_numpy())
+            match_keys = np.arange(rows['matches'] + 1, rows['matches'] + n + 1)
+            match_ids = pd.Series(games['game_date']).dt.strftime('%m%d%Y').to_numpy() + team_ids[games['home']]
+            conn.executemany('INSERT INTO matches(match_key, match_id, date_id, season) VALUES(?, ?, ?, ?)',
+                             zip(match_keys.tolist(), match_ids.tolist(), date_ids.tolist(), [season] * n))
+            for side in ('home', 'away'):
+                s = games['sides'][side]
+                team_keys = (games[side] + 1).tolist()
+                conn.executemany('INSERT INTO match_results VALUES(?, ?, ?, ?, ?)',
+                                 zip(match_keys.tolist(), team_keys, s['result'].tolist(), s['min'].tolist(),
+                                     s['pts'].tolist()))
+                conn.executemany(f"INSERT INTO box_scores VALUES({', '.join('?' * (2 + len(db.BOX_SCORE_COLUMNS)))})",
+                                 zip(match_keys.tolist(), team_keys, *(s[c].tolist() for c in db.BOX_SCORE_COLUMNS)))
+            rows['game_dates'] += len(dates)
+            rows['matches'] += n
+            rows['match_results'] += 2 * n
+            rows['box_scores'] += 2 * n
+        conn.commit()
+        db.prepare_database(conn)
+    finally:
+        conn.close()
+    return rows
+
+
+def synthetic_path(scale: int, seed: int = 0, directory: str = SYNTHETIC_DIR) -> str:
+    return os.path.join(directory, f'nba_{scale}x_seed{seed}.db')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=int, nargs='+', default=[1, 10, 100],
+                        help='Number of seasons of each database to write.')
+    parser.add_argument('--source', default='nba.db', help='Database the model and the teams come from.')
+    parser.add_argument('--out', help='Path of the database, with a single scale. '
+                                      f'Default: {SYNTHETIC_DIR}/nba_<scale>x_seed<seed>.db')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    if args.out and len(args.scale) > 1:
+        parser.error('--out needs a single --scale')
+
+    for scale in args.scale:
+        target = args.out or synthetic_path(scale, args.seed)
+        rows = write_synthetic_database(target, scale, args.source, args.seed)
+        print(f"{target}: {rows['matches']} matches, {rows['box_scores']} box scores")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+import pandas as pd
+import streamlit as st
+
+import modules.helper_functions as hlp
+
+# Teams drawn when the section opens: the best records
+FORM_DEFAULT_TEAMS = 3
+
+
+@st.fragment
+def team_form(viz: hlp.Visualisation, form: pd.DataFrame, teams: pd.DataFrame, win_loss: pd.DataFrame):
+    '''
+    Team Form section of the dashboard: a season, a stat and some teams, and
+    the chart of their rolling and exponentially weighted means over the season.
+    It runs as a Streamlit fragment, so interacting with its widgets reruns
+    only this function and not the whole page.
+    Args:
+        viz (Visualisation): Builds the form chart.
+        form (pd.DataFrame): As returned by Calculation.get_team_form.
+        teams (pd.DataFrame): Columns team_id and team_name, as returned by Calculation.get_teams.
+        win_loss (pd.DataFrame): As returned by Calculation.get_win_loss, best record first.
+    '''
+    teams_dict = teams.set_index('team_id')['team_name'].to_dict()
+    seasons = sorted(form['season'].unique().tolist(), reverse=True)
+    stats = list(hlp.FORM_LABELS)
+
+    column1, column2, column3 = st.columns([1, 1, 3])
+    with column1:
+        season = st.selectbox('Season', seasons)
+    with column2:
+        stat = st.selectbox('Stat', stats, format_func=hlp.FORM_LABELS.get)
+    with column3:
+        default = [name for name in win_loss['team_name'] if name in teams_dict.values()]
+        selected = st.multiselect('Teams', list(teams_dict.values()), default=default[:FORM_DEFAULT_TEAMS])
+    if not selected:
+        st.warning('No team has been selected. Select one or more teams to see their form.', icon="⚠️")
+        return
+
+    team_ids = {name: team_id for team_id, name in teams_dict.items()}
+    team_names = {team_ids[name]: name for name in selected}
+    season_form = form[(form['season'] == season) & form['team_id'].isin(list(team_names))]
+    st.plotly_chart(viz.create_form_chart(season_form, stat, team_names), width='stretch')
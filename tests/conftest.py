@@ -0,0 +1,43 @@
+import shutil
+import sqlite3
+
+import pytest
+
+import modules.database as db
+
+
+@pytest.fixture(scope='session')
+def prepared_db(tmp_path_factory):
+    '''
+    Copy of nba.db prepared by prepare_database, made once per test session.
+    '''
+    db_file = tmp_path_factory.mktemp('prepared') / 'nba.db'
+    shutil.copy('nba.db', db_file)
+    conn = sqlite3.connect(db_file)
+    db.prepare_database(conn)
+    conn.close()
+    return db_file
+
+
+@pytest.fixture(scope='session')
+def conn(prepared_db):
+    '''
+    Connection shared by the tests that only read. query_only makes a write
+    fail instead of leaking into the other tests: those use writable_conn.
+    '''
+    conn = sqlite3.connect(prepared_db)
+    conn.execute('PRAGMA query_only = ON')
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def writable_conn(prepared_db, tmp_path):
+    '''
+    Connection to a private copy of the prepared database.
+    '''
+    db_file = tmp_path / 'nba.db'
+    shutil.copy(prepared_db, db_file)
+    conn = sqlite3.connect(db_file)
+    yield conn
+    conn.close()
@@ -0,0 +1,124 @@
+import os
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from modules.cache import ResultCache, cached, database_fingerprint
+
+
+class Counter:
+    def __init__(self, conn, cache):
+        self.conn = conn
+        self.cache = cache
+        self.calls = 0
+
+    @cached
+    def frames(self, n):
+        self.calls += 1
+        return pd.DataFrame({'x': range(n)}), [pd.Series([n])]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('modules.cache.time.monotonic', lambda: now[0])
+    return now
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResultCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == (True, 1)
+    cache.set('c', 3)
+    assert cache.get('b') == (False, None)
+    assert cache.get('a') == (True, 1) and cache.get('c') == (True, 3)
+    # Setting an existing key refreshes it instead of growing the cache
+    cache.set('a', 4)
+    cache.set('d', 5)
+    assert cache.get('c') == (False, None) and cache.get('a') == (True, 4)
+    assert cache.stats() == {'hits': 4, 'misses': 2, 'evictions': 2, 'hit_ratio': 0.667, 'size': 2, 'maxsize': 2}
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = ResultCache(ttl=60)
+    cache.set('a', 1)
+    clock[0] += 60
+    assert cache.get('a') == (True, 1)
+    clock[0] += 1
+    assert cache.get('a') == (False, None)
+    assert cache.stats()['size'] == 0 and cache.evictions == 1
+    cache.set('a', 2)
+    assert cache.get('a') == (True, 2)
+
+
+def test_cached_counts_hits_and_misses():
+    cache = ResultCache()
+    obj = Counter(sqlite3.connect(':memory:'), cache)
+    obj.frames(3)
+    obj.frames(3)
+    obj.frames(4)
+    assert obj.calls == 2
+    assert (cache.hits, cache.misses) == (1, 2)
+    assert ResultCache().stats()['hit_ratio'] == 0.0
+    obj.cache = None
+    obj.frames(3)
+    assert obj.calls == 3 and (cache.hits, cache.misses) == (1, 2)
+
+
+def test_results_are_copied_out_of_the_cache():
+    obj = Counter(sqlite3.connect(':memory:'), ResultCache())
+    df, [series] = obj.frames(3)
+    df['x'] = 0
+    df.index = ['a', 'b', 'c']
+    series[0] = -1
+    again, [series_again] = obj.frames(3)
+    assert obj.calls == 1
+    assert again['x'].tolist() == [0, 1, 2] and again.index.tolist() == [0, 1, 2]
+    assert series_again[0] == 3
+
+
+def test_fingerprint_follows_database_and_wal(tmp_path):
+    db_file = str(tmp_path / 'data.db')
+    conn = sqlite3.connect(db_file)
+    conn.execute('CREATE TABLE t(x)')
+    conn.commit()
+    first = database_fingerprint(conn)
+    assert first[0] == db_file and first[-2:] == (None, 0)
+    assert database_fingerprint(sqlite3.connect(db_file)) == first
+
+    conn.execute('INSERT INTO t VALUES (1)')
+    conn.commit()
+    assert database_fingerprint(conn) != first
+    stat = os.stat(db_file)
+    before = database_fingerprint(conn)
+    os.utime(db_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert database_fingerprint(conn) != before
+
+    # Commits that stay in the WAL change the fingerprint as well
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA wal_autocheckpoint = 0')
+    before = database_fingerprint(conn)
+    conn.execute('INSERT INTO t VALUES (2)')
+    conn.commit()
+    after = database_fingerprint(conn)
+    assert after[1:3] == before[1:3] and after[3:] != before[3:]
+    conn.close()
+
+
+def test_fingerprint_of_memory_database_follows_data_version():
+    conn = sqlite3.connect(':memory:')
+    other = sqlite3.connect(':memory:')
+    assert database_fingerprint(conn) != database_fingerprint(other)
+    assert database_fingerprint(conn) == database_fingerprint(conn)
+
+
+def test_changed_database_invalidates_cached_results(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'data.db')
+    obj = Counter(conn, ResultCache())
+    obj.frames(3)
+    conn.execute('CREATE TABLE t(x)')
+    conn.commit()
+    obj.frames(3)
+    assert obj.calls == 2
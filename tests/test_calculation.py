@@ -0,0 +1,186 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import modules.helper_functions as hlp
+from modules.cache import ResultCache
+from modules.dtypes import FRAME_SCHEMAS, INTEGER, REAL, TEXT
+from modules.snapshot import load_snapshot, write_snapshot
+
+
+@pytest.fixture
+def calc(conn):
+    return hlp.Calculation(conn, cache=ResultCache())
+
+
+def read_csv(name):
+    return pd.read_csv(f'./data/{name}.csv', sep=';')
+
+
+def test_mean_values_match_csv(calc):
+    df = pd.merge(read_csv('match_stats'), read_csv('match_info'), on=['match_id', 'team_id'])
+    expected = {
+        'avg_pts': df['pts'].mean(),
+        'avg_ast': df['ast'].mean(),
+        'avg_reb': df['reb'].mean(),
+        'avg_stl': df['stl'].mean(),
+        'avg_blk': df['blk'].mean(),
+        'avg_tov': df['tov'].mean(),
+        'avg_pf': df['pf'].mean(),
+    }
+    mean_values = calc.calculate_mean_values()
+    assert len(mean_values) == 1
+    for column, value in expected.items():
+        assert mean_values[column][0] == pytest.approx(value, abs=0.005)
+
+
+def test_team_aggregates_match_csv(calc):
+    df = pd.merge(read_csv('match_stats'), read_csv('match_info'), on=['match_id', 'team_id'])
+    # Teams without details (PHX) are left out
+    df = pd.merge(df, read_csv('team_info')[['team_id', 'team_name']], on='team_id')
+    teams = df.groupby(['team_id', 'team_name'])
+    expected = pd.DataFrame({
+        'ppg': teams['pts'].mean(),
+        'astpg': teams['ast'].mean(),
+        'rebpg': teams['reb'].mean(),
+        'stlpg': teams['stl'].mean(),
+        'tovpg': teams['tov'].mean(),
+        'blkpg': teams['blk'].mean(),
+        'pfpg': teams['pf'].mean(),
+        'fgp': 100 * teams['fgm'].sum() / teams['fga'].sum(),
+        'tpp': 100 * teams['tpm'].sum() / teams['tpa'].sum(),
+        'ftp': 100 * teams['ftm'].sum() / teams['fta'].sum(),
+        'games': teams.size(),
+    }).reset_index()
+
+    aggregates = calc.calculate_team_aggregates()
+    assert aggregates['team_id'].tolist() == expected['team_id'].tolist()
+    assert aggregates['team_name'].tolist() == expected['team_name'].tolist()
+    assert aggregates['games'].tolist() == expected['games'].tolist()
+    for column in hlp.TEAM_METRICS + ['fgp', 'tpp', 'ftp']:
+        np.testing.assert_allclose(aggregates[column], expected[column], atol=0.005, err_msg=column)
+
+    # One frame per metric, best team first
+    expected = expected.set_index('team_name')
+    for metric, ranked in zip(hlp.TEAM_METRICS, calc.calculate_team_stats()):
+        assert ranked.columns.tolist() == ['team_name', metric]
+        assert ranked[metric].is_monotonic_decreasing, metric
+        np.testing.assert_allclose(ranked[metric], expected.loc[ranked['team_name'], metric], atol=0.005,
+                                   err_msg=metric)
+        assert sorted(ranked['team_name']) == sorted(expected.index)
+
+
+# PHX has no team_info row (it is listed as PHO), so no team_details either
+@pytest.mark.parametrize('team_id', ['LAL', 'PHX'])
+def test_match_stats_returns_two_rows_per_game(calc, team_id):
+    match_info = read_csv('match_info')
+    games = match_info.groupby('match_id')['team_id'].agg(frozenset)
+    expected = sorted(games[games == frozenset({'BOS', team_id})].index)
+
+    df, match_ids = calc.get_match_stats(team_id, 'BOS')
+    assert expected and sorted(match_ids) == expected
+    assert len(df) == 2 * len(expected)
+    assert (df.groupby('match_id', observed=True)['team_id'].nunique() == 2).all()
+    names = dict(read_csv('team_info')[['team_id', 'team_name']].values)
+    assert set(zip(df['team_id'], df['team_name'])) == {(t, names.get(t, t)) for t in (team_id, 'BOS')}
+    assert calc.get_match_stats('BOS', 'BOS')[1] == []
+
+
+def test_head_to_head_matches_csv(calc):
+    df = pd.merge(read_csv('match_stats'), read_csv('match_info'), on=['match_id', 'team_id'])
+    pairs = pd.merge(df, df, on='match_id', suffixes=('', '_opp'))
+    pairs = pairs[pairs['team_id'] != pairs['team_id_opp']]
+    for stat in hlp.H2H_STATS:
+        pairs[stat] = pairs[stat] - pairs[f'{stat}_opp']
+    expected = pairs.assign(wins=pairs['result'] == 'W').groupby(['team_id', 'team_id_opp']).agg(
+        games=('match_id', 'size'), wins=('wins', 'sum'), **{stat: (stat, 'sum') for stat in hlp.H2H_STATS})
+
+    h2h = calc.get_head_to_head()
+    # Phoenix plays as PHX but is listed as PHO in team_info: both are kept
+    assert h2h.team_ids == tuple(sorted(set(read_csv('team_info')['team_id']) | set(df['team_id'])))
+    assert h2h.games.sum() == len(pairs)
+    assert (np.diag(h2h.games) == 0).all()
+    assert (h2h.wins + h2h.wins.T == h2h.games).all()
+    for (team_id, opponent_id), row in expected.iterrows():
+        i, j = h2h.team_ids.index(team_id), h2h.team_ids.index(opponent_id)
+        assert (h2h.games[i, j], h2h.wins[i, j]) == (row['games'], row['wins'])
+        assert [h2h.delta(stat)[i, j] for stat in hlp.H2H_STATS] == row[hlp.H2H_STATS].tolist()
+
+    record = h2h.record('LAL', 'BOS')
+    df, match_ids = calc.get_match_stats('LAL', 'BOS')
+    points = df.groupby('team_id', observed=True)['pts'].sum()
+    assert record['games'] == len(match_ids)
+    assert record['pts_diff'] == pytest.approx((points['LAL'] - points['BOS']) / len(match_ids))
+    # Shared through the cache, so read-only
+    with pytest.raises(ValueError):
+        h2h.wins[0, 1] = 1
+
+
+def test_shooting_data_bins_past_max_points(calc, conn, tmp_path):
+    points, binned = calc.get_shooting_data()
+    assert not binned
+    assert len(points) == len(read_csv('match_stats'))
+
+    cells, binned = calc.get_shooting_data(max_points=100)
+    assert binned
+    assert cells['games'].sum() == len(points)
+    assert not cells.duplicated(['fga', 'fgp']).any()
+    expected = points.assign(fga=points['fga'] // hlp.SHOOTING_BIN_FGA * hlp.SHOOTING_BIN_FGA,
+                             fgp=points['fgp'] // hlp.SHOOTING_BIN_FGP * hlp.SHOOTING_BIN_FGP)
+    assert cells.set_index(['fga', 'fgp'])['games'].to_dict() == expected.value_counts().to_dict()
+
+    write_snapshot(conn, str(tmp_path / 'snapshot'))
+    from_snapshot = hlp.Calculation(conn, cache=None, snapshot=load_snapshot(str(tmp_path / 'snapshot')))
+    snapshot_cells, binned = from_snapshot.get_shooting_data(max_points=100)
+    assert binned
+    pd.testing.assert_frame_equal(snapshot_cells.sort_values(['fga', 'fgp']).reset_index(drop=True),
+                                  cells.sort_values(['fga', 'fgp']).reset_index(drop=True), check_dtype=False)
+
+
+def test_box_scores_put_both_teams_of_a_match_side_by_side(calc, conn, tmp_path):
+    long, match_ids = calc.get_match_stats('LAL', 'BOS')
+    box = calc.get_box_scores()
+    assert len(box) == read_csv('match_info')['match_id'].nunique()
+    for match_id in match_ids:
+        match = calc.get_box_score(match_id)
+        rows = long[long['match_id'] == match_id].set_index('team_id')
+        home, away = match['home'], match['away']
+        assert home['team_id'] == match_id[8:11] != away['team_id']
+        for side in (home, away):
+            for stat in hlp.BOX_SCORE_STATS:
+                assert side[stat] == rows.loc[side['team_id'], stat]
+            assert side['fgp'] == pytest.approx(100 * side['fgm'] / side['fga'], abs=1e-4)
+        assert home['ast_share'] + away['ast_share'] == pytest.approx(100, abs=1e-4)
+
+    write_snapshot(conn, str(tmp_path / 'snapshot'))
+    from_snapshot = hlp.Calculation(conn, cache=None, snapshot=load_snapshot(str(tmp_path / 'snapshot')))
+    pd.testing.assert_frame_equal(from_snapshot.get_box_scores(), box)
+
+
+@pytest.mark.parametrize('from_snapshot', [False, True], ids=['sql', 'snapshot'])
+def test_frames_follow_schema(conn, tmp_path, from_snapshot):
+    snapshot = None
+    if from_snapshot:
+        write_snapshot(conn, str(tmp_path / 'snapshot'))
+        snapshot = load_snapshot(str(tmp_path / 'snapshot'))
+    calc = hlp.Calculation(conn, cache=ResultCache(), snapshot=snapshot)
+    args = {'get_match_stats': ('BOS', 'LAL')}
+    # get_shooting_data binned as well as unbinned
+    calls = [(method, args.get(method, ())) for method in FRAME_SCHEMAS] + [('get_shooting_data', (100,))]
+    for method, args in calls:
+        result = getattr(calc, method)(*args)
+        frames = [value for value in (result if isinstance(result, tuple) else (result,))
+                  if isinstance(value, pd.DataFrame)]
+        assert frames, method
+        schema = FRAME_SCHEMAS[method]
+        for df in frames:
+            dtypes = {column: df[column].dtype for column in df.columns}
+            expected = {column: schema[column[-1] if isinstance(column, tuple) else column] for column in df.columns}
+            assert dtypes == expected, method
+
+
+# Only the frames of a row per team at most keep the types read from SQLite
+@pytest.mark.parametrize('method', ['get_shooting_points', 'get_box_scores', 'get_team_form', 'get_match_stats'])
+def test_frames_of_games_are_compact(method):
+    read_types = [TEXT, INTEGER, REAL]
+    assert not [column for column, dtype in FRAME_SCHEMAS[method].items() if dtype in read_types], method
@@ -0,0 +1,67 @@
+import shutil
+import sqlite3
+
+import pytest
+
+import modules.database as db
+
+
+def test_totals_match_full_queries(conn):
+    assert db.check_totals(conn) == []
+    tot_matches, tot_pts = conn.execute('SELECT tot_matches, tot_pts FROM league_totals').fetchone()
+    assert tot_matches == conn.execute('SELECT COUNT(DISTINCT match_id) FROM match_info').fetchone()[0]
+    assert tot_pts == conn.execute('SELECT SUM(pts) FROM match_info').fetchone()[0]
+
+
+def test_triggers_keep_totals_consistent(writable_conn):
+    conn = writable_conn
+    first_team = 'SELECT MIN(team_key) FROM match_results WHERE match_key = ?'
+    conn.execute(f'UPDATE match_results SET pts = pts + 1, min = min + 5 '
+                 f'WHERE match_key = 3 AND team_key = ({first_team})', (3,))
+    conn.execute("UPDATE match_results SET result = 'L' WHERE match_key = 4")
+    conn.execute('DELETE FROM match_results WHERE match_key = 5')
+    conn.execute(f'DELETE FROM match_results WHERE match_key = 6 AND team_key = ({first_team})', (6,))
+    conn.execute('UPDATE box_scores SET fgm = fgm + 3 WHERE match_key = 9')
+    conn.execute('DELETE FROM box_scores WHERE match_key = 10')
+    conn.execute('UPDATE matches SET season = 2030 WHERE match_key = 11')
+    conn.execute('DELETE FROM game_dates WHERE date_id = 200')
+    conn.execute("INSERT INTO match_info VALUES('01012024LAL', 'LAL', 1, 'W', 240, 100)")
+    conn.execute("INSERT INTO match_info VALUES('01012024LAL', 'BOS', 1, 'L', 240, 90)")
+    assert db.check_totals(conn) == []
+
+    conn.execute('UPDATE league_totals SET tot_pts = 0')
+    assert [d[:3] for d in db.check_totals(conn)] == [('league_totals', (1,), 'tot_pts')]
+    db.rebuild_totals(conn)
+    assert db.check_totals(conn) == []
+
+
+def test_prepare_converts_the_original_layout(conn, tmp_path):
+    legacy = sqlite3.connect(tmp_path / 'legacy.db')
+    for table in db.LEGACY_TABLES + ['game_dates']:
+        columns = [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+        rows = conn.execute(f"SELECT {', '.join(columns)} FROM {table}").fetchall()
+        legacy.execute(f"CREATE TABLE {table}({', '.join(columns)})")
+        legacy.executemany(f"INSERT INTO {table} VALUES({', '.join('?' * len(columns))})", rows)
+    legacy.commit()
+    with pytest.raises(db.SchemaError, match='schema version 0 instead of'):
+        db.check_schema(legacy)
+
+    db.prepare_database(legacy)
+    db.check_schema(legacy)
+    assert db.table_type(legacy, 'match_info') == 'view'
+    for table in db.LEGACY_TABLES:
+        query = f'SELECT * FROM {table} ORDER BY 1, 2'
+        assert legacy.execute(query).fetchall() == conn.execute(query).fetchall()
+    assert db.check_totals(legacy) == []
+    legacy.close()
+
+
+def test_prepare_leaves_an_up_to_date_database_untouched(prepared_db, tmp_path):
+    db_file = tmp_path / 'nba.db'
+    shutil.copy(prepared_db, db_file)
+    content = db_file.read_bytes()
+    conn = sqlite3.connect(db_file)
+    db.check_schema(conn)
+    db.prepare_database(conn)
+    conn.close()
+    assert db_file.read_bytes() == content
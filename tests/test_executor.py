@@ -0,0 +1,106 @@
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from modules.executor import QueryBatch, QueryTimeout, get_executor
+from modules.pool import ConnectionPool, borrow
+
+
+@pytest.fixture
+def executor():
+    executor = ThreadPoolExecutor(max_workers=4)
+    yield executor
+    executor.shutdown(wait=True)
+
+
+def sleep_and_return(seconds, value):
+    time.sleep(seconds)
+    return value
+
+
+def test_queries_run_concurrently_and_are_timed(executor):
+    batch = QueryBatch(executor=executor)
+    start = time.perf_counter()
+    for name in ['a', 'b', 'c']:
+        batch.submit(name, sleep_and_return, 0.2, name.upper())
+    batch.submit('kwargs', dict, x=1)
+    assert batch.gather() == {'a': 'A', 'b': 'B', 'c': 'C', 'kwargs': {'x': 1}}
+    assert time.perf_counter() - start < 0.5
+    assert batch.timings.keys() == {'a', 'b', 'c', 'kwargs'}
+    assert all(0.2 <= batch.timings[name] < 0.5 for name in 'abc')
+
+
+def test_query_past_its_timeout_raises(executor):
+    release = threading.Event()
+    batch = QueryBatch(timeout=5, executor=executor)
+    batch.submit('fast', sleep_and_return, 0, 1)
+    batch.submit('slow', release.wait, timeout=0.1)
+    start = time.perf_counter()
+    try:
+        with pytest.raises(QueryTimeout, match="'slow'"):
+            batch.gather()
+        assert time.perf_counter() - start < 1
+    finally:
+        release.set()
+
+
+def test_timeout_counts_from_submission(executor):
+    batch = QueryBatch(timeout=0.3, executor=executor)
+    batch.submit('first', sleep_and_return, 0.2, 1)
+    batch.submit('second', sleep_and_return, 0.4, 2)
+    # Had the wait for the second started after the first, it would end at 0.5s and succeed
+    start = time.perf_counter()
+    with pytest.raises(QueryTimeout, match="'second'"):
+        batch.gather()
+    assert time.perf_counter() - start < 0.4
+
+
+def test_timed_out_query_is_interrupted_and_returns_its_connection(executor, tmp_path):
+    db_file = str(tmp_path / 'data.db')
+    sqlite3.connect(db_file).close()
+    pool = ConnectionPool(db_file, max_size=1)
+
+    def count(limit):
+        with borrow(pool) as conn:
+            return conn.execute('WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c LIMIT ?) '
+                                'SELECT COUNT(*) FROM c', (limit,)).fetchone()[0]
+
+    batch = QueryBatch(timeout=0.2, executor=executor)
+    # Seconds of work if it were left to finish
+    batch.submit('slow', count, 10 ** 7)
+    with pytest.raises(QueryTimeout, match="'slow'"):
+        batch.gather()
+    future = batch._queries['slow'][0]
+    with pytest.raises(sqlite3.OperationalError, match='interrupted'):
+        future.result(timeout=5)
+    assert pool.stats()['in_use'] == 0
+    # The only connection of the pool serves the next batch at once
+    batch = QueryBatch(timeout=5, executor=executor)
+    batch.submit('fast', count, 10)
+    assert batch.gather() == {'fast': 10}
+    pool.close()
+
+
+def test_exception_of_a_query_propagates(executor):
+    def fail():
+        raise KeyError('missing')
+
+    batch = QueryBatch(executor=executor)
+    batch.submit('ok', sleep_and_return, 0, 1)
+    batch.submit('fail', fail)
+    with pytest.raises(KeyError, match='missing'):
+        batch.gather()
+    # A failed query is timed as well
+    assert 'fail' in batch.timings
+
+
+def test_names_are_unique_and_the_executor_is_shared():
+    batch = QueryBatch()
+    batch.submit('a', int)
+    with pytest.raises(ValueError):
+        batch.submit('a', int)
+    assert batch.executor is get_executor() is QueryBatch().executor
+    assert batch.gather() == {'a': 0}
@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import modules.helper_functions as hlp
+from modules.form import FORM_STATS, ewm_sums, rolling_means
+from modules.instrumentation import QueryProfiler
+
+
+def expected_form(conn):
+    games = pd.read_sql('''
+        SELECT s.team_id, s.date_id, i.pts, s.ast, s.reb, s.stl, s.blk, s.tov, s.pf
+        FROM match_stats s JOIN match_info i ON i.match_id = s.match_id AND i.team_id = s.team_id
+    ''', conn).sort_values(['team_id', 'date_id'], ignore_index=True)
+    grouped = games.groupby('team_id')[FORM_STATS]
+    rolling = grouped.rolling(hlp.FORM_WINDOW, min_periods=1).mean().reset_index(drop=True)
+    ewm = grouped.ewm(span=hlp.FORM_SPAN).mean().reset_index(drop=True)
+    return pd.concat([games[['team_id', 'date_id']], rolling.add_suffix('_roll'), ewm.add_suffix('_ewm')], axis=1)
+
+
+def assert_form_equal(form, expected):
+    assert form['team_id'].astype(str).tolist() == expected['team_id'].tolist()
+    assert form['date_id'].tolist() == expected['date_id'].tolist()
+    columns = [column for column in expected.columns if column.endswith(('_roll', '_ewm'))]
+    np.testing.assert_allclose(form[columns].to_numpy(np.float64), expected[columns].to_numpy(), rtol=1e-5)
+
+
+def read_games_rows(profiler):
+    records = profiler.to_frame()
+    rows = records.loc[records['name'] == 'get_team_form.games', 'rows'].tolist()
+    profiler.clear()
+    return rows
+
+
+def test_cumulative_sums_match_loops():
+    rng = np.random.default_rng(0)
+    codes = np.repeat([0, 1, 2], [5, 1, 40])
+    values = rng.integers(0, 30, size=(len(codes), 2)).astype(np.float64)
+    initial = rng.random((3, 2)) * 50
+    alpha = 0.6
+    expected_rolling, expected_ewm = np.empty_like(values), np.empty_like(values)
+    for code in range(3):
+        rows = np.flatnonzero(codes == code)
+        previous = initial[code]
+        for i, row in enumerate(rows):
+            expected_rolling[row] = values[rows[max(0, i - 2):i + 1]].mean(axis=0)
+            previous = values[row] + (1 - alpha) * previous
+            expected_ewm[row] = previous
+    np.testing.assert_allclose(rolling_means(codes, values, 3), expected_rolling)
+    # A decay of 0.4 caps the chunks at 376 rows: 40 rows fit in one, so force shorter ones
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr('modules.form._MAX_SCALE', 1e4)
+        np.testing.assert_allclose(ewm_sums(codes, values, alpha, initial), expected_ewm)
+
+
+def test_team_form_matches_pandas(conn):
+    form = hlp.Calculation(conn, cache=None).get_team_form()
+    assert_form_equal(form, expected_form(conn))
+    assert (form.groupby('team_id', observed=True)['game'].diff().dropna() == 1).all()
+
+
+def test_team_form_extends_with_new_dates(writable_conn):
+    conn = writable_conn
+    last_date_id = conn.execute('SELECT MAX(date_id) FROM matches').fetchone()[0]
+    removed = {}
+    for table in ['box_scores', 'match_results', 'matches']:
+        removed[table] = conn.execute(f'''
+            SELECT * FROM {table} WHERE match_key IN (SELECT match_key FROM matches WHERE date_id = ?)
+        ''', (last_date_id,)).fetchall()
+        conn.execute(f'DELETE FROM {table} WHERE match_key IN '
+                     f'(SELECT match_key FROM matches WHERE date_id = ?)', (last_date_id,))
+    conn.commit()
+    profiler = QueryProfiler()
+    calc = hlp.Calculation(conn, cache=None, profiler=profiler)
+    before = calc.get_team_form()
+    assert read_games_rows(profiler) == [len(before)]
+    # Unchanged data is not read again
+    calc.get_team_form()
+    assert read_games_rows(profiler) == []
+
+    for table, rows in reversed(removed.items()):
+        conn.executemany(f"INSERT INTO {table} VALUES ({', '.join('?' * len(rows[0]))})", rows)
+    conn.commit()
+    after = calc.get_team_form()
+    assert read_games_rows(profiler) == [len(removed['box_scores'])]
+    assert len(after) == len(before) + len(removed['box_scores'])
+    assert_form_equal(after, expected_form(conn))
+
+    # A rewritten earlier game invalidates the table: it is computed again
+    conn.execute('UPDATE box_scores SET ast = ast + 1 WHERE match_key = (SELECT MIN(match_key) FROM box_scores)')
+    conn.commit()
+    rebuilt = calc.get_team_form()
+    assert read_games_rows(profiler) == [len(after)]
+    assert_form_equal(rebuilt, expected_form(conn))
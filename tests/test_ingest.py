@@ -0,0 +1,103 @@
+import shutil
+import sqlite3
+
+import pytest
+
+import modules.database as db
+from modules.ingest import TABLES, IngestError, TableSpec, ingest, read_rows
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    data_dir = tmp_path / 'data'
+    data_dir.mkdir()
+    for spec in TABLES:
+        shutil.copy(f'./data/{spec.csv_file}', data_dir)
+    return data_dir
+
+
+def counts(db_file):
+    conn = sqlite3.connect(db_file)
+    result = {spec.name: conn.execute(f'SELECT COUNT(*) FROM {spec.name}').fetchone()[0] for spec in TABLES}
+    conn.close()
+    return result
+
+
+def edit_csv(path, edit):
+    path.write_text('\n'.join(edit(path.read_text().splitlines())) + '\n')
+
+
+def test_table_spec_validates_its_fields():
+    TableSpec('t', ('a', 'b'), (str, int), ('a',))
+    with pytest.raises(ValueError, match='2 columns but 1 types'):
+        TableSpec('t', ('a', 'b'), (str,), ('a',))
+    for primary_key in [(), ('c',), ('a', 'c')]:
+        with pytest.raises(ValueError, match='primary key'):
+            TableSpec('t', ('a', 'b'), (str, int), primary_key)
+
+
+@pytest.mark.parametrize('lines, error', [
+    (['a;c', '1;2'], 'expected columns'),
+    (['a;b', '1;2;3'], ':2: expected 2 values, found 3'),
+    (['a;b', 'x;2', 'y;two'], ':3: invalid literal'),
+    (['a;b', ';2'], ':2: empty primary key'),
+    (['a;b', 'x;1', '', 'x;2'], ':4: duplicated primary key'),
+])
+def test_bad_rows_are_rejected(tmp_path, lines, error):
+    path = tmp_path / 't.csv'
+    path.write_text('\n'.join(lines) + '\n')
+    spec = TableSpec('t', ('a', 'b'), (str, int), ('a',))
+    with pytest.raises(IngestError, match=error):
+        list(read_rows(str(path), spec))
+
+
+def test_reload_writes_only_changed_rows(tmp_path, data_dir):
+    db_file = str(tmp_path / 'nba.db')
+    reports = ingest(db_file, str(data_dir))
+    assert [report.rows_written for report in reports] == [report.rows_read for report in reports]
+    loaded = counts(db_file)
+    assert loaded == {report.table: report.rows_read for report in reports}
+
+    # Loading the same files again writes nothing
+    assert [report.rows_written for report in ingest(db_file, str(data_dir))] == [0] * len(TABLES)
+    assert counts(db_file) == loaded
+
+    header, first, *rest = (data_dir / 'match_info.csv').read_text().splitlines()
+    match_id, team_id, date_id, result, minutes, pts = first.split(';')
+    changed = ';'.join([match_id, team_id, date_id, result, minutes, str(int(pts) + 1)])
+    edit_csv(data_dir / 'match_info.csv', lambda lines: [header, changed, *rest])
+    written = {report.table: report.rows_written for report in ingest(db_file, str(data_dir))}
+    assert written == {'team_info': 0, 'game_dates': 0, 'match_info': 1, 'match_stats': 0}
+    conn = sqlite3.connect(db_file)
+    assert conn.execute('SELECT pts FROM match_info WHERE match_id = ? AND team_id = ?',
+                        (match_id, team_id)).fetchone() == (int(pts) + 1,)
+    conn.close()
+
+
+def test_invalid_file_writes_nothing(tmp_path, data_dir):
+    db_file = str(tmp_path / 'nba.db')
+    ingest(db_file, str(data_dir))
+    loaded = counts(db_file)
+    # A valid new game, then a file failing validation: the game is rolled back as well
+    edit_csv(data_dir / 'match_info.csv', lambda lines: lines + ['01012099BOS;BOS;1;W;240;100'])
+    edit_csv(data_dir / 'match_stats.csv', lambda lines: lines + lines[-1:])
+    with pytest.raises(IngestError, match='duplicated primary key'):
+        ingest(db_file, str(data_dir))
+    assert counts(db_file) == loaded
+
+
+def test_failed_refresh_writes_nothing(tmp_path, data_dir, monkeypatch):
+    db_file = str(tmp_path / 'nba.db')
+    ingest(db_file, str(data_dir))
+    loaded = counts(db_file)
+
+    def crash(conn):
+        raise RuntimeError('crash')
+
+    # A new game, then a failure while rating it: the game is rolled back with the ratings
+    edit_csv(data_dir / 'match_info.csv', lambda lines: lines + ['01012099BOS;BOS;999;W;240;100'])
+    edit_csv(data_dir / 'game_dates.csv', lambda lines: lines + ['999;2099-01-01'])
+    monkeypatch.setattr(db, 'update_ratings', crash)
+    with pytest.raises(RuntimeError, match='crash'):
+        ingest(db_file, str(data_dir))
+    assert counts(db_file) == loaded
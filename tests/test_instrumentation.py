@@ -0,0 +1,39 @@
+import json
+
+import pandas as pd
+
+import modules.helper_functions as hlp
+from modules.cache import ResultCache
+from modules.instrumentation import QueryProfiler, full_scans, query_plan
+
+
+def test_full_scans_resolve_aliases_and_skip_index_lookups(conn):
+    sql = '''
+        SELECT ms.ast, mi.pts FROM box_scores ms
+        JOIN match_results mi ON ms.match_key = mi.match_key AND ms.team_key = mi.team_key
+    '''
+    assert full_scans(query_plan(conn, sql), sql) == ['box_scores']
+    sql = 'SELECT team_key FROM teams WHERE team_id = ?'
+    assert full_scans(query_plan(conn, sql, ('BOS',)), sql) == []
+
+
+def test_profiler_records_queries_of_calculation(conn, tmp_path):
+    log_path = tmp_path / 'queries.jsonl'
+    profiler = QueryProfiler(log_path=str(log_path))
+    calc = hlp.Calculation(conn, cache=ResultCache(), profiler=profiler)
+    df, _ = calc.get_match_stats('BOS', 'LAL')
+    win_loss = calc.get_win_loss()
+    # A cached result runs no query
+    calc.get_win_loss()
+
+    records = profiler.to_frame()
+    assert sorted(records['name']) == ['get_match_stats', 'get_win_loss']
+    row = records.set_index('name').loc['get_win_loss']
+    assert row['rows'] == len(win_loss)
+    assert row['bytes'] > 0 and row['ms'] > 0
+    assert row['plan']
+
+    logged = [json.loads(line) for line in log_path.read_text().splitlines()]
+    assert [record['name'] for record in logged] == ['get_match_stats', 'get_win_loss']
+    assert logged[0]['params'] == ['BOS', 'LAL']
+    pd.testing.assert_frame_equal(df, hlp.Calculation(conn, cache=None).get_match_stats('BOS', 'LAL')[0])
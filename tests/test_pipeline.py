@@ -0,0 +1,39 @@
+import pandas as pd
+import pytest
+
+from modules.pipeline import run_pipeline
+
+KEYS = {
+    'game_dates': ['date_id'],
+    'team_info': ['team_id'],
+    'match_info': ['match_id', 'team_id'],
+    'match_stats': ['match_id', 'team_id'],
+}
+
+
+def read_sorted(path, keys):
+    return pd.read_csv(path, sep=';').sort_values(keys).reset_index(drop=True)
+
+
+@pytest.fixture(scope='module')
+def output(tmp_path_factory):
+    out_dir = tmp_path_factory.mktemp('pipeline')
+    # A small chunk size so the game dates span several chunks
+    run_pipeline('./data/raw_data.csv', str(out_dir), chunksize=500)
+    return out_dir
+
+
+@pytest.mark.parametrize('name', ['team_info', 'match_info', 'match_stats'])
+def test_pipeline_matches_current_csv(output, name):
+    expected = read_sorted(f'./data/{name}.csv', KEYS[name])
+    actual = read_sorted(output / f'{name}.csv', KEYS[name])
+    pd.testing.assert_frame_equal(actual, expected)
+
+
+def test_pipeline_game_dates_match_current_csv(output):
+    # data/game_dates.csv may hold dates without games, which the raw export cannot produce
+    played = pd.read_csv('./data/match_info.csv', sep=';')['date_id'].unique()
+    expected = read_sorted('./data/game_dates.csv', KEYS['game_dates'])
+    expected = expected[expected['date_id'].isin(played)].reset_index(drop=True)
+    actual = read_sorted(output / 'game_dates.csv', KEYS['game_dates'])
+    pd.testing.assert_frame_equal(actual, expected)
@@ -0,0 +1,108 @@
+import sqlite3
+import threading
+
+import pytest
+
+from modules.pool import ConnectionPool, PoolTimeout, borrow
+
+
+def make_db(db_file):
+    conn = sqlite3.connect(db_file)
+    conn.execute('CREATE TABLE t(x)')
+    conn.execute('INSERT INTO t VALUES (1)')
+    conn.commit()
+    conn.close()
+    return str(db_file)
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(make_db(tmp_path / 'data.db'), max_size=2, timeout=0.2)
+    yield pool
+    pool.close()
+
+
+def hold(pool, count):
+    '''
+    Borrow count connections from other threads until the returned event is set.
+    '''
+    release = threading.Event()
+    borrowed = threading.Barrier(count + 1)
+
+    def borrower():
+        with pool.connection():
+            borrowed.wait()
+            release.wait()
+
+    threads = [threading.Thread(target=borrower) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    borrowed.wait()
+    return release, threads
+
+
+def test_nested_blocks_of_a_thread_reuse_its_connection(pool):
+    with pool.connection() as conn:
+        with pool.connection() as inner:
+            assert inner is conn
+        assert pool.stats()['in_use'] == 1
+    with pool.connection() as again:
+        assert again is conn
+    assert pool.stats()['size'] == 1
+    assert pool.stats()['acquisitions'] == 2
+
+
+def test_pool_never_opens_more_than_max_size(pool):
+    release, threads = hold(pool, 2)
+    try:
+        with pytest.raises(PoolTimeout):
+            with pool.connection():
+                pass
+        stats = pool.stats()
+        assert (stats['size'], stats['in_use']) == (2, 2)
+    finally:
+        release.set()
+        for thread in threads:
+            thread.join()
+    assert pool.stats()['in_use'] == 0 and pool.stats()['idle'] == 2
+
+
+def test_waiting_borrower_gets_the_released_connection(pool):
+    pool.timeout = 10
+    release, threads = hold(pool, 2)
+    timer = threading.Timer(0.05, release.set)
+    timer.start()
+    with pool.connection() as conn:
+        assert conn.execute('SELECT x FROM t').fetchall() == [(1,)]
+    for thread in threads:
+        thread.join()
+    assert pool.stats()['size'] == 2 and pool.stats()['waits'] == 1
+
+
+def test_connections_are_read_only(pool):
+    with pool.connection() as conn:
+        assert conn.execute('PRAGMA query_only').fetchone()[0] == 1
+        for sql in ['INSERT INTO t VALUES (2)', 'CREATE TABLE u(x)']:
+            with pytest.raises(sqlite3.OperationalError):
+                conn.execute(sql)
+        # Even with query_only switched off, the file is opened read-only
+        conn.execute('PRAGMA query_only = OFF')
+        with pytest.raises(sqlite3.OperationalError, match='readonly'):
+            conn.execute('INSERT INTO t VALUES (2)')
+
+
+@pytest.mark.parametrize('name', ['what?.db', 'a#b.db', '100%.db', 'with space.db'])
+def test_paths_are_quoted_in_the_uri(tmp_path, name):
+    pool = ConnectionPool(make_db(tmp_path / name))
+    with pool.connection() as conn:
+        assert conn.execute('SELECT x FROM t').fetchall() == [(1,)]
+    pool.close()
+    assert sorted(path.name for path in tmp_path.iterdir()) == [name]
+
+
+def test_borrow_accepts_a_plain_connection(pool):
+    conn = sqlite3.connect(':memory:')
+    with borrow(conn) as borrowed:
+        assert borrowed is conn
+    with borrow(pool) as borrowed:
+        assert borrowed.execute('SELECT x FROM t').fetchone() == (1,)
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+import modules.database as db
+from modules.ratings import DEFAULT_ELO, EloParams, check_ratings, rate_games, read_ratings, update_ratings
+
+
+def test_rate_games_moves_both_teams_by_the_same_amount():
+    # match_key, date_id, season, team_a, team_b, pts_a, pts_b, a_home
+    games = [(1, 1, 2022, 1, 2, 110, 100, True), (2, 2, 2022, 1, 3, 90, 100, False), (3, 3, 2023, 2, 3, 100, 100, True)]
+    same_season = rate_games(games[:2], {})
+    assert sum(team.rating for team in same_season.values()) == pytest.approx(3 * DEFAULT_ELO.initial)
+    teams = rate_games(games, {})
+    assert teams[1].ratings[0] > DEFAULT_ELO.initial
+    assert teams[2].ratings[0] == pytest.approx(2 * DEFAULT_ELO.initial - teams[1].ratings[0])
+    assert teams[1].match_keys == [1, 2] and teams[3].match_keys == [2, 3]
+    # A new season starts a quarter of the way back to the mean, then the game moves both teams
+    start = {key: 0.75 * teams[key].ratings[0] + 0.25 * DEFAULT_ELO.initial for key in (2, 3)}
+    assert teams[2].ratings[1] - start[2] == pytest.approx(start[3] - teams[3].ratings[1])
+    assert teams[2].ratings[1] != pytest.approx(start[2])
+    # Deterministic: the same games give the same ratings
+    assert rate_games(games, {})[2].ratings == teams[2].ratings
+
+
+def test_ingestion_rates_only_the_new_dates(writable_conn):
+    conn = writable_conn
+    dates = [row[0] for row in conn.execute('SELECT DISTINCT date_id FROM matches ORDER BY date_id DESC LIMIT 3')]
+    removed = {}
+    for table in ['box_scores', 'match_results', 'matches']:
+        query = f'FROM {table} WHERE match_key IN (SELECT match_key FROM matches WHERE date_id >= ?)'
+        removed[table] = conn.execute(f'SELECT * {query}', (dates[-1],)).fetchall()
+        conn.execute(f'DELETE {query}', (dates[-1],))
+    conn.commit()
+    db.prepare_database(conn)
+    assert check_ratings(conn) == []
+    before = read_ratings(conn)
+
+    for table, rows in reversed(removed.items()):
+        conn.executemany(f"INSERT INTO {table} VALUES ({', '.join('?' * len(rows[0]))})", rows)
+    conn.commit()
+    db.refresh_matchups(conn)
+    assert update_ratings(conn) == len(removed['matches'])
+    conn.commit()
+    assert conn.execute('SELECT last_date_id FROM rating_checkpoint').fetchone()[0] == dates[0]
+    # The history is extended, not rewritten, and matches a rebuild exactly
+    after = read_ratings(conn)
+    for team_key, (match_keys, ratings, _, _) in before.items():
+        np.testing.assert_array_equal(after[team_key][0][:len(match_keys)], match_keys)
+        np.testing.assert_array_equal(after[team_key][1][:len(ratings)], ratings)
+    assert check_ratings(conn) == []
+    assert update_ratings(conn) == 0
+
+
+def test_changed_history_or_parameters_rebuild_the_ratings(writable_conn):
+    conn = writable_conn
+    games = conn.execute('SELECT COUNT(*) FROM matchups').fetchone()[0]
+    conn.execute('UPDATE match_results SET pts = pts + 10 WHERE match_key = 3 AND result = ?', ('L',))
+    assert check_ratings(conn) != []
+    assert update_ratings(conn) == games
+    assert check_ratings(conn) == []
+
+    params = EloParams(k=30)
+    assert update_ratings(conn, params) == games
+    assert update_ratings(conn, params) == 0
+    assert check_ratings(conn, params) == [] and check_ratings(conn) != []
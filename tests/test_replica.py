@@ -0,0 +1,97 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from modules.pool import ConnectionPool
+from modules.replica import MemoryReplica
+
+
+@pytest.fixture
+def source(tmp_path):
+    db_file = str(tmp_path / 'data.db')
+    conn = sqlite3.connect(db_file)
+    conn.execute('CREATE TABLE t(x)')
+    conn.execute('INSERT INTO t VALUES (1)')
+    conn.commit()
+    yield db_file, conn
+    conn.close()
+
+
+def insert(conn, value):
+    conn.execute('INSERT INTO t VALUES (?)', (value,))
+    conn.commit()
+
+
+def read(conn):
+    return [x for x, in conn.execute('SELECT x FROM t ORDER BY x')]
+
+
+def read_pool(pool):
+    with pool.connection() as conn:
+        return read(conn)
+
+
+def test_write_to_the_file_swaps_in_a_new_generation(source):
+    db_file, writer = source
+    replica = MemoryReplica(db_file)
+    assert replica.load() == 1
+    first_uri = replica.uri
+    assert not replica.refresh()
+
+    insert(writer, 2)
+    version = replica.source_version
+    assert replica.refresh()
+    assert replica.generation == 2 and replica.source_version != version
+    uri, generation = replica.target()
+    assert (uri, generation) == (replica.uri, 2) and uri != first_uri
+    assert read(sqlite3.connect(uri, uri=True)) == [1, 2]
+    assert not replica.refresh()
+
+
+def test_pool_follows_the_new_generation(source):
+    db_file, writer = source
+    replica = MemoryReplica(db_file)
+    replica.load()
+    pool = ConnectionPool(db_file, replica=replica)
+    with pool.connection() as old:
+        insert(writer, 2)
+        replica.refresh()
+        # A reader of the previous copy finishes undisturbed
+        assert read(old) == [1]
+        results = []
+        new_reader = threading.Thread(target=lambda: results.append(read_pool(pool)))
+        new_reader.start()
+        new_reader.join()
+        assert results == [[1, 2]]
+    # The connection to the replaced copy is closed once returned
+    with pytest.raises(sqlite3.ProgrammingError):
+        old.execute('SELECT 1')
+    with pool.connection() as conn:
+        assert conn is not old and read(conn) == [1, 2]
+    assert pool.stats()['size'] == 1
+    pool.close()
+
+
+def test_watcher_reloads_and_stops(source):
+    db_file, writer = source
+    replica = MemoryReplica(db_file, poll_interval=0.02).start()
+    assert replica.generation == 1
+    watcher = replica._watcher
+    assert watcher.is_alive()
+    # Starting again reuses the watcher and the loaded copy
+    assert replica.start()._watcher is watcher and replica.generation == 1
+
+    insert(writer, 2)
+    deadline = time.monotonic() + 5
+    while replica.generation == 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert replica.generation == 2
+    assert read(sqlite3.connect(replica.uri, uri=True)) == [1, 2]
+
+    replica.stop()
+    assert not watcher.is_alive() and replica._watcher is None
+    insert(writer, 3)
+    time.sleep(0.1)
+    assert replica.generation == 2
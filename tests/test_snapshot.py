@@ -0,0 +1,59 @@
+import os
+
+import pandas as pd
+import pytest
+
+from modules.cache import ResultCache
+from modules.snapshot import (SNAPSHOT_TABLES, SOURCE_FILE, data_checksum, load_snapshot, snapshot_fingerprint,
+                              snapshot_is_current, write_snapshot)
+
+
+def test_snapshot_round_trip(conn, tmp_path):
+    directory = str(tmp_path / 'snapshot')
+    rows = write_snapshot(conn, directory)
+    snapshot = load_snapshot(directory)
+    for table in SNAPSHOT_TABLES:
+        expected = pd.read_sql(f'SELECT * FROM {table}', conn)
+        assert rows[table] == len(expected)
+        pd.testing.assert_frame_equal(snapshot[table], expected, check_dtype=False)
+    assert snapshot.checksum == data_checksum(conn)
+    assert snapshot.fingerprint == snapshot_fingerprint(directory)
+    assert snapshot_is_current(snapshot, conn)
+
+
+def test_rewritten_snapshot_changes_fingerprint(conn, tmp_path):
+    directory = str(tmp_path / 'snapshot')
+    write_snapshot(conn, directory)
+    fingerprint = snapshot_fingerprint(directory)
+    path = os.path.join(directory, 'match_stats.arrow')
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert snapshot_fingerprint(directory) != fingerprint
+
+    # A snapshot written without its checksum is never taken as current
+    os.remove(os.path.join(directory, SOURCE_FILE))
+    snapshot = load_snapshot(directory)
+    assert snapshot.checksum is None
+    assert not snapshot_is_current(snapshot, conn, cache=None)
+
+
+@pytest.mark.parametrize('change', [
+    'UPDATE box_scores SET ast = ast + 1 WHERE match_key = 1',
+    "UPDATE match_results SET result = CASE result WHEN 'W' THEN 'L' ELSE 'W' END WHERE match_key = 2",
+    'DELETE FROM box_scores WHERE match_key = 3',
+    "UPDATE team_details SET team_name = team_name || ' ' WHERE team_key = 1",
+    "UPDATE game_dates SET game_date = '2030-01-01' WHERE date_id = 1",
+])
+def test_changed_database_makes_the_snapshot_stale(writable_conn, tmp_path, change):
+    conn = writable_conn
+    directory = str(tmp_path / 'snapshot')
+    write_snapshot(conn, directory)
+    snapshot = load_snapshot(directory)
+    cache = ResultCache()
+    assert snapshot_is_current(snapshot, conn, cache)
+
+    conn.execute(change)
+    conn.commit()
+    assert not snapshot_is_current(snapshot, conn, cache)
+    write_snapshot(conn, directory)
+    assert snapshot_is_current(load_snapshot(directory), conn, cache)
@@ -0,0 +1,75 @@
+import shutil
+import sqlite3
+
+import pytest
+
+import modules.database as db
+import modules.helper_functions as hlp
+from modules.cache import ResultCache
+from modules.synthetic import write_synthetic_database
+
+
+@pytest.fixture(scope='module')
+def source(tmp_path_factory):
+    db_file = tmp_path_factory.mktemp('source') / 'nba.db'
+    shutil.copy('nba.db', db_file)
+    return str(db_file)
+
+
+@pytest.fixture(scope='module')
+def synthetic(source, tmp_path_factory):
+    db_file = str(tmp_path_factory.mktemp('synthetic') / 'nba_2x.db')
+    rows = write_synthetic_database(db_file, 2, source, seed=1)
+    conn = sqlite3.connect(db_file)
+    yield rows, conn
+    conn.close()
+
+
+def test_scale_multiplies_seasons(source, synthetic):
+    rows, conn = synthetic
+    source_conn = sqlite3.connect(source)
+    source_matches, last_season = source_conn.execute('SELECT COUNT(*), MAX(season) FROM matches').fetchone()
+    source_conn.close()
+    assert rows['matches'] == 2 * source_matches
+    assert conn.execute('SELECT season, COUNT(*) FROM matches GROUP BY season').fetchall() == [
+        (last_season - 1, source_matches), (last_season, source_matches)]
+    assert conn.execute('SELECT COUNT(*) FROM match_info').fetchone()[0] == 2 * rows['matches']
+
+
+def test_box_scores_are_consistent(synthetic):
+    _, conn = synthetic
+    assert conn.execute('''
+        SELECT COUNT(*) FROM match_stats s
+        JOIN match_info i ON i.match_id = s.match_id AND i.team_id = s.team_id
+        WHERE s.fgm > s.fga OR s.tpm > s.tpa OR s.ftm > s.fta OR s.tpm > s.fgm
+           OR s.reb != s.oreb + s.dreb OR i.pts != 2 * s.fgm + s.tpm + s.ftm
+    ''').fetchone()[0] == 0
+    # One winner per game, and nobody plays twice on a date
+    assert conn.execute('''
+        SELECT COUNT(*) FROM (SELECT match_id FROM match_info GROUP BY match_id
+                              HAVING SUM(result = 'W') != 1 OR COUNT(*) != 2)
+    ''').fetchone()[0] == 0
+    assert conn.execute('''
+        SELECT COUNT(*) FROM (SELECT date_id, team_id FROM match_info GROUP BY date_id, team_id HAVING COUNT(*) > 1)
+    ''').fetchone()[0] == 0
+    assert db.check_totals(conn) == []
+
+
+def test_stats_resemble_source(source, synthetic):
+    _, conn = synthetic
+    source_conn = sqlite3.connect(source)
+    expected = hlp.Calculation(source_conn, cache=ResultCache()).calculate_mean_values()
+    source_conn.close()
+    mean_values = hlp.Calculation(conn, cache=ResultCache()).calculate_mean_values()
+    for column in expected.columns:
+        assert mean_values[column][0] == pytest.approx(expected[column][0], rel=0.05)
+
+
+def test_seed_is_deterministic(source, synthetic, tmp_path):
+    _, conn = synthetic
+    db_file = str(tmp_path / 'again.db')
+    write_synthetic_database(db_file, 2, source, seed=1)
+    again = sqlite3.connect(db_file)
+    query = 'SELECT match_id, team_id, pts, fga, dreb FROM match_info JOIN match_stats USING(match_id, team_id) ORDER BY 1, 2'
+    assert again.execute(query).fetchall() == conn.execute(query).fetchall()
+    again.close()
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+import modules.helper_functions as hlp
+from modules.cache import ResultCache
+
+
+@pytest.mark.parametrize('metric', hlp.TEAM_METRICS)
+def test_ranked_bar_pairs_each_team_with_its_value(conn, metric):
+    cache = ResultCache()
+    df = hlp.Calculation(conn, cache=cache).calculate_team_stats()[hlp.TEAM_METRICS.index(metric)]
+    viz = hlp.Visualisation(conn, cache=cache)
+    fig = viz.create_ranked_bar(df, metric)
+    bar = fig.data[0]
+    assert list(bar.y) == df['team_name'].tolist()
+    assert list(bar.x) == df[metric].tolist()
+    above = df[metric] >= df[metric].mean()
+    assert list(bar.marker.color) == np.where(above, '#0bb4ff', '#e60049').tolist()
+    assert viz.create_ranked_bar(df.copy(), metric) is fig
+    # Another frame gets its own figure
+    changed = df.assign(**{metric: df[metric] + 1})
+    assert list(viz.create_ranked_bar(changed, metric).data[0].x) == changed[metric].tolist()
+    assert list(viz.create_ranked_bar(df.iloc[::-1], metric).data[0].y) == df['team_name'][::-1].tolist()
+
+
+def test_match_panel_mirrors_both_box_scores(conn):
+    calc = hlp.Calculation(conn, cache=None)
+    match = calc.get_box_score(calc.get_match_stats('LAL', 'BOS')[1][0])
+    home, away = match['home'], match['away']
+    fig = hlp.Visualisation(conn, cache=None).create_match_panel(match)
+    assert len(fig.data) == 4 * len(hlp.MATCH_PANEL_ROWS)
+    # FG row: away on the left (reversed axis), home on the right
+    assert fig.data[0].x[0] == pytest.approx(away['fgp']) and fig.data[0].xaxis == 'x'
+    assert fig.data[2].x[0] == pytest.approx(home['fgp']) and fig.data[2].xaxis == 'x2'
+    assert fig.data[0].x[0] + fig.data[1].x[0] == pytest.approx(100)
+    assert tuple(fig.layout.xaxis.range) == (100, 0)
+    assert tuple(fig.layout.xaxis2.range) == (0, 100)
+    # AST row: share of the assists of both teams
+    assert fig.data[16].x[0] == pytest.approx(100 * away['ast'] / (home['ast'] + away['ast']))
+    texts = [a.text for a in fig.layout.annotations]
+    assert f"{home['ast']} AST" in texts and f"{away['reb']} REB" in texts
+    assert f"{home['fgm']}/{home['fga']} ({100 * home['fgm'] / home['fga']:.1f}%)" in texts
+    # The grid is shared between figures, not modified by them
+    assert 'annotations' not in hlp._match_panel_grid()
+
+
+def test_shooting_chart_draws_cells_as_heatmap(conn):
+    calc = hlp.Calculation(conn, cache=None)
+    viz = hlp.Visualisation(conn, cache=None)
+    points, _ = calc.get_shooting_data()
+    assert viz.create_shooting_chart(points, binned=False).data[0].type == 'scattergl'
+    cells, _ = calc.get_shooting_data(max_points=100)
+    heatmap = viz.create_shooting_chart(cells, binned=True).data[0]
+    assert heatmap.type == 'heatmap'
+    assert np.nansum(np.array(heatmap.z, dtype=float)) == len(points)
+
+
+def test_form_chart_draws_both_means_of_each_team(conn):
+    form = hlp.Calculation(conn, cache=None).get_team_form()
+    team_names = {'LAL': 'Los Angeles Lakers', 'BOS': 'Boston Celtics'}
+    fig = hlp.Visualisation(conn, cache=None).create_form_chart(form[form['team_id'].isin(list(team_names))],
+                                                                'ast', team_names)
+    assert [trace.name for trace in fig.data] == ['Los Angeles Lakers', 'Los Angeles Lakers (weighted)',
+                                                  'Boston Celtics', 'Boston Celtics (weighted)']
+    lakers = form[form['team_id'] == 'LAL']
+    np.testing.assert_array_equal(fig.data[0].y, lakers['ast_roll'])
+    np.testing.assert_array_equal(fig.data[1].y, lakers['ast_ewm'])
+    assert fig.data[0].line.color == fig.data[1].line.color != fig.data[2].line.color
+    assert fig.data[1].line.dash == 'dash'
+
+
+@pytest.mark.parametrize('stat', [None, 'pts'])
+def test_head_to_head_heatmap_leaves_pairs_that_never_met_blank(conn, stat):
+    h2h = hlp.Calculation(conn, cache=None).get_head_to_head()
+    heatmap = hlp.Visualisation(conn, cache=None).create_head_to_head_heatmap(h2h, stat).data[0]
+    z = np.array(heatmap.z, dtype=float)
+    played = h2h.games.sum(axis=1) > 0
+    games = h2h.games[np.ix_(played, played)]
+    assert list(heatmap.x) == list(heatmap.y) == list(np.array(h2h.team_ids)[played])
+    assert np.isnan(z[games == 0]).all() and not np.isnan(z[games > 0]).any()
+    if stat is None:
+        assert (z + z.T)[games > 0] == pytest.approx(100)
+    else:
+        margins = h2h.delta('pts')[np.ix_(played, played)]
+        np.testing.assert_allclose(z[games > 0], margins[games > 0] / games[games > 0])